@@ -6,47 +6,137 @@ import os
 if 'APP_DIR' in os.environ:
     sys.path.append(os.environ['APP_DIR'])
 
-from settings import SettingsManager
-from utils import apply_cpu_affinity
+# Everything else is imported only once there is work to do: the timer
+# starts this script every minute, and most runs find nothing to enforce.
+CONFIG_DIR = os.path.join(os.path.expanduser('~'), '.config', 'cpu-affinity-manager')
 
-def auto_apply():
+def irqs_steered_by_rules(state_file):
+    """True if the IRQ state file has entries of rules, which a full run may have to restore."""
+    import json
+
+    # Parsed here rather than with irq.load_state(), which imports too much
+    # for the fast path; entries without an owner were written by rules
+    try:
+        with open(state_file) as f:
+            entries = json.load(f).values()
+        return any(not isinstance(entry, dict) or entry.get('owner') != 'manual' for entry in entries)
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError, AttributeError):
+        # Let the full run report it
+        return True
+
+def nothing_to_do():
+    """
+    Fast path for the oneshot: True if no saved rule can match a running process.
+
+    Uses the rule cache written whenever settings are saved (see rulecache.py),
+    so it needs neither the settings JSON nor the rule compiler. Returns False
+    whenever it cannot be sure, e.g. if the cache is older than the settings.
     """
-    Iterate through saved processes and apply CPU affinity settings.
+    from rulecache import CACHE_NAME, any_process_matches, load_cache, settings_signature
+
+    if irqs_steered_by_rules(os.path.join(CONFIG_DIR, 'irq_originals.json')):
+        # Interrupts are still steered for a rule whose processes, or the
+        # rule itself, may be gone
+        return False
+    signature = settings_signature(os.path.join(CONFIG_DIR, 'process_settings.json'))
+    if signature is None:
+        # No settings saved
+        return True
+    cache = load_cache(os.path.join(CONFIG_DIR, CACHE_NAME), signature)
+    if cache is None:
+        return False
+    return not any_process_matches(*cache)
+
+def auto_apply(metrics_textfile=None):
+    """
+    Apply CPU affinity settings for all saved processes.
     Designed to be run by a periodic background timer.
+
+    /proc is scanned once per run and every saved rule is checked against that
+    single snapshot, instead of forking `pgrep` once per saved process. The
+    stats of the run are written next to the settings file.
     """
+    from settings import SettingsManager
+    from engine import Enforcer
+    from irq import IrqSteering
+    from metrics import StatsWriter
+
     try:
         manager = SettingsManager()
-        saved_processes = manager.get_all_processes()
-        
-        if not saved_processes:
-            # No settings saved, nothing to do
+        matcher = manager.get_matcher(quiet=True)
+        # Lets the next runs take the fast path
+        manager.update_rule_cache()
+
+        if not matcher and not irqs_steered_by_rules(manager.irq_state_file):
+            # No settings saved, nothing to do or to undo
             return
 
-        # Check each saved process
-        for process_name in saved_processes:
-            settings = manager.get_process_settings(process_name)
-            if not settings:
-                continue
-
-            cpu_mask = settings.get('cpu_mask')
-            if not cpu_mask:
-                continue
-
-            # Apply affinity with 0 delay and quiet mode
-            # We use 0 delay because this script runs periodically, so we don't want to block
-            # We use quiet mode to avoid spamming the journal/logs every time it runs
-            # It will still apply if the process is found running.
-            apply_cpu_affinity(
-                process_name, 
-                cpu_mask=cpu_mask, 
-                initial_delay=0, 
-                quiet=True
-            )
+        # Apply affinity with 0 delay and quiet mode
+        # We use 0 delay because this script runs periodically, so we don't want to block
+        # We use quiet mode to avoid spamming the journal/logs every time it runs
+        enforcer = Enforcer(matcher, quiet=True, irqs=IrqSteering(state_file=manager.irq_state_file))
+        enforcer.cycle(verify=True)
+        StatsWriter(enforcer.stats, manager.stats_file, metrics_textfile).write()
 
     except Exception as e:
         # If something goes wrong, print to stderr so it shows up in logs
         print(f"Error in auto-affinity script: {e}", file=sys.stderr)
 
+def main():
+    if len(sys.argv) == 1 and nothing_to_do():
+        return 0
+
+    import argparse
+    parser = argparse.ArgumentParser(description="Apply saved CPU affinity settings.")
+    parser.add_argument('--daemon', action='store_true',
+                        help="Keep running and apply settings as processes start")
+    parser.add_argument('--verbose', action='store_true',
+                        help="Log what is being applied (daemon mode)")
+    parser.add_argument('--metrics-textfile', metavar='PATH',
+                        help="Also write stats for the Prometheus textfile collector to PATH "
+                             "(a .prom file in node_exporter's textfile directory)")
+    parser.add_argument('--cpuset', action='store_true',
+                        help="Place processes in a cgroup v2 cpuset per rule (daemon mode); "
+                             "needs the cpuset controller delegated to the service")
+    parser.add_argument('--profile', metavar='NAME',
+                        help="Switch to this named profile of saved settings first")
+    parser.add_argument('--stats', action='store_true',
+                        help="Print the stats of the running service as JSON and exit")
+    args = parser.parse_args()
+
+    if args.stats:
+        import json
+        from metrics import read_stats
+        from settings import SettingsManager
+        stats = read_stats(SettingsManager().stats_file)
+        if stats is None:
+            print("No stats available, is the auto-apply service enabled?", file=sys.stderr)
+            return 1
+        print(json.dumps(stats, indent=4))
+        return 0
+
+    if args.profile:
+        from profiles import ProfileManager
+        result = ProfileManager().switch(args.profile, quiet=not args.verbose)
+        print(result, file=sys.stderr if not result.success else sys.stdout)
+        if not result.success:
+            return 1
+
+    if not args.daemon:
+        auto_apply(args.metrics_textfile)
+        return 0
+
+    from daemon import EnforcementDaemon
+    try:
+        EnforcementDaemon(quiet=not args.verbose, metrics_textfile=args.metrics_textfile,
+                          cpuset=args.cpuset).run()
+    except Exception as e:
+        print(f"Error in auto-affinity daemon: {e}", file=sys.stderr)
+        return 1
+    return 0
+
 if __name__ == "__main__":
-    auto_apply()
+    sys.exit(main())
 
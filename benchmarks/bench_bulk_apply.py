@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Wall-clock time to enforce a mask on a process with thousands of threads.
+
+Starts THREADS idle threads in this process, then times the per-TID path
+(set_affinity_for_tid for every thread, as apply_cpu_affinity used to do)
+against apply_mask_to_tids, serially and with a worker pool. Masks alternate
+between two CPU sets so every run really moves every thread; on a machine
+with a single online CPU only the already-set check is measured.
+
+    python3 benchmarks/bench_bulk_apply.py [THREADS] [ROUNDS]
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cpumask import online_cpus
+from utils import apply_mask_to_tids, get_tids_for_pid, set_affinity_for_tid
+
+
+def per_tid(tids, mask):
+    for tid in tids:
+        set_affinity_for_tid(tid, mask, quiet=True)
+
+
+def bulk(workers):
+    def run(tids, mask):
+        apply_mask_to_tids(tids, mask, workers=workers)
+    return run
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    stop = threading.Event()
+    workers = [threading.Thread(target=stop.wait, daemon=True) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+
+    try:
+        online = online_cpus()
+        lowest = min(online.cpus)
+        masks = [online, online - str(lowest)] if len(online) > 1 else [online]
+        tids = get_tids_for_pid(os.getpid())
+        print(f"{len(tids)} threads, {len(online)} online CPUs, {rounds} rounds, "
+              f"masks: {', '.join(mask.to_cpulist() for mask in masks)}")
+
+        for name, run in (("per-TID set_affinity_for_tid", per_tid),
+                          ("apply_mask_to_tids, serial", bulk(1)),
+                          ("apply_mask_to_tids, 4 workers", bulk(4))):
+            timings = []
+            for round_ in range(rounds):
+                mask = masks[round_ % len(masks)]
+                start = time.perf_counter()
+                run(tids, mask)
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            print(f"{name:32} best {timings[0] * 1000:8.1f} ms   "
+                  f"median {timings[len(timings) // 2] * 1000:8.1f} ms")
+    finally:
+        stop.set()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Startup budget of the timer-driven oneshot (auto_apply.py without arguments).
+
+Runs auto_apply.py RUNS times with a temporary HOME whose saved rules match
+no running process, the common case for a timer firing every minute, and
+reports the wall-clock time per run next to that of a bare `python -c pass`.
+The modules imported on that path are listed from `-X importtime`.
+
+Exits with status 1 if the median run exceeds BUDGET_MS or the fast path
+imports a module outside ALLOWED_IMPORTS, so it can be used as a check.
+
+    python3 benchmarks/bench_cold_start.py [RUNS]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SCRIPT = os.path.join(ROOT, 'auto_apply.py')
+BUDGET_MS = 50.0
+# Modules of this project the no-op run may import
+ALLOWED_IMPORTS = {'rulecache'}
+PROJECT_MODULES = {os.path.splitext(name)[0] for name in os.listdir(ROOT) if name.endswith('.py')}
+
+RULES = {
+    'no-such-game\\.exe': {'cpu_mask': '0'},
+    'another-missing-process': {'cpu_mask': '0'},
+}
+
+
+def run(command, env):
+    start = time.perf_counter()
+    result = subprocess.run(command, env=env, capture_output=True, text=True, check=False)
+    return time.perf_counter() - start, result
+
+
+def median_ms(command, env, runs):
+    timings = sorted(run(command, env)[0] for _ in range(runs))
+    return timings[len(timings) // 2] * 1000
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    with tempfile.TemporaryDirectory() as home:
+        config_dir = os.path.join(home, '.config', 'cpu-affinity-manager')
+        os.makedirs(config_dir)
+        with open(os.path.join(config_dir, 'process_settings.json'), 'w') as f:
+            json.dump(RULES, f)
+        env = dict(os.environ, HOME=home)
+        env.pop('APP_DIR', None)
+
+        # The first run finds no rule cache, takes the full path and writes it
+        cold, _result = run([sys.executable, SCRIPT], env)
+        bare = median_ms([sys.executable, '-c', 'pass'], env, runs)
+        fast = median_ms([sys.executable, SCRIPT], env, runs)
+
+        _elapsed, result = run([sys.executable, '-X', 'importtime', SCRIPT], env)
+        imported = set()
+        for line in result.stderr.splitlines():
+            if line.startswith('import time:') and '|' in line:
+                imported.add(line.rsplit('|', 1)[1].strip())
+
+    project = sorted(imported & PROJECT_MODULES)
+    unexpected = sorted(set(project) - ALLOWED_IMPORTS)
+    print(f"python -c pass:          {bare:7.1f} ms")
+    print(f"auto_apply, no cache:    {cold * 1000:7.1f} ms (single run)")
+    print(f"auto_apply, fast path:   {fast:7.1f} ms (budget {BUDGET_MS:.0f} ms)")
+    print(f"modules imported:        {len(imported)}, from this project: {', '.join(project) or 'none'}")
+
+    ok = True
+    if fast > BUDGET_MS:
+        print(f"FAIL: fast path took {fast:.1f} ms, over the {BUDGET_MS:.0f} ms budget")
+        ok = False
+    if unexpected:
+        print(f"FAIL: fast path imported {', '.join(unexpected)}")
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
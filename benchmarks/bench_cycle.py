@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Cost of one enforcement cycle on a synthetic system.
+
+Builds a procfs.SyntheticBackend with PROCESSES processes of THREADS threads
+each and RULES rules, then reports for every enforcement path the wall-clock
+time, the /proc scan and rule matching time, and the directory listings,
+file reads, affinity syscalls and forks (pgrep/ps/taskset) it needed:
+
+  - per-rule pgrep:  apply_cpu_affinity for every rule (the GUI's path)
+  - run_cycle:       one /proc snapshot for all rules (auto_apply oneshot)
+  - enforcer, 1st:   first cycle of a long-running Enforcer (the daemon)
+  - enforcer, idle:  a later cycle with nothing new to do
+  - enforcer, churn: a later cycle after CHURN processes were replaced
+
+pgrep, ps and taskset are emulated in-process, so the time column does not
+include the cost of real forks (around a millisecond each); count them.
+
+    python3 benchmarks/bench_cycle.py [PROCESSES] [THREADS] [RULES] [CHURN]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cpumask import online_cpus
+from engine import Enforcer, plan_cycle, run_cycle, scan_processes
+from matcher import RuleMatcher
+from procfs import SyntheticBackend
+from utils import apply_cpu_affinity
+
+RULE_NAMES = ('firefox', 'steam', 'wineserver', 'java', 'discord', 'code', 'gcc', 'pipewire')
+
+
+def make_rules(count, mask):
+    names = [RULE_NAMES[i] if i < len(RULE_NAMES) else f'no-such-process-{i}' for i in range(count)]
+    return [(name, {'cpu_mask': mask}) for name in names]
+
+
+def measure(backend, run):
+    backend.counters.reset()
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    return elapsed, backend.counters.snapshot()
+
+
+def report(name, elapsed, counters):
+    print(f"{name:18} {elapsed * 1000:9.1f} ms {counters['listdirs']:9} {counters['reads']:9} "
+          f"{counters['syscalls']:9} {counters['forks']:7}")
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    rule_count = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    churn = int(sys.argv[4]) if len(sys.argv) > 4 else 100
+
+    # Synthetic threads start on 64 CPUs, so restricting them to the online
+    # CPUs of this machine really moves every matched thread
+    mask = online_cpus().to_cpulist()
+    rules = make_rules(rule_count, mask)
+    matcher = RuleMatcher(rules)
+    print(f"{processes} processes x {threads} threads, {rule_count} rules, mask {mask}\n")
+
+    backend = SyntheticBackend(processes, threads, cpus=range(64))
+    scan_time, counters = measure(backend, lambda: scan_processes(backend))
+    snapshot = scan_processes(backend)
+    start = time.perf_counter()
+    planned = plan_cycle(snapshot, matcher)
+    match_time = time.perf_counter() - start
+    matched = sum(len(pids) for _name, _settings, pids in planned)
+    print(f"scan:  {scan_time * 1000:.1f} ms for {len(snapshot)} processes "
+          f"({counters['reads']} reads)")
+    print(f"match: {match_time * 1000:.1f} ms, {matched} processes matched "
+          f"({match_time / max(1, len(snapshot)) * 1e6:.2f} us per process)\n")
+
+    print(f"{'path':18} {'time':>12} {'listdirs':>9} {'reads':>9} {'syscalls':>9} {'forks':>7}")
+
+    backend = SyntheticBackend(processes, threads, cpus=range(64))
+    report("per-rule pgrep", *measure(backend, lambda: [
+        apply_cpu_affinity(name, settings['cpu_mask'], quiet=True, backend=backend)
+        for name, settings in rules
+    ]))
+
+    backend = SyntheticBackend(processes, threads, cpus=range(64))
+    report("run_cycle", *measure(backend, lambda: run_cycle(rules, backend=backend)))
+
+    backend = SyntheticBackend(processes, threads, cpus=range(64))
+    enforcer = Enforcer(RuleMatcher(rules), backend=backend, verify_interval=60.0)
+    report("enforcer, 1st", *measure(backend, enforcer.cycle))
+    report("enforcer, idle", *measure(backend, enforcer.cycle))
+
+    pids = list(backend.procs)
+    for index, pid in enumerate(pids[:churn]):
+        backend.remove_process(pid)
+        name = RULE_NAMES[index % len(RULE_NAMES)]
+        backend.add_process(f'/usr/bin/{name} --restarted={index}', name, threads=threads)
+    report("enforcer, churn", *measure(backend, enforcer.cycle))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Check the cgroup cpuset placement against a directory mimicking cgroupfs.
+
+CpusetBackend takes the cgroup root and the /proc location as arguments, so
+it can run against a temporary directory without a delegated cgroup. The
+kernel's side of the few files involved is played by FakeCgroupfs: writing a
+PID to cgroup.procs updates /proc/<pid>/cgroup, and a cgroup can only be
+removed while it holds no process. The script prints every failed check and
+exits with status 1 if there is any.
+
+    python3 benchmarks/check_cpuset.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cgroups import CpusetBackend, SUPERVISOR_GROUP, group_name, own_cgroup
+from cpumask import CpuMask
+
+BASE = '/user.slice/user-1000.slice/user@1000.service/app.slice/cpu-affinity-manager-daemon.service'
+
+
+class FakeCgroupfs(CpusetBackend):
+    """CpusetBackend whose writes have the effects the kernel would give them."""
+
+    def _write(self, path, text):
+        super()._write(path, text)
+        if os.path.basename(path) == 'cgroup.procs':
+            relative = '/' + os.path.relpath(os.path.dirname(path), self.root)
+            set_cgroup(self.proc_root, text, relative)
+
+    def _rmdir(self, path):
+        relative = '/' + os.path.relpath(path, self.root)
+        for pid in os.listdir(self.proc_root):
+            if own_cgroup(self.proc_root, pid) == relative:
+                raise OSError(16, "Device or resource busy")
+        # Interface files go with the cgroup
+        shutil.rmtree(path)
+
+
+def set_cgroup(proc_root, pid, relative):
+    os.makedirs(os.path.join(proc_root, str(pid)), exist_ok=True)
+    with open(os.path.join(proc_root, str(pid), 'cgroup'), 'w') as f:
+        f.write(f'0::{relative}\n')
+
+
+def make_tree(controllers='cpuset cpu memory pids'):
+    """Temporary cgroup root and /proc with the daemon and two processes in BASE."""
+    tmp = tempfile.mkdtemp(prefix='check-cpuset-')
+    root = os.path.join(tmp, 'cgroup')
+    proc_root = os.path.join(tmp, 'proc')
+    base_dir = os.path.join(root, BASE.lstrip('/'))
+    os.makedirs(base_dir)
+    with open(os.path.join(base_dir, 'cgroup.controllers'), 'w') as f:
+        f.write(controllers + '\n')
+    for pid in ('self', str(os.getpid()), '2001', '2002'):
+        set_cgroup(proc_root, pid, BASE)
+    return tmp, root, proc_root, base_dir
+
+
+def read(path):
+    with open(path) as f:
+        return f.read().strip()
+
+
+def main():
+    failures = []
+
+    def check(condition, message):
+        if not condition:
+            failures.append(message)
+            print(f"FAIL: {message}")
+
+    tmp, root, proc_root, base_dir = make_tree()
+    try:
+        backend = FakeCgroupfs(root=root, proc_root=proc_root)
+        check(backend.open(), "open() fails with the cpuset controller delegated")
+        check(read(os.path.join(base_dir, 'cgroup.subtree_control')) == '+cpuset',
+              "open() does not enable cpuset for the children")
+        check(own_cgroup(proc_root, os.getpid()) == f'{BASE}/{SUPERVISOR_GROUP}',
+              "open() does not move the daemon into its own leaf")
+
+        game = group_name('game.exe')
+        check(backend.place(2001, 'game.exe', '0-7,16-23'), "place() fails")
+        check(own_cgroup(proc_root, 2001) == f'{BASE}/{game}', "place() does not move the process")
+        check(read(os.path.join(base_dir, game, 'cpuset.cpus')) == '0-7,16-23',
+              "place() writes the wrong cpuset.cpus")
+        check(own_cgroup(proc_root, 2002) == BASE, "place() moves another process")
+
+        # Placed already: nothing is written
+        os.unlink(os.path.join(base_dir, game, 'cgroup.procs'))
+        check(backend.place(2001, 'game.exe', CpuMask.parse('0-7,16-23')), "place() fails when placed already")
+        check(not os.path.exists(os.path.join(base_dir, game, 'cgroup.procs')),
+              "place() writes cgroup.procs for a process in its cgroup")
+
+        check(backend.place(2001, 'game.exe', '8-15'), "place() fails after the mask changed")
+        check(read(os.path.join(base_dir, game, 'cpuset.cpus')) == '8-15',
+              "place() does not update cpuset.cpus when the mask changed")
+
+        build = group_name('make')
+        check(backend.place(2002, 'make', '0-3'), "place() fails for a second rule")
+        check(not backend.place(2002, 'bad', 'not a mask'), "place() accepts an invalid mask")
+
+        # 'make' is no longer saved but its cgroup is empty once 2002 moved on
+        set_cgroup(proc_root, 2002, BASE)
+        backend.prune({'game.exe'})
+        check(not os.path.exists(os.path.join(base_dir, build)), "prune() keeps an empty cgroup")
+        backend.prune(set())
+        check(os.path.isdir(os.path.join(base_dir, game)), "prune() removes a cgroup with a process")
+        check('game.exe' not in backend.groups and 'make' not in backend.groups,
+              "prune() does not forget the pruned rules")
+    finally:
+        shutil.rmtree(tmp)
+
+    tmp, root, proc_root, _base_dir = make_tree(controllers='cpu memory pids')
+    try:
+        backend = FakeCgroupfs(root=root, proc_root=proc_root)
+        check(not backend.open(), "open() succeeds without the cpuset controller")
+        check(not backend.place(2001, 'game.exe', '0-7'), "place() succeeds after open() failed")
+    finally:
+        shutil.rmtree(tmp)
+
+    if failures:
+        print(f"{len(failures)} checks failed")
+        return 1
+    print("All cpuset placement checks passed")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Check that saved process names keep the meaning they had with `pgrep -f`.
+
+Rule names are POSIX extended regular expressions; they are translated to
+Python's re syntax (ere.py) before matching. Each case below is a pattern,
+a command line and whether pgrep matches it. The rule matcher, the
+synthetic pgrep and the oneshot fast path must all agree, and patterns
+pgrep rejects must not be saved. The script prints every failed check and
+exits with status 1 if there is any.
+
+    python3 benchmarks/check_ere.py
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ere import escape, pattern_error
+from matcher import RuleMatcher
+from procfs import SyntheticBackend
+from rulecache import any_process_matches, load_cache, settings_signature, write_cache
+from settings import SettingsManager
+
+# (pattern, command line, matched by pgrep -f)
+CASES = [
+    ('game', '/opt/game/bin/game.x86_64', True),
+    ('\\d+', '/opt/game 1234', False),
+    ('\\d+', '/usr/bin/ddd', True),
+    ('[[:digit:]]+\\.exe', 'wine C:\\game2.exe', True),
+    ('[[:upper:]]{3}', 'wine abc.exe', False),
+    ('[\\d]', 'C:\\x', True),
+    ('[]x]', 'a]b', True),
+    ('\\<steam\\>', '/usr/bin/steamwebhelper', False),
+    ('\\<steam\\>', '/usr/bin/steam -silent', True),
+    ('\\bsteam\\b', '/usr/bin/steam -silent', True),
+    ('a{', 'a{', True),
+    ('^/usr/bin/steam$', '/usr/bin/steam', True),
+    ('(ab)\\1', 'xabab', True),
+    ('wine|proton', '/usr/bin/proton run', True),
+    ('\\.', 'game.exe', True),
+    ('\\.', 'gameexe', False),
+]
+
+INVALID = ['(?i)game', 'game*?', 'a++', '[[:word:]]', '[abc', 'game\\', '(game']
+
+
+def main():
+    failures = []
+
+    def check(condition, message):
+        if not condition:
+            failures.append(message)
+            print(f"FAIL: {message}")
+
+    backend = SyntheticBackend(processes=0, cpus=range(4))
+    with tempfile.TemporaryDirectory() as directory:
+        for index, (pattern, cmdline, expected) in enumerate(CASES):
+            matcher = RuleMatcher([(pattern, {'cpu_mask': '0x1'})])
+            check(len(matcher) == 1, f"{pattern!r} is rejected")
+            check((matcher.match(cmdline) is not None) == expected,
+                  f"{pattern!r} {'does not match' if expected else 'matches'} {cmdline!r}")
+
+            backend.procs.clear()
+            backend.add_process(cmdline.replace(' ', '\0') + '\0', threads=1)
+            found = backend.run(['pgrep', '-f', pattern]).returncode == 0
+            check(found == expected, f"synthetic pgrep -f {pattern!r} on {cmdline!r} returns {found}")
+
+            # The fast path reads the translated patterns from the rule cache
+            proc_root = os.path.join(directory, f'proc{index}')
+            os.makedirs(os.path.join(proc_root, '1'))
+            with open(os.path.join(proc_root, '1', 'cmdline'), 'wb') as f:
+                f.write(cmdline.replace(' ', '\0').encode() + b'\0')
+            settings_file = os.path.join(directory, 'settings.json')
+            with open(settings_file, 'w') as f:
+                f.write(str(index))
+            signature = settings_signature(settings_file)
+            cache_file = os.path.join(directory, 'rules.cache')
+            write_cache(cache_file, signature, [p.pattern for _n, p, _s in matcher.rules])
+            fast = any_process_matches(*load_cache(cache_file, signature), proc_root=proc_root)
+            check(fast == expected, f"fast path for {pattern!r} on {cmdline!r} returns {fast}")
+
+        for pattern in INVALID:
+            check(pattern_error(pattern) is not None, f"invalid ERE {pattern!r} is accepted")
+            check(len(RuleMatcher([(pattern, {'cpu_mask': '0x1'})])) == 0, f"invalid ERE {pattern!r} is compiled")
+
+        # Settings live under $HOME
+        os.environ['HOME'] = directory
+        manager = SettingsManager()
+        check(not manager.save_process_settings('game*?', {'cpu_mask': '0x1'}), "an invalid ERE is saved")
+        check('game*?' not in manager.settings, "an invalid ERE is kept in the settings")
+
+    for name in ('Game (x64).exe', 'a+b', 'x[1]^$', 'back\\slash'):
+        matcher = RuleMatcher([(escape(name), {'cpu_mask': '0x1'})])
+        check(matcher.match(f'/bin/{name} --flag') is not None, f"escaped {name!r} does not match itself")
+
+    if failures:
+        print(f"{len(failures)} checks failed")
+        return 1
+    print("All ERE checks passed")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Check the encoding of scheduling attributes against the kernel's rules.
+
+ioprio_set accepts a level only for the realtime and best-effort classes;
+'none' and 'idle' must be encoded with level 0, or every apply fails with
+EINVAL. The script prints every failed check and exits with status 1 if
+there is any.
+
+    python3 benchmarks/check_schedattrs.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from procfs import SyntheticBackend
+from schedattrs import SchedAttrs, ioprio_name, ioprio_value
+
+# ioprio setting -> value the kernel expects
+EXPECTED_IOPRIO = [
+    ({'class': 'none'}, 0),
+    ({'class': 'none', 'level': 7}, 0),
+    ({'class': 'idle'}, 3 << 13),
+    ({'class': 'idle', 'level': 2}, 3 << 13),
+    ({'class': 'best-effort'}, 2 << 13 | 4),
+    ({'class': 'best-effort', 'level': 0}, 2 << 13),
+    ({'class': 'realtime', 'level': 7}, 1 << 13 | 7),
+]
+
+
+def main():
+    failures = []
+
+    def check(condition, message):
+        if not condition:
+            failures.append(message)
+            print(f"FAIL: {message}")
+
+    check(ioprio_value('none') == 0, f"ioprio_value('none') is {ioprio_value('none')}, not 0")
+    check(ioprio_value('none', 4) == 0, f"ioprio_value('none', 4) is {ioprio_value('none', 4)}, not 0")
+    for ioprio, expected in EXPECTED_IOPRIO:
+        attrs = SchedAttrs.from_settings({'ioprio': ioprio})
+        value = attrs.ioprio if attrs is not None else None
+        check(value == expected, f"{ioprio} is encoded as {value}, not {expected}")
+    check(ioprio_name(0) == 'none', f"ioprio_name(0) is {ioprio_name(0)!r}")
+    check(ioprio_name(2 << 13 | 4) == 'best-effort/4', f"ioprio_name of best-effort/4 is {ioprio_name(2 << 13 | 4)!r}")
+
+    for invalid in ({'nice': 20}, {'sched_policy': 'fifo'}, {'ioprio': {'class': 'best-effort', 'level': 8}},
+                    {'ioprio': {'level': 1}}):
+        check(SchedAttrs.from_settings(invalid) is None, f"{invalid} is accepted")
+
+    backend = SyntheticBackend(processes=0, cpus=range(4))
+    pid = backend.add_process('/usr/bin/make', threads=2)
+    tids = [int(tid) for tid in backend.list_tids(pid)]
+    attrs = SchedAttrs.from_settings({'sched_policy': 'batch', 'nice': 10, 'ioprio': {'class': 'idle'}})
+    check(all(attrs.apply(tid, backend) for tid in tids), "apply() reports no change on a fresh thread")
+    check(not any(attrs.apply(tid, backend) for tid in tids), "apply() changes attributes already set")
+    check(all(backend.get_policy(tid) == os.SCHED_BATCH and backend.get_nice(tid) == 10
+              and backend.get_ioprio(tid) == 3 << 13 for tid in tids), "apply() sets the wrong attributes")
+
+    if failures:
+        print(f"{len(failures)} checks failed")
+        return 1
+    print("All scheduling attribute checks passed")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Check the generated CPU mask presets against recorded sysfs trees.
+
+A recording is a JSON object of path (relative to /sys) -> file contents,
+holding just the files topology.CpuTopology reads. Each is written out to a
+temporary directory that stands in for /sys, and the presets generated from
+it are compared with the expected ones below. The script exits with status 1
+if any differ.
+
+    python3 benchmarks/check_topology.py
+    python3 benchmarks/check_topology.py --record this-machine.json
+
+The recordings in benchmarks/sysfs/ follow the layout the kernel exposes on
+these models: a Ryzen 9 7950X3D and 7900X3D (two CCDs, V-Cache on CCD 0,
+SMT siblings in the upper half), a Ryzen 7 9800X3D (one CCD with SMT) and a
+Core i9-13900K (hybrid, P-core siblings adjacent, E-cores without SMT).
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from topology import CpuTopology
+
+RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sysfs')
+
+# Recording -> expected presets as (kind, cpulist), in the order generated
+EXPECTED = {
+    'ryzen9-7950x3d.json': [
+        ('default', '0-7,16-23'),
+        ('all', '0-31'),
+        ('ccd', '8-15,24-31'),
+        ('ccd_no_smt', '0-7'),
+        ('ccd_no_smt', '8-15'),
+        ('no_smt', '0-15'),
+    ],
+    'ryzen9-7900x3d.json': [
+        ('default', '0-5,12-17'),
+        ('all', '0-23'),
+        ('ccd', '6-11,18-23'),
+        ('ccd_no_smt', '0-5'),
+        ('ccd_no_smt', '6-11'),
+        ('no_smt', '0-11'),
+    ],
+    'ryzen7-9800x3d.json': [
+        ('default', '0-15'),
+        ('no_smt', '0-7'),
+    ],
+    'core-i9-13900k.json': [
+        ('default', '0-15'),
+        ('all', '0-31'),
+        ('ecores', '16-31'),
+        ('no_smt', '0,2,4,6,8,10,12,14,16-31'),
+    ],
+}
+
+# The default mask is chosen from this kind of group
+EXPECTED_SOURCE = {
+    'ryzen9-7950x3d.json': 'vcache',
+    'ryzen9-7900x3d.json': 'vcache',
+    'ryzen7-9800x3d.json': 'all',
+    'core-i9-13900k.json': 'pcores',
+}
+
+# Files CpuTopology reads, relative to /sys
+RECORDED_FILES = (
+    'devices/system/cpu/online',
+    'devices/system/cpu/cpu[0-9]*/topology/core_cpus_list',
+    'devices/system/cpu/cpu[0-9]*/topology/thread_siblings_list',
+    'devices/system/cpu/cpu[0-9]*/cache/index[0-9]*/level',
+    'devices/system/cpu/cpu[0-9]*/cache/index[0-9]*/shared_cpu_list',
+    'devices/system/cpu/cpu[0-9]*/cache/index[0-9]*/size',
+    'devices/cpu_core/cpus',
+    'devices/cpu_atom/cpus',
+)
+
+
+def record(path, sysfs_root='/sys'):
+    files = {}
+    for pattern in RECORDED_FILES:
+        for name in glob.glob(os.path.join(sysfs_root, pattern)):
+            try:
+                with open(name) as f:
+                    files[os.path.relpath(name, sysfs_root)] = f.read().strip()
+            except OSError:
+                pass
+    with open(path, 'w') as f:
+        json.dump(files, f, indent=1, sort_keys=True)
+    print(f"Recorded {len(files)} files of {sysfs_root} to {path}")
+
+
+def load(path):
+    """CpuTopology of a recording, read from a temporary copy of its files."""
+    with open(path) as f:
+        files = json.load(f)
+    root = tempfile.mkdtemp(prefix='check-topology-')
+    try:
+        for name, text in files.items():
+            target = os.path.join(root, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'w') as f:
+                f.write(text + '\n')
+        return CpuTopology(root)
+    finally:
+        shutil.rmtree(root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check generated CPU mask presets against recorded sysfs trees.")
+    parser.add_argument('recordings', nargs='*', help="Recordings to show presets for (default: check the bundled ones)")
+    parser.add_argument('--record', metavar='PATH', help="Record this machine's sysfs files to PATH instead")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record)
+        return 0
+
+    if args.recordings:
+        for path in args.recordings:
+            print(path)
+            for mask, kind, details in load(path).presets():
+                print(f"  {kind:<11} {mask.to_cpulist():<24} {details or ''}")
+        return 0
+
+    failures = 0
+    for name, expected in EXPECTED.items():
+        presets = load(os.path.join(RECORDINGS, name)).presets()
+        generated = [(kind, mask.to_cpulist()) for mask, kind, _details in presets]
+        source = presets[0][2].get('source')
+        if generated != expected or source != EXPECTED_SOURCE[name]:
+            failures += 1
+            print(f"FAIL: {name}")
+            print(f"  expected {expected} (default from {EXPECTED_SOURCE[name]})")
+            print(f"  got      {generated} (default from {source})")
+        else:
+            print(f"ok: {name}")
+
+    if failures:
+        print(f"{failures} recordings failed")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Record /proc/stat and replay it through the rebalancer.
+
+A trace is a JSON-lines file of {"time": seconds, "stat": "<contents of
+/proc/stat>"}. Replaying one feeds every sample to rebalance.Rebalancer with
+the given rule and prints the decisions it makes, so thresholds, window and
+dwell times can be tuned against a recorded gaming session:
+
+    python3 benchmarks/replay_rebalance.py --record trace.jsonl [--seconds 120]
+    python3 benchmarks/replay_rebalance.py trace.jsonl --cpu-mask 0-7,16-23 \\
+        --secondary-mask 8-15,24-31 [--mode widen] [--high 0.9] [--low 0.6]
+
+Without a trace, a synthetic one is replayed: the preferred CPUs are
+saturated for a minute, then almost idle for a minute. In 'widen' mode the
+script exits with status 1 unless the rule spills over exactly once and
+returns exactly once, at the times the window and dwell settings allow, so
+it can be used as a check.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cpumask import CpuMask
+from procfs import SyntheticBackend
+from rebalance import Rebalancer, RebalanceConfig
+
+INTERVAL = 1.0      # Seconds between samples, as in the daemon
+
+
+def record(path, seconds):
+    with open(path, 'w') as f:
+        start = time.monotonic()
+        for _ in range(int(seconds / INTERVAL) + 1):
+            with open('/proc/stat') as stat:
+                f.write(json.dumps({'time': time.monotonic() - start, 'stat': stat.read()}) + '\n')
+            time.sleep(INTERVAL)
+    print(f"Recorded {seconds:.0f} seconds of /proc/stat to {path}")
+
+
+def load_trace(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def synthetic_trace(cpus=16, busy_cpus=range(8), busy_seconds=60, idle_seconds=60):
+    """/proc/stat samples with busy_cpus at 100% for busy_seconds, then at 10%."""
+    ticks = [[0, 0] for _ in range(cpus)]   # busy, idle jiffies
+    trace = []
+    for second in range(busy_seconds + idle_seconds + 1):
+        busy_share = 100 if second < busy_seconds else 10
+        lines = ['cpu  0 0 0 0 0 0 0 0 0 0']
+        for cpu in range(cpus):
+            share = busy_share if cpu in busy_cpus else 5
+            ticks[cpu][0] += share
+            ticks[cpu][1] += 100 - share
+            lines.append(f'cpu{cpu} {ticks[cpu][0]} 0 0 {ticks[cpu][1]} 0 0 0 0 0 0')
+        trace.append({'time': float(second), 'stat': '\n'.join(lines) + '\n'})
+    return trace
+
+
+def replay(trace, config):
+    backend = SyntheticBackend(processes=0)
+    rebalancer = Rebalancer(backend)
+    decisions = []
+    for sample in trace:
+        backend.system_files['stat'] = sample['stat'].encode()
+        for decision in rebalancer.update({'rule': config}, now=sample['time']):
+            decisions.append(decision)
+    return decisions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record or replay /proc/stat for the rebalancer.")
+    parser.add_argument('trace', nargs='?', help="Trace to replay (default: a synthetic one)")
+    parser.add_argument('--record', metavar='PATH', help="Record a trace to PATH instead")
+    parser.add_argument('--seconds', type=float, default=120.0, help="Seconds to record")
+    parser.add_argument('--cpu-mask', default='0-7', help="The rule's preferred CPUs")
+    parser.add_argument('--secondary-mask', default='8-15', help="CPUs to spill over to")
+    parser.add_argument('--mode', default='widen', choices=('widen', 'shift'))
+    parser.add_argument('--high', type=float, default=0.9)
+    parser.add_argument('--low', type=float, default=0.6)
+    parser.add_argument('--window', type=float, default=5.0)
+    parser.add_argument('--min-dwell', type=float, default=30.0)
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, args.seconds)
+        return 0
+
+    # Built directly: the CPUs of a trace need not be online on this machine
+    config = RebalanceConfig(CpuMask.parse(args.cpu_mask), CpuMask.parse(args.secondary_mask), args.mode,
+                             args.high, args.low, args.window, args.min_dwell)
+
+    trace = load_trace(args.trace) if args.trace else synthetic_trace()
+    decisions = replay(trace, config)
+    print(f"{len(trace)} samples, {len(decisions)} decisions")
+    if args.trace or args.mode != 'widen':
+        # The synthetic load does not follow the rule to the secondary CPUs
+        return 0
+
+    # The synthetic load saturates the preferred CPUs from the start and drops
+    # at 60 s: spill once the first window is full and the dwell is over,
+    # return within a window of the drop
+    spill_at = max(args.window, args.min_dwell)
+    actual = [(decision.spilled, decision.time) for decision in decisions]
+    ok = (len(actual) == 2 and actual[0] == (True, spill_at) and not actual[1][0]
+          and 60.0 < actual[1][1] <= max(60.0 + args.window, spill_at + args.min_dwell))
+    if not ok:
+        print(f"FAIL: expected a spill at {spill_at:.0f}s and a return within {args.window:.0f}s "
+              f"of the load dropping at 60s, got {actual}")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
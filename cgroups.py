@@ -0,0 +1,157 @@
+# cpu-affinity-manager/cgroups.py
+
+import os
+import re
+import sys
+import zlib
+
+from cpumask import CpuMask
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+SUPERVISOR_GROUP = 'supervisor'     # Leaf the daemon moves itself into
+GROUP_PREFIX = 'rule-'
+
+
+def own_cgroup(proc_root='/proc', pid='self'):
+    """Path of a process's cgroup v2 relative to the hierarchy root, or None."""
+    try:
+        with open(f'{proc_root}/{pid}/cgroup') as f:
+            for line in f:
+                hierarchy, _controllers, path = line.rstrip('\n').split(':', 2)
+                if hierarchy == '0':
+                    return path
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def group_name(process_name):
+    """cgroup directory name of a rule: readable, unique and safe as a path component."""
+    readable = re.sub(r'[^A-Za-z0-9_.-]+', '_', process_name).strip('._')[:48]
+    return f'{GROUP_PREFIX}{readable}-{zlib.crc32(process_name.encode()):08x}'
+
+
+class CpusetBackend:
+    """
+    Places processes in one cgroup v2 cpuset per rule.
+
+    The cgroup the daemon runs in must be delegated to the user with the
+    cpuset controller available, e.g. a systemd user service with
+    Delegate=cpuset. open() moves the daemon into a leaf of its own, enables
+    cpuset for the children and creates a child per rule whose cpuset.cpus
+    is the rule's mask. A process is then placed with one write of its PID
+    to cgroup.procs; threads started later inherit the cpuset, and the
+    process cannot widen its affinity beyond it.
+
+    Moving a process needs write access to the common ancestor of its
+    current and new cgroup, which systemd only grants within the user's own
+    manager. When a move fails, the caller falls back to per-thread affinity.
+
+    root and proc_root can point at directories mimicking cgroupfs and /proc.
+    """
+
+    def __init__(self, root=CGROUP_ROOT, base=None, proc_root='/proc'):
+        """
+        Args:
+            root (str): Mount point of the cgroup v2 hierarchy
+            base (str): Delegated cgroup relative to root, the daemon's own if None
+            proc_root (str): Location of /proc
+        """
+        self.root = root
+        self.base = base
+        self.proc_root = proc_root
+        self.base_dir = None
+        self.groups = {}    # process_name -> (relative path, CpuMask written)
+
+    def _write(self, path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def _rmdir(self, path):
+        os.rmdir(path)
+
+    def open(self, quiet=True):
+        """Prepare the delegated cgroup. Returns False if cpuset placement is unavailable."""
+        base = self.base if self.base is not None else own_cgroup(self.proc_root)
+        if base is None:
+            if not quiet:
+                print("cgroup v2 is not mounted, using per-thread affinity", file=sys.stderr)
+            return False
+        base_dir = os.path.join(self.root, base.lstrip('/'))
+        try:
+            with open(os.path.join(base_dir, 'cgroup.controllers')) as f:
+                controllers = f.read().split()
+        except OSError as e:
+            if not quiet:
+                print(f"Cannot read the controllers of cgroup {base}: {e}", file=sys.stderr)
+            return False
+        if 'cpuset' not in controllers:
+            if not quiet:
+                # user@.service does not delegate cpuset unless configured to
+                print(f"The cpuset controller is not delegated to cgroup {base}, using per-thread affinity. "
+                      f"Add cpuset to Delegate= of user@.service to enable it", file=sys.stderr)
+            return False
+
+        try:
+            # Only leaf cgroups may hold processes once controllers are enabled
+            supervisor = os.path.join(base_dir, SUPERVISOR_GROUP)
+            os.makedirs(supervisor, exist_ok=True)
+            if self.base is None:
+                self._write(os.path.join(supervisor, 'cgroup.procs'), str(os.getpid()))
+            self._write(os.path.join(base_dir, 'cgroup.subtree_control'), '+cpuset')
+        except OSError as e:
+            if not quiet:
+                print(f"Cannot set up cpuset placement in cgroup {base}: {e}", file=sys.stderr)
+            return False
+        self.base = base
+        self.base_dir = base_dir
+        return True
+
+    def _group(self, process_name, mask):
+        """Create or update the cgroup of a rule. Returns its path relative to root."""
+        group = self.groups.get(process_name)
+        if group is not None and group[1] == mask:
+            return group[0]
+        name = group_name(process_name)
+        path = os.path.join(self.base_dir, name)
+        os.makedirs(path, exist_ok=True)
+        self._write(os.path.join(path, 'cpuset.cpus'), mask.to_cpulist())
+        relative = f"{self.base.rstrip('/')}/{name}"
+        self.groups[process_name] = (relative, mask)
+        return relative
+
+    def place(self, pid, process_name, cpu_mask):
+        """
+        Move a process, with all its threads, into the cgroup of its rule.
+        If the rule's mask changed, the cgroup's cpuset.cpus is updated,
+        which moves every process in it at once.
+
+        Returns:
+            bool: True if the process is in the rule's cgroup
+        """
+        if self.base_dir is None:
+            return False
+        try:
+            mask = cpu_mask if isinstance(cpu_mask, CpuMask) else CpuMask.parse(cpu_mask)
+            relative = self._group(process_name, mask)
+            if self.contains(pid, relative):
+                return True
+            self._write(os.path.join(self.root, relative.lstrip('/'), 'cgroup.procs'), str(pid))
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def contains(self, pid, relative):
+        return own_cgroup(self.proc_root, pid) == relative
+
+    def prune(self, process_names):
+        """Remove the cgroups of rules not in process_names once they are empty."""
+        for process_name in list(self.groups):
+            if process_name in process_names:
+                continue
+            relative, _mask = self.groups.pop(process_name)
+            try:
+                self._rmdir(os.path.join(self.root, relative.lstrip('/')))
+            except OSError:
+                # Still has processes; they keep the old cpuset until they exit
+                pass
@@ -0,0 +1,180 @@
+# cpu-affinity-manager/cpumask.py
+
+import functools
+import os
+import string
+
+ONLINE_CPUS_FILE = '/sys/devices/system/cpu/online'
+MAX_CPUS = 8192  # Largest NR_CPUS the kernel can be built with
+
+
+class CpuMask:
+    """
+    An immutable set of CPUs, parsed once.
+
+    Accepts hex masks ("0x00FF00FF", or the kernel's comma-separated 32-bit
+    words such as "0xffffffff,00000000") and the kernel's cpulist format
+    ("0-7,16-23"). The CPU numbers are stored as an int bitmap, so masks for
+    machines with hundreds of CPUs are as cheap as small ones, and the
+    frozenset handed to os.sched_setaffinity is built only once.
+    """
+    __slots__ = ('bits', '_cpus')
+
+    def __init__(self, bits=0):
+        if bits < 0:
+            raise ValueError("CPU mask cannot be negative")
+        self.bits = bits
+        self._cpus = None
+
+    @classmethod
+    def parse(cls, text):
+        """Parse a hex mask or cpulist string. Raises ValueError if invalid."""
+        if isinstance(text, cls):
+            return text
+        if not isinstance(text, str):
+            raise ValueError(f"CPU mask must be a string: {text!r}")
+        return _parse_cached(text)
+
+    @classmethod
+    def from_hex(cls, text):
+        text = text.strip()
+        if text[:2].lower() != '0x':
+            raise ValueError(f"Hex CPU mask must start with 0x: {text!r}")
+        digits = text[2:].replace(',', '')
+        if not digits or not all(c in string.hexdigits for c in digits):
+            raise ValueError(f"Invalid hex CPU mask: {text!r}")
+        # Checked on the digits, before building an arbitrarily large int
+        if len(digits.lstrip('0')) > MAX_CPUS // 4:
+            raise ValueError(f"Hex CPU mask is wider than {MAX_CPUS} CPUs: {text[:20]!r}...")
+        return cls(int(digits, 16))
+
+    @classmethod
+    def from_cpulist(cls, text):
+        bits = 0
+        for part in text.strip().split(','):
+            part = part.strip()
+            if not part:
+                raise ValueError(f"Empty entry in CPU list: {text!r}")
+            first, sep, last = part.partition('-')
+            if not first.isdigit() or (sep and not last.isdigit()):
+                raise ValueError(f"Invalid CPU list entry {part!r}")
+            start = int(first)
+            end = int(last) if sep else start
+            if end < start or end >= MAX_CPUS:
+                raise ValueError(f"Invalid CPU range {part!r}")
+            bits |= ((1 << (end - start + 1)) - 1) << start
+        return cls(bits)
+
+    @classmethod
+    def from_cpus(cls, cpus):
+        bits = 0
+        for cpu in cpus:
+            bits |= 1 << cpu
+        return cls(bits)
+
+    @property
+    def cpus(self):
+        """The CPUs in this mask as a frozenset (built on first use)."""
+        if self._cpus is None:
+            binary = bin(self.bits)[:1:-1]
+            self._cpus = frozenset(cpu for cpu, bit in enumerate(binary) if bit == '1')
+        return self._cpus
+
+    def to_hex(self):
+        """Hex form with at least 8 digits, e.g. '0x00FF00FF'."""
+        return f"0x{self.bits:08X}"
+
+    def to_cpulist(self):
+        """Kernel cpulist form, e.g. '0-7,16-23'."""
+        ranges = []
+        start = prev = None
+        for cpu in sorted(self.cpus):
+            if prev is not None and cpu == prev + 1:
+                prev = cpu
+                continue
+            if start is not None:
+                ranges.append(_format_range(start, prev))
+            start = prev = cpu
+        if start is not None:
+            ranges.append(_format_range(start, prev))
+        return ','.join(ranges)
+
+    def complement(self, universe=None):
+        """CPUs of universe (default: all online CPUs) that are not in this mask."""
+        if universe is None:
+            universe = online_cpus()
+        return CpuMask(universe.bits & ~self.bits)
+
+    def online(self):
+        """The part of this mask that is currently online."""
+        return self & online_cpus()
+
+    def is_valid(self):
+        """True if the mask contains at least one online CPU."""
+        return bool(self.bits & online_cpus().bits)
+
+    def __or__(self, other):
+        return CpuMask(self.bits | CpuMask.parse(other).bits)
+
+    def __and__(self, other):
+        return CpuMask(self.bits & CpuMask.parse(other).bits)
+
+    def __sub__(self, other):
+        return CpuMask(self.bits & ~CpuMask.parse(other).bits)
+
+    def __invert__(self):
+        return self.complement()
+
+    def __eq__(self, other):
+        if isinstance(other, CpuMask):
+            return self.bits == other.bits
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def __bool__(self):
+        return self.bits != 0
+
+    def __len__(self):
+        return bin(self.bits).count('1')
+
+    def __iter__(self):
+        return iter(sorted(self.cpus))
+
+    def __contains__(self, cpu):
+        return cpu >= 0 and bool(self.bits >> cpu & 1)
+
+    def __str__(self):
+        return self.to_hex()
+
+    def __repr__(self):
+        return f"CpuMask('{self.to_cpulist()}')"
+
+
+def _format_range(start, end):
+    return str(start) if start == end else f"{start}-{end}"
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_cached(text):
+    text = text.strip()
+    if not text:
+        raise ValueError("CPU mask is empty")
+    if text[:2].lower() == '0x':
+        return CpuMask.from_hex(text)
+    return CpuMask.from_cpulist(text)
+
+
+@functools.lru_cache(maxsize=1)
+def online_cpus(path=ONLINE_CPUS_FILE):
+    """
+    CPUs the kernel reports online. Read once and cached; long-running
+    callers call online_cpus.cache_clear() now and then to notice CPU
+    hotplug or SMT being switched on or off.
+    """
+    try:
+        with open(path) as f:
+            return CpuMask.from_cpulist(f.read())
+    except (OSError, ValueError):
+        return CpuMask.from_cpus(range(os.cpu_count() or 1))
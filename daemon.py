@@ -0,0 +1,261 @@
+# cpu-affinity-manager/daemon.py
+
+import select
+import signal
+import socket
+import sys
+import time
+
+from cgroups import CpusetBackend
+from engine import Enforcer
+from hotthreads import SAMPLE_INTERVAL
+from irq import RULE, IrqSteering
+from metrics import StatsWriter
+from proc_events import ProcConnector, PROC_EVENT_EXEC, PROC_EVENT_EXIT
+from scheduler import TimerWheel
+from settings import SettingsManager
+
+MIN_POLL_INTERVAL = 1.0     # Seconds between /proc scans while processes come and go
+# Upper bound the poll interval backs off to on an idle system. A user
+# service never has CAP_NET_ADMIN, so this is how long a new game may run
+# unplaced; a steady-state poll only reads the stat file of each process.
+MAX_POLL_INTERVAL = 3.0
+RESYNC_INTERVAL = 60.0      # Full rescan to catch affinity changed behind our back
+
+
+class EnforcementDaemon:
+    """
+    Long-running enforcement loop for the saved process settings.
+
+    With the netlink proc connector, every exec triggers a match-and-apply for
+    just that process, so a new game is placed within milliseconds. The
+    connector needs CAP_NET_ADMIN, which the user service installed by the
+    GUI does not have; then the daemon polls /proc, every min_interval while
+    new processes keep appearing, backing off to max_interval while the
+    system is idle.
+
+    Enforcement state is kept in an Enforcer between cycles, so steady-state
+    cycles only look at new processes and threads. When a process is first
+    matched, the later waves of its rule's 'reapply_waves' go on a timer
+    wheel, so threads the program starts afterwards are placed without
+    polling. Its stats are written to the settings directory and, if
+    metrics_textfile is set, as a Prometheus textfile.
+
+    Interrupts named in a rule's 'irq_affinity' setting are steered while
+    its processes run, and the other processes of the user are kept off the
+    CPUs of 'exclusive' rules; both are undone when the rule's processes
+    exit or the daemon stops.
+
+    With cpuset set, processes are placed in a cpuset cgroup per rule where
+    the service's cgroup allows it (see cgroups.CpusetBackend).
+    """
+
+    def __init__(self, manager=None, quiet=True,
+                 min_interval=MIN_POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL,
+                 resync_interval=RESYNC_INTERVAL, metrics_textfile=None, cpuset=False):
+        self.manager = manager or SettingsManager()
+        self.quiet = quiet
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.resync_interval = resync_interval
+        self.running = False
+        cpuset_backend = None
+        if cpuset:
+            cpuset_backend = CpusetBackend()
+            if not cpuset_backend.open(quiet=False):
+                # Per-thread affinity works everywhere
+                cpuset_backend = None
+        self.enforcer = Enforcer(quiet=quiet, verify_interval=resync_interval, cpuset=cpuset_backend,
+                                 irqs=IrqSteering(state_file=self.manager.irq_state_file), isolation=True)
+        self.waves = TimerWheel()
+        self._due_pids = set()
+        self.stats_writer = StatsWriter(self.enforcer.stats, self.manager.stats_file, metrics_textfile)
+        self.watcher = None
+        self._wakeup_r = None
+        self._wakeup_w = None
+        self._load_rules()
+
+    def _load_rules(self):
+        self.enforcer.set_rules(self.manager.get_matcher(quiet=self.quiet))
+
+    def _check_settings(self, ready=()):
+        """
+        Recompile rules if the settings file changed. Returns True if it did.
+
+        With an inotify watcher the file is only looked at after the watcher
+        reported an event in ready; otherwise its mtime is checked every time.
+        """
+        if self.watcher is not None:
+            if self.watcher not in ready or not self.watcher.read_changed():
+                return False
+        if self.manager.reload_if_changed():
+            self._load_rules()
+            return True
+        return False
+
+    def _schedule_waves(self):
+        """Schedule the re-apply waves of the processes the last pass matched."""
+        for tracked in self.enforcer.new_matches:
+            for offset in self.enforcer.matcher.waves(tracked.rule):
+                if offset > 0:
+                    self.waves.schedule(offset, self._reapply, tracked.pid, tracked.starttime)
+
+    def _reapply(self, pid, starttime):
+        tracked = self.enforcer.tracked.get(pid)
+        if tracked is not None and tracked.starttime == starttime:
+            self._due_pids.add(pid)
+
+    def _run_waves(self):
+        """Enforce the processes whose re-apply waves are due, in one pass."""
+        self.waves.advance()
+        if self._due_pids:
+            pids, self._due_pids = self._due_pids, set()
+            self.enforcer.enforce_pids(pids)
+
+    def _next_deadline(self, deadline):
+        wave = self.waves.next_deadline()
+        return deadline if wave is None else min(deadline, wave)
+
+    def _sample_deadline(self, deadline, next_sample):
+        """Bring deadline forward to next_sample if some rule samples CPU time."""
+        if self.enforcer.has_adaptive():
+            # Hot-thread promotion and rebalancing need regular CPU time samples
+            return min(deadline, next_sample)
+        return deadline
+
+    def _log(self, message):
+        if not self.quiet:
+            print(message)
+
+    def stop(self, *args):
+        self.running = False
+
+    def run(self):
+        """Run until SIGTERM/SIGINT, preferring proc connector events over polling."""
+        self.running = True
+        self._setup_signals()
+        connector = ProcConnector()
+        self.watcher = self.manager.watch()
+        try:
+            if connector.open(quiet=self.quiet):
+                self._log("Listening for process events from the kernel.")
+                self._run_events(connector)
+            if self.running:
+                self._log("Process events unavailable, polling /proc instead.")
+                self._run_polling()
+        finally:
+            connector.close()
+            if self.watcher is not None:
+                self.watcher.close()
+                self.watcher = None
+            self._teardown_signals()
+            # Steered interrupts go back to their CPUs while the service is stopped
+            self.enforcer.irqs.restore(RULE)
+            self.enforcer.isolator.restore()
+            self.stats_writer.write()
+
+    def _setup_signals(self):
+        # Signals only set a flag; the wakeup fd makes a pending select() return
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        signal.set_wakeup_fd(self._wakeup_w.fileno())
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+    def _teardown_signals(self):
+        signal.set_wakeup_fd(-1)
+        self._wakeup_r.close()
+        self._wakeup_w.close()
+
+    def _wait(self, timeout, extra=()):
+        """Sleep up to timeout seconds, returning the readable objects in extra."""
+        readable, _, _ = select.select([self._wakeup_r, *extra], [], [], max(0.0, timeout))
+        if self._wakeup_r in readable:
+            try:
+                self._wakeup_r.recv(512)
+            except BlockingIOError:
+                pass
+        return [obj for obj in readable if obj is not self._wakeup_r]
+
+    def _watched(self):
+        return (self.watcher,) if self.watcher is not None else ()
+
+    def _run_events(self, connector):
+        self.enforcer.cycle(verify=True)
+        self._schedule_waves()
+        self.stats_writer.maybe_write()
+        next_resync = time.monotonic() + self.resync_interval
+        next_sample = time.monotonic() + SAMPLE_INTERVAL
+
+        while self.running:
+            deadline = self._next_deadline(self._sample_deadline(next_resync, next_sample))
+            ready = self._wait(deadline - time.monotonic(), (connector, *self._watched()))
+            if not self.running:
+                break
+
+            resync = self._check_settings(ready) or time.monotonic() >= next_resync
+            if connector in ready:
+                events = connector.read_events()
+                if connector.error:
+                    print(f"Process event subscription rejected (errno {connector.error})", file=sys.stderr)
+                    return
+                if connector.overflowed:
+                    # Events were dropped, only a full scan is reliable now
+                    connector.overflowed = False
+                    resync = True
+                elif not resync:
+                    for event in events:
+                        if event.what == PROC_EVENT_EXIT and not event.is_thread:
+                            self.enforcer.forget(event.tgid)
+                    tgids = {event.tgid for event in events if event.what == PROC_EVENT_EXEC}
+                    for tgid in tgids:
+                        self.enforcer.forget(tgid)
+                    self.enforcer.enforce_pids(tgids)
+                    self._schedule_waves()
+
+            if resync:
+                self.enforcer.cycle(verify=True)
+                self._schedule_waves()
+                next_resync = time.monotonic() + self.resync_interval
+            else:
+                self._run_waves()
+                if time.monotonic() >= next_sample and self.enforcer.has_adaptive():
+                    self.enforcer.sample_adaptive()
+            if time.monotonic() >= next_sample:
+                next_sample = time.monotonic() + SAMPLE_INTERVAL
+            self.stats_writer.maybe_write()
+
+    def _run_polling(self):
+        interval = self.min_interval
+        self.enforcer.cycle(verify=True)
+        self._schedule_waves()
+        self.stats_writer.maybe_write()
+        next_poll = time.monotonic() + interval
+
+        while self.running:
+            deadline = self._next_deadline(next_poll)
+            ready = self._wait(deadline - time.monotonic(), self._watched())
+            if not self.running:
+                break
+            if time.monotonic() < next_poll and not ready:
+                # Only a re-apply wave was due
+                self._run_waves()
+                self.stats_writer.maybe_write()
+                continue
+
+            # Only new processes and threads are touched; enforced threads are
+            # re-checked for drift once every resync_interval
+            self._check_settings(ready)
+            self.enforcer.cycle()
+            self._schedule_waves()
+            self._run_waves()
+            # Hot threads are re-sampled by cycle() itself
+            self.enforcer.rebalance()
+            if self.enforcer.new_processes:
+                interval = self.min_interval
+            else:
+                interval = min(interval * 2, self.max_interval)
+            now = time.monotonic()
+            next_poll = self._sample_deadline(now + interval, now + SAMPLE_INTERVAL)
+            self.stats_writer.maybe_write()
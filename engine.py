@@ -0,0 +1,655 @@
+# cpu-affinity-manager/engine.py
+
+import time
+
+from cpumask import CpuMask, online_cpus
+from hotthreads import HotThreadTracker
+from isolation import Isolator
+from matcher import RuleMatcher
+from metrics import CycleStats, EnforcementStats
+from procfs import get_backend
+from rebalance import Rebalancer
+from utils import ApplyResult, apply_mask_to_tids, get_tids_for_pid
+
+
+class ProcessInfo:
+    """A single process as seen by one /proc scan."""
+    __slots__ = ('pid', 'comm', 'cmdline')
+
+    def __init__(self, pid, comm, cmdline):
+        self.pid = pid
+        self.comm = comm
+        self.cmdline = cmdline
+
+    @property
+    def match_text(self):
+        """Text a rule is matched against (same as `pgrep -f`)."""
+        return self.cmdline or self.comm
+
+
+def scan_processes(backend=None):
+    """
+    Read /proc once and return a list of ProcessInfo for every process.
+
+    Each process costs one read of its cmdline; comm is only read for
+    processes without a command line (kernel threads, zombies), which is
+    what `pgrep -f` falls back to as well.
+    """
+    backend = backend or get_backend()
+    own_pid = backend.own_pid()
+    processes = []
+    try:
+        entries = backend.list_pids()
+    except OSError as e:
+        print(f"Error reading {backend.proc_root}: {e}")
+        return processes
+
+    for entry in entries:
+        if int(entry) == own_pid:
+            # pgrep never reports itself, neither do we
+            continue
+        proc = read_process(entry, backend)
+        if proc is not None:
+            processes.append(proc)
+
+    return processes
+
+
+def read_process(pid, backend=None):
+    """Read a single process, or return None if it no longer exists."""
+    backend = backend or get_backend()
+    raw = backend.read(pid, 'cmdline')
+    if raw is None:
+        # Process exited between listdir() and open()
+        return None
+    cmdline = raw.rstrip(b'\0').replace(b'\0', b' ').decode('utf-8', 'replace')
+
+    comm = ''
+    if not cmdline:
+        raw = backend.read(pid, 'comm')
+        if raw is None:
+            return None
+        comm = raw.rstrip(b'\n').decode('utf-8', 'replace')
+
+    return ProcessInfo(int(pid), comm, cmdline)
+
+
+def plan_cycle(processes, matcher):
+    """
+    Match every process of a snapshot against every rule in one pass.
+
+    A process is assigned to the winning rule of the RuleMatcher only, so it
+    is never touched twice in the same cycle.
+
+    Returns:
+        list: (process_name, settings, pids) for each rule with matches,
+              in rule precedence order
+    """
+    matches = {}
+    for proc in processes:
+        match = matcher.match(proc.match_text)
+        if match:
+            matches.setdefault(match[0], []).append(proc.pid)
+
+    return [
+        (process_name, settings, sorted(matches[process_name]))
+        for process_name, _pattern, settings in matcher.rules
+        if process_name in matches
+    ]
+
+
+def read_thread_stat(pid, tid, backend=None):
+    """Return (thread name, utime + stime ticks) of one thread, or None if it is gone."""
+    raw = (backend or get_backend()).read(pid, f'task/{tid}/stat')
+    if not raw:
+        return None
+    head, _, tail = raw.rpartition(b')')
+    name = head.partition(b'(')[2].decode('utf-8', 'replace')
+    fields = tail.split()
+    try:
+        # Fields 14 and 15 of stat
+        ticks = int(fields[11]) + int(fields[12])
+    except (IndexError, ValueError):
+        return None
+    return name, ticks
+
+
+def read_identity(pid, backend=None):
+    """
+    Return (starttime, comm, ppid) from /proc/<pid>/stat, or None if it is gone.
+
+    (pid, starttime) identifies a process across PID reuse; comm changes on
+    exec, which is when a process has to be matched again. The parent PID
+    comes with the same read, for rules covering process trees.
+    """
+    raw = (backend or get_backend()).read(pid, 'stat')
+    if not raw:
+        return None
+    # comm may contain spaces and parentheses, so split on the last ')'
+    head, _, tail = raw.rpartition(b')')
+    comm = head.partition(b'(')[2].decode('utf-8', 'replace')
+    fields = tail.split()
+    try:
+        # Fields 22 and 4 of stat; fields[0] here is field 3 (state)
+        starttime = int(fields[19])
+        ppid = int(fields[1])
+    except (IndexError, ValueError):
+        return None
+    return starttime, comm, ppid
+
+
+class TrackedProcess:
+    """Enforcement state for one (pid, starttime) identity."""
+    __slots__ = ('pid', 'starttime', 'comm', 'rule', 'settings', 'applied', 'hot', 'verified_at',
+                 'in_cgroup', 'cgroup_failed', 'uid', 'ppid', 'inherited')
+
+    def __init__(self, pid, starttime, comm, rule=None, settings=None, ppid=None):
+        self.pid = pid
+        self.starttime = starttime
+        self.comm = comm
+        self.rule = rule
+        self.settings = settings
+        self.ppid = ppid
+        self.inherited = False       # Rule taken from an ancestor, see Enforcer._inherit
+        self.applied = {}    # tid -> CpuMask last enforced on it
+        self.hot = None      # HotThreadTracker for rules with hot-thread promotion
+        self.verified_at = 0.0
+        self.in_cgroup = False       # Placed in its rule's cpuset cgroup
+        self.cgroup_failed = False   # The cgroup move failed, use per-thread affinity
+        self.uid = None              # Owner, read once it is needed
+
+
+class Enforcer:
+    """
+    Incremental enforcement engine.
+
+    Every process is matched once per (pid, starttime) identity and the TIDs
+    already placed are remembered, so a cycle only reads the command line of
+    new processes and only touches new threads. Already enforced threads are
+    re-checked for drift every verify_interval seconds. Entries of exited
+    processes, and of PIDs reused by a different process, are dropped.
+
+    All /proc and affinity access goes through backend (procfs.ProcBackend),
+    so the engine can be driven by a SyntheticBackend in benchmarks. Timings
+    and thread counts of every cycle are accumulated in stats.
+
+    A rule's scheduling attributes (schedattrs.SchedAttrs) are set in the
+    same per-thread pass as its affinity, with the same drift checks.
+
+    With isolation, the other processes of the user running an exclusive
+    rule's process are moved off its CPUs until it exits (see
+    isolation.Isolator). Only long-running callers can undo that, so it is
+    off by default.
+
+    With an irq.IrqSteering, the interrupts named in the 'irq_affinity'
+    setting of rules with running processes are steered to their masks, and
+    restored once no process of the rule is left.
+
+    With an opened cgroups.CpusetBackend, processes of rules with a plain
+    process mask are moved into the rule's cpuset cgroup instead, one write
+    per process; per-thread affinity remains the fallback if a move fails.
+    """
+
+    def __init__(self, matcher=None, quiet=True, backend=None,
+                 verify_interval=0.0, cpuset=None, irqs=None, isolation=False):
+        self.quiet = quiet
+        self.backend = backend or get_backend()
+        self.cpuset = cpuset
+        self.irqs = irqs
+        self._irq_rules = None   # Rules whose interrupts were steered last
+        self.rebalancer = Rebalancer(self.backend)
+        self.isolator = Isolator(self.backend) if isolation else None
+        self.verify_interval = verify_interval
+        self.matcher = matcher or RuleMatcher([])
+        self.tracked = {}
+        self.pinned = {}     # pid -> (starttime, process_name) assigned by pin()
+        self.new_processes = 0
+        self.new_matches = []    # TrackedProcess newly matched to a rule by the last pass
+        self.stats = EnforcementStats()
+        self.stats.decisions = self.rebalancer.decisions
+
+    def set_rules(self, matcher):
+        """Replace the RuleMatcher; every process will be matched again."""
+        self.matcher = matcher
+        self.tracked.clear()
+        self._irq_rules = None
+        if self.cpuset is not None:
+            self.cpuset.prune({name for name, _pattern, _settings in matcher.rules})
+
+    def forget(self, pid):
+        """Drop cached state for a PID, e.g. after it called exec."""
+        self.tracked.pop(pid, None)
+
+    def pin(self, pid, process_name):
+        """
+        Enforce a rule on a process regardless of its command line, e.g. on a
+        program started through launch.py with --rule. The pin survives exec
+        and ends with the process. Returns False if the process is gone.
+        """
+        identity = read_identity(pid, self.backend)
+        if identity is None:
+            return False
+        self.pinned[pid] = (identity[0], process_name)
+        self.forget(pid)
+        return True
+
+    def _track(self, pid, identity, cycle):
+        starttime, comm, ppid = identity
+        previous = self.tracked.get(pid)
+        if previous is not None and previous.starttime == starttime and previous.comm == comm:
+            return previous, False
+
+        # New process, reused PID, or exec: match it again
+        start = time.perf_counter()
+        tracked = TrackedProcess(pid, starttime, comm, ppid=ppid)
+        pinned = self.pinned.get(pid)
+        if pinned is not None and pinned[0] == starttime:
+            match = self.matcher.get(pinned[1])
+        else:
+            self.pinned.pop(pid, None)
+            proc = read_process(pid, self.backend)
+            match = self.matcher.match(proc.match_text) if proc else None
+        if match:
+            tracked.rule, tracked.settings = match
+        elif self.matcher.inheriting_rules:
+            if previous is not None and previous.starttime == starttime and previous.inherited:
+                # A descendant that called exec stays in its tree
+                self._inherit_from(tracked, previous)
+            else:
+                parent = self.tracked.get(ppid)
+                if (parent is not None and parent.rule in self.matcher.inheriting_rules
+                        and parent.starttime <= starttime):
+                    self._inherit_from(tracked, parent)
+        if tracked.rule is not None:
+            self.new_matches.append(tracked)
+        self.tracked[pid] = tracked
+        cycle.match += time.perf_counter() - start
+        return tracked, True
+
+    def _inherit_from(self, tracked, ancestor):
+        tracked.rule, tracked.settings = ancestor.rule, ancestor.settings
+        tracked.inherited = True
+        if not self.quiet:
+            print(f"PID {tracked.pid} ({tracked.comm}) inherits '{tracked.rule}' from PID {ancestor.pid}")
+
+    def _inherit(self, matched, children):
+        """
+        Give every unmatched descendant of a process of a rule with
+        include_children that rule, walking the PPID index of one scan.
+        A descendant matching a rule of its own keeps it, and so do its
+        descendants. Returns the processes that inherited a rule.
+        """
+        inherited = []
+        stack = [tracked for tracked in matched if tracked.rule in self.matcher.inheriting_rules]
+        visited = {tracked.pid for tracked in stack}
+        while stack:
+            parent = stack.pop()
+            for pid in children.get(parent.pid, ()):
+                child = self.tracked.get(pid)
+                if child is None or pid in visited:
+                    continue
+                visited.add(pid)
+                if child.rule is None:
+                    self._inherit_from(child, parent)
+                    self.new_matches.append(child)
+                    inherited.append(child)
+                    stack.append(child)
+                elif child.inherited:
+                    stack.append(child)
+        return inherited
+
+    def cycle(self, verify=False):
+        """
+        Scan /proc and enforce every rule on new processes and threads.
+
+        Args:
+            verify (bool): Re-check all enforced threads for drift now,
+                           regardless of verify_interval
+
+        Returns:
+            dict: process_name -> [success_status, threads_succeeded, threads_attempted]
+        """
+        self.new_processes = 0
+        self.new_matches = []
+        if verify:
+            # CPUs may have been hotplugged, or SMT switched, since the last full pass
+            online_cpus.cache_clear()
+        if not self.matcher:
+            # The last rule may be gone while its interrupts are still
+            # steered or its CPUs still reserved
+            if self.irqs is not None:
+                self.steer_irqs(verify)
+            if self.isolator is not None and self.isolator.reserved is not None:
+                self.isolate(verify)
+            return {}
+
+        cycle = CycleStats('full')
+        start = time.perf_counter()
+        own_pid = self.backend.own_pid()
+        try:
+            entries = self.backend.list_pids()
+        except OSError as e:
+            print(f"Error reading {self.backend.proc_root}: {e}")
+            return {}
+
+        seen = set()
+        matched = []
+        children = {}   # ppid -> [pid], from the same stat reads
+        for entry in entries:
+            pid = int(entry)
+            if pid == own_pid:
+                continue
+            identity = read_identity(entry, self.backend)
+            if identity is None:
+                continue
+            seen.add(pid)
+            children.setdefault(identity[2], []).append(pid)
+            tracked, is_new = self._track(pid, identity, cycle)
+            if is_new:
+                self.new_processes += 1
+            if tracked.rule is not None:
+                matched.append(tracked)
+
+        # Drop exited processes
+        for pid in self.tracked.keys() - seen:
+            del self.tracked[pid]
+        for pid in self.pinned.keys() - seen:
+            del self.pinned[pid]
+
+        if self.matcher.inheriting_rules:
+            matched += self._inherit(matched, children)
+
+        # Reading /proc/<pid>/cmdline of new processes is counted as matching
+        cycle.scan = time.perf_counter() - start - cycle.match
+        cycle.processes = len(seen)
+        return self._enforce(matched, verify, cycle)
+
+    def enforce_pids(self, pids):
+        """Enforce rules on specific PIDs only (e.g. reported by exec events)."""
+        cycle = CycleStats('pids')
+        self.new_matches = []
+        matched = []
+        for pid in pids:
+            identity = read_identity(pid, self.backend)
+            if identity is None:
+                self.forget(pid)
+                continue
+            cycle.processes += 1
+            tracked, _is_new = self._track(pid, identity, cycle)
+            if tracked.rule is not None:
+                matched.append(tracked)
+        return self._enforce(matched, False, cycle)
+
+    def _enforce(self, matched, verify, cycle):
+        results = {}
+        now = time.monotonic()
+        start = time.perf_counter()
+        forks = self.backend.counters.forks
+        for tracked in matched:
+            result = results.setdefault(tracked.rule, [True, 0, 0])
+            recheck = verify or now - tracked.verified_at >= self.verify_interval
+            applied = self._enforce_threads(tracked, recheck)
+            if recheck:
+                tracked.verified_at = now
+            result[1] += applied.succeeded + applied.moved
+            result[2] += applied.attempted + applied.moved
+            if applied.failed:
+                result[0] = False
+            cycle.add_result(applied)
+
+        if self.isolator is not None and (self.matcher.exclusive_rules or self.isolator.reserved is not None):
+            cycle.threads_evicted = self.isolate(verify)
+        cycle.apply = time.perf_counter() - start
+        cycle.processes_matched = len(matched)
+        cycle.fallback_forks = self.backend.counters.forks - forks
+        self.stats.record(cycle)
+
+        for process_name, result in results.items():
+            if not self.quiet and result[2]:
+                print(f"Applied '{process_name}': {result[1]} out of {result[2]} threads succeeded")
+        if self.irqs is not None:
+            self.steer_irqs(verify)
+        return results
+
+    def _enforce_cgroup(self, tracked, recheck):
+        """
+        Keep a process in its rule's cpuset cgroup. Returns an ApplyResult,
+        or None if the process has to be placed thread by thread.
+        """
+        applied = ApplyResult(tracked.pid)
+        if tracked.in_cgroup and not recheck:
+            return applied
+        if not self.cpuset.place(tracked.pid, tracked.rule, self._rule_mask(tracked)):
+            tracked.in_cgroup = False
+            tracked.cgroup_failed = True
+            tracked.applied.clear()
+            if not self.quiet:
+                print(f"Could not move PID {tracked.pid} of '{tracked.rule}' into its cgroup, "
+                      f"setting thread affinity instead")
+            return None
+        if not tracked.in_cgroup:
+            tracked.in_cgroup = True
+            applied.moved = 1
+        return applied
+
+    def _rule_mask(self, tracked):
+        """The process mask of a plain rule, as chosen by the rebalancer if it has a say."""
+        mask = self.rebalancer.mask_for(tracked.rule)
+        return mask if mask is not None else CpuMask.parse(tracked.settings['cpu_mask'])
+
+    def _live_tids(self, tracked):
+        """TIDs of a tracked process, forgetting those of threads that exited."""
+        tids = get_tids_for_pid(tracked.pid, self.backend)
+        if not tids:
+            tids = [str(tracked.pid)]
+        tids = {int(tid) for tid in tids}
+        for tid in tracked.applied.keys() - tids:
+            del tracked.applied[tid]
+        return tids
+
+    def _log_sched_failures(self, tracked, result):
+        if not self.quiet:
+            for tid, error in result.sched_failed:
+                print(f"Failed to set scheduling attributes of TID {tid} of '{tracked.rule}': {error}")
+
+    def _enforce_sched_attrs(self, tracked, attrs, recheck):
+        """
+        Set the scheduling attributes of a process placed in its cgroup,
+        whose threads are not touched for affinity. Failures are retried on
+        the next recheck only, like in _enforce_threads.
+        """
+        tids = self._live_tids(tracked)
+        todo = tids if recheck else tids - tracked.applied.keys()
+        result = apply_mask_to_tids(todo, None, pid=tracked.pid, backend=self.backend, attrs=attrs)
+        for tid in todo:
+            tracked.applied[tid] = None
+        self._log_sched_failures(tracked, result)
+        return result
+
+    def _enforce_threads(self, tracked, recheck):
+        thread_rules = self.matcher.thread_rules(tracked.rule)
+        hot_config = self.matcher.hot_threads(tracked.rule)
+        attrs = self.matcher.sched_attrs(tracked.rule)
+        if (self.cpuset is not None and thread_rules is None and hot_config is None
+                and not tracked.cgroup_failed):
+            applied = self._enforce_cgroup(tracked, recheck)
+            if applied is not None:
+                if attrs is not None:
+                    applied.merge(self._enforce_sched_attrs(tracked, attrs, recheck))
+                return applied
+
+        tids = self._live_tids(tracked)
+
+        if thread_rules is None and hot_config is None:
+            mask = self._rule_mask(tracked)
+            todo = tids if recheck else tids - tracked.applied.keys()
+            masks = dict.fromkeys(todo, mask)
+        else:
+            desired = self._thread_masks(tracked, thread_rules, hot_config, tids)
+            masks = {
+                tid: mask for tid, mask in desired.items()
+                if recheck or tracked.applied.get(tid) != mask
+            }
+
+        # One bulk apply per distinct mask
+        groups = {}
+        for tid, mask in masks.items():
+            groups.setdefault(mask, []).append(tid)
+
+        applied = ApplyResult(tracked.pid)
+        for mask, group in groups.items():
+            result = apply_mask_to_tids(group, mask, pid=tracked.pid, backend=self.backend, attrs=attrs)
+            failed = {tid for tid, _error in result.failed}
+            for tid in group:
+                if tid in failed:
+                    tracked.applied.pop(tid, None)
+                else:
+                    tracked.applied[tid] = mask
+            if not self.quiet:
+                for tid, error in result.failed:
+                    print(f"Failed to set affinity for TID {tid} of '{tracked.rule}': {error}")
+            self._log_sched_failures(tracked, result)
+            applied.merge(result)
+        return applied
+
+    def _thread_masks(self, tracked, thread_rules, hot_config, tids):
+        """
+        Resolve the desired mask of every thread of a process.
+
+        Threads usually name themselves after they start and their CPU usage
+        changes over time, so every thread's stat is read on each call; only
+        threads whose desired mask differs from the applied one are touched.
+        Threads matching a thread_rules entry keep that mask; with hot-thread
+        promotion, the rest are split between its fast and bulk masks.
+        """
+        stats = {}
+        for tid in tids:
+            stat = read_thread_stat(tracked.pid, tid, self.backend)
+            if stat is not None:
+                stats[tid] = stat
+
+        desired = {}
+        unnamed = {}
+        for tid, (name, ticks) in stats.items():
+            mask = thread_rules.match(name) if thread_rules else None
+            if mask is not None:
+                desired[tid] = mask
+            elif hot_config is None:
+                desired[tid] = thread_rules.fallback
+            else:
+                unnamed[tid] = ticks
+
+        if hot_config is not None:
+            if tracked.hot is None:
+                tracked.hot = HotThreadTracker(hot_config)
+            tracked.hot.update(unnamed, time.monotonic())
+            for tid in unnamed:
+                desired[tid] = tracked.hot.mask_for(tid)
+        return desired
+
+    def steer_irqs(self, verify=False):
+        """
+        Steer the interrupts of the rules with running processes and restore
+        those of rules without. /proc/interrupts is only read when that set
+        of rules changed, or with verify, to undo changes made by irqbalance.
+        """
+        running = {tracked.rule for tracked in self.tracked.values() if tracked.rule is not None}
+        active = [name for name, _pattern, _settings in self.matcher.rules
+                  if name in running and self.matcher.irq_affinity(name)]
+        if active == self._irq_rules and not verify:
+            return
+        self._irq_rules = active
+        self.irqs.reconcile([rule for name in active for rule in self.matcher.irq_affinity(name)])
+
+    def isolate(self, verify=False):
+        """
+        Reserve the CPUs of the exclusive rules with running processes and
+        move the other processes of their users off them, or end the
+        reservation once none is running. Returns the number of threads moved.
+        """
+        reserved = None
+        owners = set()
+        candidates = []
+        for tracked in self.tracked.values():
+            if tracked.rule is None:
+                candidates.append((tracked.pid, tracked.starttime, tracked.ppid))
+            elif tracked.rule in self.matcher.exclusive_rules:
+                if tracked.uid is None:
+                    tracked.uid = self.backend.owner(tracked.pid)
+                owners.add(tracked.uid)
+                mask = self._rule_mask(tracked)
+                reserved = mask if reserved is None else reserved | mask
+        return self.isolator.update(reserved, owners, candidates, verify)
+
+    def _rebalance_configs(self):
+        """RebalanceConfig of each plain rule with running processes."""
+        configs = {}
+        for tracked in self.tracked.values():
+            if tracked.rule is None or tracked.rule in configs:
+                continue
+            config = self.matcher.rebalance(tracked.rule)
+            if (config is not None and self.matcher.thread_rules(tracked.rule) is None
+                    and self.matcher.hot_threads(tracked.rule) is None):
+                configs[tracked.rule] = config
+        return configs
+
+    def has_adaptive(self):
+        """True if a running process has a rule with hot-thread promotion or rebalancing."""
+        return any(tracked.hot is not None for tracked in self.tracked.values()) or \
+            bool(self._rebalance_configs())
+
+    def sample_adaptive(self):
+        """Re-sample and re-place threads of processes with hot-thread promotion, then rebalance."""
+        cycle = CycleStats('sample')
+        adaptive = []
+        for tracked in list(self.tracked.values()):
+            if tracked.hot is None:
+                continue
+            identity = read_identity(tracked.pid, self.backend)
+            if identity is None or identity[0] != tracked.starttime:
+                self.forget(tracked.pid)
+                continue
+            adaptive.append(tracked)
+        cycle.processes = len(adaptive)
+        results = self._enforce(adaptive, False, cycle)
+        self.rebalance()
+        return results
+
+    def rebalance(self):
+        """
+        Sample the CPU load for rules with a 'rebalance' setting and move the
+        processes of every rule whose mask changed.
+
+        Returns:
+            set: Names of the rules that switched masks
+        """
+        configs = self._rebalance_configs()
+        if not configs and not self.rebalancer.states:
+            return set()
+        switched = {decision.rule for decision in self.rebalancer.update(configs)}
+        if switched:
+            cycle = CycleStats('rebalance')
+            moved = [tracked for tracked in self.tracked.values() if tracked.rule in switched]
+            cycle.processes = len(moved)
+            # Every thread has to move, not only the new ones
+            self._enforce(moved, True, cycle)
+        return switched
+
+
+def run_cycle(rules, quiet=True, backend=None):
+    """
+    Run one enforcement cycle for all rules against a single /proc snapshot.
+
+    Args:
+        rules (list): (process_name, settings) pairs
+        quiet (bool): If True, suppress standard output/logging
+        backend (ProcBackend): procfs backend, the real /proc if None
+
+    Returns:
+        dict: process_name -> [success_status, threads_succeeded, threads_attempted]
+    """
+    matcher = RuleMatcher(rules, quiet=quiet)
+    if not matcher:
+        return {}
+
+    return Enforcer(matcher, quiet=quiet, backend=backend).cycle(verify=True)
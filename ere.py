@@ -0,0 +1,164 @@
+# cpu-affinity-manager/ere.py
+#
+# Saved process names used to be handed to `pgrep -f`, which reads them as
+# POSIX extended regular expressions (with the GNU extensions of glibc's
+# regcomp). They are matched with Python's re now, so they are translated
+# first: where the two dialects read the same text differently, the pattern
+# keeps the meaning it had with pgrep.
+
+import re
+
+# POSIX character classes, for the C locale
+_CLASSES = {
+    'alpha': 'a-zA-Z',
+    'digit': '0-9',
+    'alnum': 'a-zA-Z0-9',
+    'upper': 'A-Z',
+    'lower': 'a-z',
+    'space': ' \\t\\n\\r\\f\\v',
+    'blank': ' \\t',
+    'punct': re.escape('!"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~'),
+    'print': ' -~',
+    'graph': '!-~',
+    'cntrl': '\\x00-\\x1f\\x7f',
+    'xdigit': '0-9A-Fa-f',
+}
+
+# GNU escapes outside brackets; any other escaped character is itself
+_ESCAPES = {
+    'w': '\\w', 'W': '\\W', 's': '\\s', 'S': '\\S', 'b': '\\b', 'B': '\\B',
+    '<': '\\b(?=\\w)', '>': '\\b(?<=\\w)', '`': '\\A', "'": '\\Z',
+}
+
+_QUANTIFIERS = '*+?'
+_SPECIAL = frozenset('.[]\\()*+?{}|^$')
+
+
+def translate(pattern):
+    """
+    Translate a POSIX extended regular expression into Python re syntax.
+
+    Handled differences: bracket expressions ([[:alpha:]] classes, a literal
+    backslash inside brackets, ']' first in the list), backslash escapes
+    (\\d is a plain 'd' in ERE), GNU word anchors \\< and \\>, '$' only at
+    the very end of the text, and '(?' which ERE rejects where Python reads
+    an extension. Backreferences \\1-\\9 mean the same in both.
+
+    Raises:
+        re.error: if the pattern is not a valid ERE, or uses a construct
+                  that would match differently and has no translation
+    """
+    out = []
+    i = 0
+    n = len(pattern)
+    quantified = False      # The previous token was a repetition
+    while i < n:
+        c = pattern[i]
+        if c == '\\':
+            if i + 1 == n:
+                raise re.error("trailing backslash", pattern, i)
+            nxt = pattern[i + 1]
+            if nxt in '123456789':
+                out.append('\\' + nxt)
+            else:
+                out.append(_ESCAPES.get(nxt, re.escape(nxt)))
+            i += 2
+            quantified = False
+            continue
+        if c == '[':
+            text, i = _bracket(pattern, i)
+            out.append(text)
+            quantified = False
+            continue
+        if c in _QUANTIFIERS or (c == '{' and _interval_end(pattern, i) is not None):
+            if quantified:
+                # Python reads a second repetition as lazy or possessive
+                raise re.error("multiple repeat", pattern, i)
+            if c == '{':
+                end = _interval_end(pattern, i)
+                out.append(pattern[i:end])
+                i = end
+            else:
+                out.append(c)
+                i += 1
+            quantified = True
+            continue
+        quantified = False
+        if c == '(' and pattern[i + 1:i + 2] == '?':
+            raise re.error("repetition operator operand invalid", pattern, i + 1)
+        if c == '$':
+            out.append('\\Z')
+        elif c in '{}':
+            # Not an interval: a literal brace, as in ERE
+            out.append('\\' + c)
+        else:
+            out.append(c)
+        i += 1
+    return ''.join(out)
+
+
+def compile_pattern(pattern):
+    """Compile a saved process or thread name pattern (an ERE). Raises re.error."""
+    return re.compile(translate(pattern))
+
+
+def pattern_error(pattern):
+    """Error message for an invalid pattern, or None if it is valid."""
+    try:
+        compile_pattern(pattern)
+    except re.error as e:
+        return str(e)
+    return None
+
+
+def escape(text):
+    """ERE matching text literally; unlike re.escape, only special characters are escaped."""
+    return ''.join('\\' + c if c in _SPECIAL else c for c in text)
+
+
+def _interval_end(pattern, start):
+    """Index after a '{m}', '{m,}' or '{m,n}' interval starting at start, or None."""
+    match = re.compile(r'\{(\d+)(,(\d*))?\}').match(pattern, start)
+    return match.end() if match else None
+
+
+def _bracket(pattern, start):
+    """Translate the bracket expression at start. Returns (text, index after it)."""
+    i = start + 1
+    out = ['[']
+    if pattern[i:i + 1] == '^':
+        out.append('^')
+        i += 1
+    first = True
+    while True:
+        if i >= len(pattern):
+            raise re.error("unterminated character set", pattern, start)
+        c = pattern[i]
+        if c == ']' and not first:
+            out.append(']')
+            return ''.join(out), i + 1
+        first = False
+        if c == '[' and pattern[i + 1:i + 2] in (':', '=', '.'):
+            kind = pattern[i + 1]
+            end = pattern.find(kind + ']', i + 2)
+            if end < 0:
+                raise re.error("unterminated character class", pattern, i)
+            name = pattern[i + 2:end]
+            if kind == ':':
+                if name not in _CLASSES:
+                    raise re.error(f"invalid character class {name!r}", pattern, i)
+                out.append(_CLASSES[name])
+            elif len(name) == 1:
+                # Equivalence class or collating symbol of one character
+                out.append(re.escape(name))
+            else:
+                raise re.error(f"invalid collation element {name!r}", pattern, i)
+            i = end + 2
+            continue
+        if c == '-' and out[-1] not in ('[', '^') and pattern[i + 1:i + 2] not in (']', ''):
+            # A range between the previous and the next character
+            out.append('-')
+        else:
+            # Backslash, '[', '^' and '&', '~', '|' are plain in ERE brackets
+            out.append(re.escape(c))
+        i += 1
@@ -0,0 +1,119 @@
+# cpu-affinity-manager/hotthreads.py
+
+from collections import deque
+
+from cpumask import CpuMask
+
+DEFAULT_HOT_COUNT = 2
+DEFAULT_WINDOW = 5.0        # Seconds of CPU time history used to rank threads
+DEFAULT_HYSTERESIS = 0.25   # A challenger must be 25% hotter to displace a hot thread
+SAMPLE_INTERVAL = 1.0       # Seconds between samples while a hot-thread rule is active
+
+
+class HotThreadConfig:
+    """
+    The 'hot_threads' setting of a rule.
+
+        "hot_threads": {"count": 2, "fast_mask": "0-7,16-23",
+                        "bulk_mask": "8-15,24-31", "window": 5, "hysteresis": 0.25}
+    """
+
+    def __init__(self, count, fast_mask, bulk_mask, window=DEFAULT_WINDOW,
+                 hysteresis=DEFAULT_HYSTERESIS):
+        self.count = count
+        self.fast_mask = fast_mask
+        self.bulk_mask = bulk_mask
+        self.window = window
+        self.hysteresis = hysteresis
+
+    @classmethod
+    def from_settings(cls, settings, quiet=True):
+        """Parse a rule's 'hot_threads' setting, or return None if unset or invalid."""
+        config = settings.get('hot_threads')
+        if not config:
+            return None
+        try:
+            fast_mask = CpuMask.parse(config['fast_mask'])
+            bulk_mask = CpuMask.parse(config.get('bulk_mask') or settings['cpu_mask'])
+            count = int(config.get('count', DEFAULT_HOT_COUNT))
+            window = float(config.get('window', DEFAULT_WINDOW))
+            hysteresis = float(config.get('hysteresis', DEFAULT_HYSTERESIS))
+        except (KeyError, TypeError, ValueError) as e:
+            if not quiet:
+                print(f"Ignoring invalid hot_threads setting {config!r}: {e}")
+            return None
+        if count < 1 or window <= 0 or not fast_mask.is_valid() or not bulk_mask.is_valid():
+            if not quiet:
+                print(f"Ignoring invalid hot_threads setting {config!r}")
+            return None
+        return cls(count, fast_mask, bulk_mask, window, max(0.0, hysteresis))
+
+
+class HotThreadTracker:
+    """
+    Ranks the threads of one process by CPU time used over a sliding window
+    and keeps the top `count` of them in a hot set.
+
+    A thread only displaces a hot thread if it used more than (1 + hysteresis)
+    times as much CPU, so threads with similar load do not ping-pong between
+    the fast and bulk masks.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.samples = {}   # tid -> deque of (timestamp, cpu ticks)
+        self.hot = set()
+
+    def update(self, ticks, now):
+        """
+        Add one sample and recompute the hot set.
+
+        Args:
+            ticks (dict): tid -> utime + stime in clock ticks
+            now (float): time.monotonic() of the sample
+
+        Returns:
+            set: TIDs currently promoted to the fast mask
+        """
+        horizon = now - self.config.window
+        rates = {}
+        for tid, value in ticks.items():
+            history = self.samples.get(tid)
+            if history is None:
+                history = self.samples[tid] = deque()
+            history.append((now, value))
+            # Keep one sample at or before the horizon as the window's start
+            while len(history) > 2 and history[1][0] <= horizon:
+                history.popleft()
+            start_time, start_ticks = history[0]
+            if now > start_time:
+                rates[tid] = (value - start_ticks) / (now - start_time)
+
+        # Forget exited threads
+        for tid in self.samples.keys() - ticks.keys():
+            del self.samples[tid]
+
+        self.hot = self._rank(rates)
+        return self.hot
+
+    def _rank(self, rates):
+        hot = {tid for tid in self.hot if tid in rates}
+        ranked = sorted((tid for tid in rates if rates[tid] > 0), key=rates.get, reverse=True)
+        challengers = [tid for tid in ranked if tid not in hot]
+
+        # Free slots are filled by the hottest threads without any margin
+        while challengers and len(hot) < self.config.count:
+            hot.add(challengers.pop(0))
+
+        # A full hot set only changes for clearly hotter threads
+        factor = 1.0 + self.config.hysteresis
+        for challenger in challengers:
+            weakest = min(hot, key=rates.get)
+            if rates[challenger] <= rates[weakest] * factor:
+                break
+            hot.discard(weakest)
+            hot.add(challenger)
+        return hot
+
+    def mask_for(self, tid):
+        return self.config.fast_mask if tid in self.hot else self.config.bulk_mask
@@ -23,9 +23,31 @@ mkdir -p "$APPLICATIONS_DIR"
 # Copy application files
 echo "Copying application files..."
 cp main.py "$APP_DIR/"
+cp preview.py "$APP_DIR/"
+cp process_browser.py "$APP_DIR/"
 cp utils.py "$APP_DIR/"
+cp cpumask.py "$APP_DIR/"
+cp topology.py "$APP_DIR/"
 cp settings.py "$APP_DIR/"
+cp rulecache.py "$APP_DIR/"
+cp ere.py "$APP_DIR/"
 cp auto_apply.py "$APP_DIR/"
+cp launch.py "$APP_DIR/"
+cp telemetry.py "$APP_DIR/"
+cp irq.py "$APP_DIR/"
+cp profiles.py "$APP_DIR/"
+cp engine.py "$APP_DIR/"
+cp cgroups.py "$APP_DIR/"
+cp metrics.py "$APP_DIR/"
+cp scheduler.py "$APP_DIR/"
+cp procfs.py "$APP_DIR/"
+cp matcher.py "$APP_DIR/"
+cp hotthreads.py "$APP_DIR/"
+cp rebalance.py "$APP_DIR/"
+cp schedattrs.py "$APP_DIR/"
+cp isolation.py "$APP_DIR/"
+cp daemon.py "$APP_DIR/"
+cp proc_events.py "$APP_DIR/"
 cp affinity_window.ui "$APP_DIR/"
 cp "$APP_ID.desktop" "$APPLICATIONS_DIR/"
 
@@ -47,6 +69,12 @@ cat > "$BIN_DIR/cpu-affinity-manager" <<EOF
 export APP_ID="$APP_ID"
 export APP_DIR="$APP_DIR"
 export LOCALE_DIR="$LOCALE_DIR"
+case "\$1" in
+    run) shift; exec python3 "\$APP_DIR/launch.py" "\$@" ;;
+    telemetry) shift; exec python3 "\$APP_DIR/telemetry.py" "\$@" ;;
+    irq) shift; exec python3 "\$APP_DIR/irq.py" "\$@" ;;
+    profile) shift; exec python3 "\$APP_DIR/profiles.py" "\$@" ;;
+esac
 exec python3 "\$APP_DIR/main.py" "\$@"
 EOF
 
@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+# cpu-affinity-manager/irq.py
+"""
+Interrupt steering: keep device interrupts off the CPUs reserved for a game.
+
+    cpu-affinity-manager irq list [PATTERN]
+    cpu-affinity-manager irq rates [--interval 1] [--count 10]
+    cpu-affinity-manager irq steer PATTERN MASK
+    cpu-affinity-manager irq restore
+"""
+import json
+import os
+import re
+import sys
+import time
+
+if 'APP_DIR' in os.environ:
+    sys.path.append(os.environ['APP_DIR'])
+
+from cpumask import CpuMask
+from utils import write_atomic
+
+PROC_ROOT = '/proc'
+STATE_NAME = 'irq_originals.json'
+
+# Who steered an IRQ, recorded with its original affinity
+RULE = 'rule'
+MANUAL = 'manual'
+
+
+class Interrupt:
+    """One numbered line of /proc/interrupts."""
+    __slots__ = ('irq', 'counts', 'description')
+
+    def __init__(self, irq, counts, description):
+        self.irq = irq
+        self.counts = counts            # cpu -> interrupts since boot
+        self.description = description  # Chip, hardware IRQ and device names
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+
+def parse_interrupts(data):
+    """
+    Parse the contents of /proc/interrupts.
+
+    Returns:
+        tuple: (list of Interrupt for numbered IRQs,
+                dict of cpu -> interrupts since boot of all sources, including
+                the architecture's per-CPU ones such as LOC or RES)
+    """
+    if isinstance(data, bytes):
+        data = data.decode('ascii', 'replace')
+    lines = data.splitlines()
+    if not lines:
+        return [], {}
+    try:
+        cpus = [int(name[3:]) for name in lines[0].split()]
+    except ValueError:
+        return [], {}
+
+    interrupts = []
+    totals = dict.fromkeys(cpus, 0)
+    for line in lines[1:]:
+        label, sep, rest = line.partition(':')
+        if not sep:
+            continue
+        fields = rest.split(None, len(cpus))
+        counts = {}
+        for cpu, field in zip(cpus, fields):
+            if not field.isdigit():
+                break
+            counts[cpu] = int(field)
+        for cpu, count in counts.items():
+            totals[cpu] += count
+        label = label.strip()
+        if label.isdigit() and counts:
+            description = fields[len(counts)] if len(fields) > len(counts) else ''
+            interrupts.append(Interrupt(int(label), counts, ' '.join(description.split())))
+    return interrupts, totals
+
+
+def read_interrupts(proc_root=PROC_ROOT):
+    """parse_interrupts() of the current /proc/interrupts, or ([], {}) if unreadable."""
+    try:
+        with open(os.path.join(proc_root, 'interrupts')) as f:
+            return parse_interrupts(f.read())
+    except OSError:
+        return [], {}
+
+
+def irq_rules(settings, quiet=True):
+    """
+    Parse a rule's 'irq_affinity' setting: which interrupts to steer where
+    while the rule's processes run.
+
+        "irq_affinity": [{"devices": "nvme|enp6s0|amdgpu", "cpu_mask": "8-15,24-31"}]
+
+    devices is a regular expression searched in the IRQ's line of
+    /proc/interrupts after the counts, which ends in the device names.
+
+    Returns:
+        list: (compiled pattern, CpuMask) pairs, or None if unset or invalid
+    """
+    entries = settings.get('irq_affinity')
+    if not entries:
+        return None
+    rules = []
+    try:
+        for entry in entries:
+            mask = CpuMask.parse(entry['cpu_mask'])
+            if not mask.is_valid():
+                raise ValueError(f"no online CPU in {entry['cpu_mask']!r}")
+            rules.append((re.compile(entry['devices']), mask))
+    except (KeyError, TypeError, ValueError, re.error) as e:
+        if not quiet:
+            print(f"Ignoring invalid irq_affinity setting {entries!r}: {e}")
+        return None
+    return rules
+
+
+def load_state(state_file):
+    """
+    Read the IRQ state file.
+
+    Returns:
+        dict: irq -> (original affinity as cpulist text, RULE or MANUAL)
+
+    Raises:
+        OSError, ValueError: if the file cannot be read or parsed
+    """
+    with open(state_file) as f:
+        data = json.load(f)
+    state = {}
+    for irq, entry in data.items():
+        if isinstance(entry, str):
+            # Written before owners were recorded, when only rules steered
+            state[int(irq)] = (entry, RULE)
+        else:
+            state[int(irq)] = (str(entry['cpus']), MANUAL if entry.get('owner') == MANUAL else RULE)
+    return state
+
+
+class IrqRateSampler:
+    """Interrupts per second and CPU between consecutive reads of /proc/interrupts."""
+
+    def __init__(self, proc_root=PROC_ROOT, clock=time.monotonic):
+        self.proc_root = proc_root
+        self.clock = clock
+        self.previous = None
+
+    def sample(self):
+        """
+        Read /proc/interrupts once.
+
+        Returns:
+            dict: cpu -> interrupts per second since the previous sample,
+                  or None on the first call or if /proc/interrupts is unreadable
+        """
+        _interrupts, totals = read_interrupts(self.proc_root)
+        if not totals:
+            return None
+        now = self.clock()
+        previous, self.previous = self.previous, (now, totals)
+        if previous is None or now <= previous[0]:
+            return None
+        elapsed = now - previous[0]
+        return {cpu: max(0, count - previous[1].get(cpu, count)) / elapsed for cpu, count in totals.items()}
+
+
+class IrqSteering:
+    """
+    Sets the CPU affinity of device interrupts through
+    /proc/irq/<n>/smp_affinity_list and puts the original affinity back
+    afterwards.
+
+    The affinity an IRQ had before it was first steered is kept in
+    state_file, so it can be restored by a later process too, e.g. after the
+    daemon was restarted or by the next oneshot run. Each entry records who
+    steered the IRQ: RULE for the service and the oneshot, MANUAL for
+    `irq steer`. reconcile() only restores IRQs steered by rules and leaves
+    manually steered ones alone until `irq restore`. Several processes share
+    state_file, so it is read again before every change and only the entries
+    changed are written back.
+
+    Writing needs root; managed interrupts (most NVMe queues) reject any
+    change, they are reported once and left alone. A running irqbalance may
+    move steered IRQs back, reconcile() steers them again.
+    """
+
+    def __init__(self, proc_root=PROC_ROOT, state_file=None, owner=RULE):
+        self.proc_root = proc_root
+        self.state_file = state_file
+        self.owner = owner
+        self.originals = self._load_state()     # irq -> (original affinity as cpulist text, owner)
+        self.changes = {}                       # irq -> entry written or None removed since the last save
+        self.failed = set()                     # IRQs whose affinity cannot be written
+
+    def _load_state(self):
+        if self.state_file is None:
+            return {}
+        try:
+            return load_state(self.state_file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, TypeError, AttributeError, KeyError) as e:
+            print(f"Ignoring unreadable IRQ state {self.state_file}: {e}")
+            return {}
+
+    def _reload_state(self):
+        # Pick up entries written by other processes since the last change
+        if self.state_file is not None:
+            self.originals = self._load_state()
+            self.changes.clear()
+
+    def _set_original(self, irq, entry):
+        if entry is None:
+            self.originals.pop(irq, None)
+        else:
+            self.originals[irq] = entry
+        self.changes[irq] = entry
+
+    def _save_state(self):
+        if self.state_file is None or not self.changes:
+            self.changes.clear()
+            return
+        # Merge into what is on disk now instead of overwriting it
+        state = self._load_state()
+        for irq, entry in self.changes.items():
+            if entry is None:
+                state.pop(irq, None)
+            else:
+                state[irq] = entry
+        self.changes.clear()
+        self.originals = state
+        try:
+            if state:
+                write_atomic(self.state_file, json.dumps(
+                    {str(irq): {'cpus': cpus, 'owner': owner} for irq, (cpus, owner) in state.items()}))
+            elif os.path.exists(self.state_file):
+                os.unlink(self.state_file)
+        except OSError as e:
+            print(f"Cannot save IRQ state {self.state_file}: {e}")
+
+    def _path(self, irq):
+        return os.path.join(self.proc_root, 'irq', str(irq), 'smp_affinity_list')
+
+    def affinity(self, irq):
+        """Current affinity of an IRQ as cpulist text, or None if unreadable."""
+        try:
+            with open(self._path(irq)) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _write(self, irq, cpulist):
+        try:
+            with open(self._path(irq), 'w') as f:
+                f.write(cpulist)
+        except OSError as e:
+            if irq not in self.failed:
+                self.failed.add(irq)
+                print(f"Cannot set the affinity of IRQ {irq} to {cpulist}: {e.strerror or e}")
+            return False
+        self.failed.discard(irq)
+        return True
+
+    def _desired(self, rules):
+        """irq -> CpuMask of every IRQ matched by rules; the first matching pair wins."""
+        desired = {}
+        if rules:
+            interrupts, _totals = read_interrupts(self.proc_root)
+            for interrupt in interrupts:
+                for pattern, mask in rules:
+                    if pattern.search(interrupt.description):
+                        desired[interrupt.irq] = mask
+                        break
+        return desired
+
+    def _steer(self, desired):
+        written = 0
+        for irq, mask in desired.items():
+            entry = self.originals.get(irq)
+            if self.owner == RULE and entry is not None and entry[1] == MANUAL:
+                # Steered by hand, which wins until `irq restore`
+                continue
+            current = self.affinity(irq)
+            if current is None or irq in self.failed:
+                continue
+            try:
+                if CpuMask.parse(current) == mask:
+                    if entry is not None and entry[1] != self.owner:
+                        self._set_original(irq, (entry[0], self.owner))
+                    continue
+            except ValueError:
+                pass
+            if not self._write(irq, mask.to_cpulist()):
+                continue
+            # The affinity from before the first steer is the one to go back to
+            self._set_original(irq, (entry[0] if entry is not None else current, self.owner))
+            written += 1
+            print(f"Steered IRQ {irq} to CPUs {mask.to_cpulist()} (was {current})")
+        return written
+
+    def steer(self, rules):
+        """
+        Steer the IRQs matching rules, leaving every other IRQ alone.
+
+        Args:
+            rules (list): (compiled pattern, CpuMask) pairs; the first pair
+                          matching an IRQ decides its mask
+
+        Returns:
+            int: Number of IRQs whose affinity was written
+        """
+        self._reload_state()
+        written = self._steer(self._desired(rules))
+        self._save_state()
+        return written
+
+    def reconcile(self, rules):
+        """
+        Steer the IRQs matching rules, as steer(), and restore every other
+        IRQ steered by rules before. Returns the number of IRQs whose affinity was written.
+        """
+        self._reload_state()
+        if not rules and not self.owned(RULE):
+            return 0
+        desired = self._desired(rules)
+        written = self._steer(desired)
+        for irq in self.owned(RULE):
+            if irq not in desired:
+                written += self._restore(irq)
+        self._save_state()
+        return written
+
+    def owned(self, owner):
+        """IRQs steered by owner that have not been restored yet."""
+        return [irq for irq, (_cpus, entry_owner) in self.originals.items() if entry_owner == owner]
+
+    def _restore(self, irq):
+        original = self.originals[irq][0]
+        if self.affinity(irq) is None:
+            # The device is gone; its IRQ comes back with the default affinity
+            self._set_original(irq, None)
+            return 0
+        if not self._write(irq, original):
+            # Kept, to try again next time
+            return 0
+        self._set_original(irq, None)
+        print(f"Restored IRQ {irq} to CPUs {original}")
+        return 1
+
+    def restore(self, owner=None):
+        """
+        Put steered IRQs back on their original CPUs.
+
+        Args:
+            owner (str): Only the IRQs steered by RULE or MANUAL, None for all
+
+        Returns:
+            int: Number of IRQs restored
+        """
+        self._reload_state()
+        irqs = list(self.originals) if owner is None else self.owned(owner)
+        restored = sum(self._restore(irq) for irq in irqs)
+        self._save_state()
+        return restored
+
+
+def main(argv=None):
+    import argparse
+
+    from settings import SettingsManager
+
+    parser = argparse.ArgumentParser(prog='cpu-affinity-manager irq',
+                                     description="Inspect and steer device interrupts.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    list_parser = commands.add_parser('list', help="Show IRQs with their affinity and counts per CPU")
+    list_parser.add_argument('pattern', nargs='?', help="Only IRQs whose devices match this regular expression")
+    rates_parser = commands.add_parser('rates', help="Show interrupts per second on each CPU")
+    rates_parser.add_argument('--interval', type=float, default=1.0, help="Seconds between samples")
+    rates_parser.add_argument('--count', type=int, default=0, help="Number of samples (default: until Ctrl+C)")
+    rates_parser.add_argument('--cpus', help="Only these CPUs, as a hex mask or CPU list")
+    steer_parser = commands.add_parser('steer', help="Move the matching IRQs to the given CPUs")
+    steer_parser.add_argument('pattern', help="Regular expression matched against the device names")
+    steer_parser.add_argument('mask', help="CPUs as a hex mask or CPU list")
+    commands.add_parser('restore', help="Put every steered IRQ back on its original CPUs")
+    args = parser.parse_args(argv)
+
+    state_file = SettingsManager().config_dir / STATE_NAME
+    if args.command == 'list':
+        steering = IrqSteering()
+        try:
+            pattern = re.compile(args.pattern or '')
+        except re.error as e:
+            print(f"Invalid pattern {args.pattern!r}: {e}", file=sys.stderr)
+            return 1
+        interrupts, _totals = read_interrupts()
+        for interrupt in interrupts:
+            if not pattern.search(interrupt.description):
+                continue
+            busiest = sorted(interrupt.counts.items(), key=lambda item: -item[1])[:4]
+            counts = ', '.join(f"CPU{cpu}: {count}" for cpu, count in busiest if count)
+            print(f"{interrupt.irq:>5}  CPUs {steering.affinity(interrupt.irq) or '?':<12} "
+                  f"{interrupt.description}  [{counts or 'no interrupts'}]")
+        return 0
+
+    if args.command == 'rates':
+        try:
+            cpus = CpuMask.parse(args.cpus).cpus if args.cpus else None
+        except ValueError as e:
+            print(f"Invalid CPU mask {args.cpus!r}: {e}", file=sys.stderr)
+            return 1
+        sampler = IrqRateSampler()
+        if sampler.sample() is None and sampler.previous is None:
+            print("Cannot read /proc/interrupts", file=sys.stderr)
+            return 1
+        cpus = sorted(cpus if cpus is not None else sampler.previous[1])
+        samples = 0
+        try:
+            while not args.count or samples < args.count:
+                time.sleep(args.interval)
+                rates = sampler.sample() or {}
+                samples += 1
+                print(f"{time.strftime('%X')}  " + "  ".join(
+                    f"CPU{cpu} {rates.get(cpu, 0.0):6.0f}/s" for cpu in cpus), flush=True)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    steering = IrqSteering(state_file=state_file, owner=MANUAL)
+    if args.command == 'restore':
+        steering.restore()
+        return 0
+
+    rules = irq_rules({'irq_affinity': [{'devices': args.pattern, 'cpu_mask': args.mask}]}, quiet=False)
+    if rules is None:
+        return 1
+    written = steering.steer(rules)
+    print(f"{written} IRQs changed, restore them with: cpu-affinity-manager irq restore")
+    return 1 if steering.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
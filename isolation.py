@@ -0,0 +1,172 @@
+# cpu-affinity-manager/isolation.py
+
+import sys
+
+from cpumask import CpuMask
+
+
+class Isolator:
+    """
+    Keeps other processes off the CPUs of rules with "exclusive": true.
+
+    While a process of an exclusive rule runs, every thread of the other
+    processes of the same user that is allowed on the reserved CPUs is
+    restricted to the rest of its mask, or to all CPUs outside the
+    reservation if nothing is left. The original mask of every moved thread
+    is remembered and put back once the reservation ends, unless something
+    else changed the thread's affinity in the meantime. Threads and child
+    processes started by a moved process inherit its restricted mask; they
+    are put back on the original mask with it.
+
+    The Enforcer passes the processes of its /proc scan, so no extra sweep
+    or helper command is needed; each process is looked at once per
+    reservation (one stat for its owner, one listdir for its threads) and
+    again only when verifying.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.reserved = None        # CpuMask kept free, None while no exclusive rule runs
+        self.owners = frozenset()   # UIDs whose processes are moved
+        self.checked = set()        # (pid, starttime) looked at under the current reservation
+        self.evicted = {}           # pid -> (starttime, {tid: (original CpuMask, CpuMask set)})
+
+    def update(self, reserved, owners, candidates, verify=False):
+        """
+        Args:
+            reserved (CpuMask): CPUs to keep free, None to end the reservation
+            owners (set): UIDs whose processes are moved off reserved
+            candidates (list): (pid, starttime, ppid) of every running process
+                               without a rule of its own
+            verify (bool): Look at processes again that were moved or
+                           checked before, to undo drift
+
+        Returns:
+            int: Number of threads moved or restored
+        """
+        owners = frozenset(owners)
+        changed = 0
+        if reserved != self.reserved or owners != self.owners:
+            if self.reserved is not None:
+                changed += self.restore()
+            self.reserved = reserved
+            self.owners = owners
+            self.checked.clear()
+            if reserved is not None:
+                # Always logged, to stderr like rebalancing decisions
+                print(f"Reserving CPUs {reserved.to_cpulist()} for exclusive rules", file=sys.stderr)
+        if reserved is None:
+            return changed
+
+        alive = set()
+        processes = 0
+        moved = 0
+        for pid, starttime, ppid in candidates:
+            key = (pid, starttime)
+            alive.add(key)
+            if key in self.checked and not verify:
+                continue
+            self.checked.add(key)
+            if self.backend.owner(pid) not in owners:
+                continue
+            evicted = self._evict(pid, starttime, ppid)
+            if evicted:
+                processes += 1
+                moved += evicted
+
+        # Forget exited processes
+        self.checked &= alive
+        for pid in [pid for pid, (starttime, _threads) in self.evicted.items() if (pid, starttime) not in alive]:
+            del self.evicted[pid]
+        if moved:
+            print(f"Moved {moved} threads of {processes} processes off CPUs {reserved.to_cpulist()}",
+                  file=sys.stderr)
+        return changed + moved
+
+    def _inherited(self, pid, starttime, ppid):
+        """
+        Mask set by _evict() -> original mask, of a process and its parent.
+        Threads and children started after an eviction inherit the mask set,
+        and go back to the original with the others.
+        """
+        inherited = {}
+        parent = self.evicted.get(ppid)
+        if parent is not None and parent[0] <= starttime:
+            inherited.update((applied, original) for original, applied in parent[1].values())
+        entry = self.evicted.get(pid)
+        if entry is not None and entry[0] == starttime:
+            inherited.update((applied, original) for original, applied in entry[1].values())
+        return inherited
+
+    def _evict(self, pid, starttime, ppid=None):
+        tids = self.backend.list_tids(pid) or ()
+        inherited = self._inherited(pid, starttime, ppid)
+        entry = self.evicted.get(pid)
+        if entry is None or entry[0] != starttime:
+            entry = self.evicted[pid] = (starttime, {})
+        threads = entry[1]
+        moved = 0
+        for tid in tids:
+            tid = int(tid)
+            try:
+                current = CpuMask.from_cpus(self.backend.get_affinity(tid))
+            except OSError:
+                continue
+            if not current & self.reserved:
+                if tid not in threads and current in inherited:
+                    # Started after the eviction, on the mask it set
+                    threads[tid] = (inherited[current], current)
+                continue
+            target = (current - self.reserved) or self.reserved.complement()
+            if not target:
+                continue
+            try:
+                self.backend.set_affinity(tid, target.cpus)
+            except OSError:
+                # Gone, or confined by a cpuset; leave it be
+                continue
+            original = threads[tid][0] if tid in threads else current
+            threads[tid] = (original, target)
+            moved += 1
+        if not threads:
+            del self.evicted[pid]
+        return moved
+
+    def restore(self):
+        """Put every moved thread back on its original mask. Returns the number restored."""
+        # engine imports this module
+        from engine import read_identity
+
+        restored = 0
+        for pid, (starttime, threads) in self.evicted.items():
+            identity = read_identity(pid, self.backend)
+            if identity is None or identity[0] != starttime:
+                # Exited; the PID may belong to another process by now
+                continue
+            inherited = {applied: original for original, applied in threads.values()}
+            # A TID listed under the same process still belongs to it
+            for tid in self.backend.list_tids(pid) or ():
+                tid = int(tid)
+                try:
+                    current = CpuMask.from_cpus(self.backend.get_affinity(tid))
+                    if tid in threads:
+                        original, applied = threads[tid]
+                    elif current in inherited:
+                        # Started since the last check, on the mask set
+                        original, applied = inherited[current], current
+                    else:
+                        continue
+                    if current != applied:
+                        # Changed since, by the program or the user
+                        continue
+                    self.backend.set_affinity(tid, original.cpus)
+                    restored += 1
+                except OSError:
+                    continue
+        self.evicted.clear()
+        if self.reserved is not None:
+            print(f"Released CPUs {self.reserved.to_cpulist()}, restored {restored} threads", file=sys.stderr)
+        self.reserved = None
+        self.owners = frozenset()
+        self.checked.clear()
+        return restored
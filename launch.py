@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# cpu-affinity-manager/launch.py
+"""
+Start a program with its saved CPU affinity already in place.
+
+    cpu-affinity-manager run --rule <process name> -- <command> [args...]
+
+The saved mask, and the setting's scheduling policy, nice value and I/O
+priority if it has them, are set on this process, which then execs the
+command, so the program and every thread it creates start on the right CPUs
+without any initial delay. As a Steam launch option:
+
+    cpu-affinity-manager run --rule 'game\\.exe' -- %command%
+
+Threads only get their names after they start, so per-thread rules and
+hot-thread promotion cannot be applied before exec. For such rules a small
+helper process stays behind and places the program's threads as they are
+named, until the program exits.
+"""
+import os
+import sys
+
+if 'APP_DIR' in os.environ:
+    sys.path.append(os.environ['APP_DIR'])
+
+HELPER_INTERVAL = 1.0   # Seconds between thread placement passes of the helper
+
+
+def find_rule(manager, rule_name, command):
+    """Return (process_name, settings) for --rule, or the rule matching the command."""
+    matcher = manager.get_matcher(quiet=False)
+    if rule_name is not None:
+        return matcher.get(rule_name)
+    return matcher.match(' '.join(command))
+
+
+def spawn_thread_helper(pid, process_name):
+    """
+    Fork a detached helper that enforces the rule's thread placement on pid.
+
+    The helper is double-forked so it is not a child of the program, which
+    would otherwise have to reap it.
+    """
+    try:
+        child = os.fork()
+    except OSError as e:
+        print(f"Could not start the thread placement helper: {e}", file=sys.stderr)
+        return
+    if child:
+        os.waitpid(child, 0)
+        return
+
+    try:
+        if os.fork():
+            os._exit(0)
+        os.setsid()
+        _run_thread_helper(pid, process_name)
+    except BaseException:
+        pass
+    os._exit(0)
+
+
+def _run_thread_helper(pid, process_name):
+    import time
+
+    from engine import Enforcer
+    from settings import SettingsManager
+
+    enforcer = Enforcer(SettingsManager().get_matcher())
+    if not enforcer.pin(pid, process_name):
+        return
+    while pid in enforcer.pinned:
+        enforcer.enforce_pids([pid])
+        time.sleep(HELPER_INTERVAL)
+        enforcer.sample_adaptive()
+        if pid not in enforcer.tracked:
+            # Exited, or the PID now belongs to someone else
+            break
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='cpu-affinity-manager run',
+        description="Run a command with the CPU affinity of a saved process setting.")
+    parser.add_argument('--rule', metavar='NAME',
+                        help="Saved process name whose settings to use "
+                             "(default: the setting matching the command line)")
+    parser.add_argument('--mask', metavar='MASK',
+                        help="CPU mask to use instead of a saved setting")
+    parser.add_argument('command', nargs=argparse.REMAINDER,
+                        help="Command to run, after --")
+    args = parser.parse_args(argv)
+
+    command = args.command[1:] if args.command[:1] == ['--'] else args.command
+    if not command:
+        parser.error("no command given")
+
+    from cpumask import CpuMask
+    from settings import SettingsManager
+
+    rule = None
+    cpu_mask = args.mask
+    if cpu_mask is None:
+        rule = find_rule(SettingsManager(), args.rule, command)
+        if rule is None:
+            # Never keep the program from starting, just run it unplaced
+            print(f"No valid saved setting for {args.rule or command[0]!r}, running without affinity",
+                  file=sys.stderr)
+        else:
+            cpu_mask = rule[1]['cpu_mask']
+
+    if cpu_mask is not None:
+        try:
+            mask = CpuMask.parse(cpu_mask)
+            os.sched_setaffinity(0, mask.cpus)
+        except (ValueError, OSError) as e:
+            print(f"Could not set CPU affinity {cpu_mask}: {e}", file=sys.stderr)
+            rule = None
+
+    if rule is not None:
+        # Inherited across exec and by every thread, like the affinity
+        from procfs import get_backend
+        from schedattrs import SchedAttrs
+        attrs = SchedAttrs.from_settings(rule[1], quiet=False)
+        if attrs is not None:
+            try:
+                attrs.apply(os.getpid(), get_backend())
+            except OSError as e:
+                print(f"Could not set scheduling attributes ({attrs}): {e}", file=sys.stderr)
+
+    if rule is not None and (rule[1].get('thread_rules') or rule[1].get('hot_threads')):
+        spawn_thread_helper(os.getpid(), rule[0])
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    try:
+        os.execvp(command[0], command)
+    except OSError as e:
+        print(f"Could not run {command[0]}: {e}", file=sys.stderr)
+        return 127
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,10 +8,21 @@ import os
 import subprocess
 import gettext
 import locale
+import re
+import shlex
 import threading
 from pathlib import Path
-from utils import apply_cpu_affinity, DEFAULT_CPU_MASK, get_pids_by_name, validate_cpu_mask
+from utils import apply_cpu_affinity, DEFAULT_CPU_MASK, validate_cpu_mask
+from ere import escape as ere_escape, pattern_error
 from settings import SettingsManager
+from cpumask import CpuMask
+from topology import get_topology
+from metrics import read_stats
+from preview import PreviewWorker
+from process_browser import ProcessBrowser
+from profiles import ProfileManager
+from scheduler import DeferredScheduler, reapply_waves
+from telemetry import PlacementMonitor
 
 APP_ID = 'io.github.p82590037723122.CPU_Affinity_Manager'
 
@@ -20,6 +31,14 @@ BASE_DIR = os.environ.get('APP_DIR', os.path.dirname(os.path.abspath(__file__)))
 LOCALE_DIR = os.environ.get('LOCALE_DIR', os.path.join(BASE_DIR, 'locale'))
 UI_FILE = os.path.join(BASE_DIR, 'affinity_window.ui')
 
+# systemd user units for the auto-apply modes
+DAEMON_SERVICE = 'cpu-affinity-manager-daemon.service'
+TIMER_SERVICE = 'cpu-affinity-manager.service'
+TIMER_UNIT = 'cpu-affinity-manager.timer'
+STATS_REFRESH_SECONDS = 5
+PREVIEW_DEBOUNCE_MS = 250   # Pause in typing before the preview is refreshed
+TELEMETRY_REFRESH_SECONDS = 2   # Sampling interval of the placement telemetry panel
+
 # Setup gettext
 try:
     locale.setlocale(locale.LC_ALL, '')
@@ -35,15 +54,22 @@ class CPUAffinityManagerWindow(Adw.ApplicationWindow):
     __gtype_name__ = "CPUAffinityManagerWindow"
 
     # Template children
+    profile_dropdown = Gtk.Template.Child()
     process_entry = Gtk.Template.Child()
     search_button = Gtk.Template.Child()
+    browser_expander = Gtk.Template.Child()
+    browser_container = Gtk.Template.Child()
     settings_menu_button = Gtk.Template.Child()
     mask_container = Gtk.Template.Child()
     mask_dropdown = Gtk.Template.Child()
     custom_mask_entry = Gtk.Template.Child()
     delay_spin = Gtk.Template.Child()
     preview_label = Gtk.Template.Child()
+    telemetry_expander = Gtk.Template.Child()
+    telemetry_label = Gtk.Template.Child()
+    stats_label = Gtk.Template.Child()
     status_label = Gtk.Template.Child()
+    copy_launch_button = Gtk.Template.Child()
     save_button = Gtk.Template.Child()
     apply_button = Gtk.Template.Child()
     info_button = Gtk.Template.Child()
@@ -51,10 +77,13 @@ class CPUAffinityManagerWindow(Adw.ApplicationWindow):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
+        self.copy_launch_button.connect('clicked', self.on_copy_launch_clicked)
         self.save_button.connect('clicked', self.on_save_clicked)
         self.apply_button.connect('clicked', self.on_apply_clicked)
         self.search_button.connect('clicked', self.on_search_clicked)
         self.info_button.connect('clicked', self.on_info_clicked)
+        self.browser_expander.connect('notify::expanded', self.on_browser_expanded)
+        self.telemetry_expander.connect('notify::expanded', self.on_telemetry_expanded)
         self.connect('close-request', self.on_close_request)
         
         # Input change handlers
@@ -66,24 +95,30 @@ class CPUAffinityManagerWindow(Adw.ApplicationWindow):
         # Initialize settings manager
         self.settings_manager = SettingsManager()
         
-        # Track background operations
+        # Track background operations; delayed applies and their re-apply
+        # waves all wait on one scheduler thread
         self.operation_in_progress = False
-        self.operation_thread = None
-
-        # Define untranslated CPU mask data (mask value, is_custom flag)
-        # This ensures comparisons work regardless of translation
-        self.cpu_mask_data = [
-            ("0x00FF00FF", False),  # Default
-            ("0xFF00FF00", False),  # Cores (8-15 and 24-31)
-            ("0xFFFFFFFF", False),  # Cores (0-31)
-            ("0x00000001", False),  # Core 0 only
-            ("0x0000000F", False),  # Cores 0-3
-            ("0x000000FF", False),  # Cores 0-7
-            ("0x0000FF00", False),  # Cores 8-15
-            ("0x00FF0000", False),  # Cores 16-23
-            ("0xFF000000", False),  # Cores 24-31
-            (None, True),           # Custom - no fixed mask value
-        ]
+        self.apply_scheduler = DeferredScheduler()
+        self.apply_timers = []
+
+        # Preview queries run on a worker thread, debounced while typing
+        self.preview_worker = PreviewWorker(
+            lambda *result: GLib.idle_add(self._show_preview, *result)
+        )
+        self.preview_timeout_id = None
+
+        # The process browser is built when its expander is first opened
+        self.process_browser = None
+
+        # Placement telemetry of the entered rule, sampled while its expander is open
+        self.telemetry_monitor = None
+        self.telemetry_key = None
+        self.telemetry_timeout_id = None
+        self.telemetry_sampling = False
+
+        # CPU mask presets are generated from the CPU topology in setup_mask_dropdown
+        self.cpu_mask_data = []
+        self.default_cpu_mask = DEFAULT_CPU_MASK
 
         # Setup CPU mask dropdown model
         self.setup_mask_dropdown()
@@ -91,20 +126,45 @@ class CPUAffinityManagerWindow(Adw.ApplicationWindow):
         # Setup settings menu
         self.settings_menu_button.set_popover(self.create_settings_popover())
 
+        # Named sets of saved settings, switched from the header bar
+        self.profile_manager = ProfileManager(self.settings_manager)
+        self.profile_names = []
+        self.setup_profile_dropdown()
+        self.profile_dropdown.connect('notify::selected', self.on_profile_selected)
+
         # Setup actions
         self.setup_actions()
 
+        # Show the auto-apply service's stats file and keep it current
+        self.update_stats()
+        self.stats_timeout_id = GLib.timeout_add_seconds(STATS_REFRESH_SECONDS, self.update_stats)
+
     def setup_actions(self):
         # Enable service action
         action_enable_service = Gio.SimpleAction.new("enable_service", None)
         action_enable_service.connect("activate", self.on_enable_service_action)
         self.add_action(action_enable_service)
 
+        # Enable service with cgroup cpuset placement action
+        action_enable_cpuset_service = Gio.SimpleAction.new("enable_cpuset_service", None)
+        action_enable_cpuset_service.connect("activate", self.on_enable_cpuset_service_action)
+        self.add_action(action_enable_cpuset_service)
+
+        # Enable timer-driven service action
+        action_enable_timer_service = Gio.SimpleAction.new("enable_timer_service", None)
+        action_enable_timer_service.connect("activate", self.on_enable_timer_service_action)
+        self.add_action(action_enable_timer_service)
+
         # Disable service action
         action_disable_service = Gio.SimpleAction.new("disable_service", None)
         action_disable_service.connect("activate", self.on_disable_service_action)
         self.add_action(action_disable_service)
 
+        # Save settings as profile action
+        action_save_profile = Gio.SimpleAction.new("save_profile", None)
+        action_save_profile.connect("activate", self.on_save_profile_action)
+        self.add_action(action_save_profile)
+
         # Open settings folder action
         action_open_settings = Gio.SimpleAction.new("open_settings_folder", None)
         action_open_settings.connect("activate", self.on_open_settings_folder_action)
@@ -118,6 +178,12 @@ class CPUAffinityManagerWindow(Adw.ApplicationWindow):
     def on_enable_service_action(self, action, param):
         self.on_enable_service_clicked(None)
 
+    def on_enable_cpuset_service_action(self, action, param):
+        self.on_enable_service_clicked(None, cpuset=True)
+
+    def on_enable_timer_service_action(self, action, param):
+        self.on_enable_timer_service_clicked(None)
+
     def on_disable_service_action(self, action, param):
         self.on_disable_service_clicked(None)
 
@@ -145,20 +211,22 @@ class CPUAffinityManagerWindow(Adw.ApplicationWindow):
         about.present()
 
     def setup_mask_dropdown(self):
-        # Create translated display strings for the dropdown
-        # These correspond to the cpu_mask_data entries
-        self.cpu_mask_options = [
-            _("0x00FF00FF - Default (Cores 0-7 and 16-23)"),
-            _("0xFF00FF00 - Cores (8-15 and 24-31)"),
-            _("0xFFFFFFFF - Cores (0-31)"),
-            _("0x00000001 - Core 0 only"),
-            _("0x0000000F - Cores 0-3"),
-            _("0x000000FF - Cores 0-7"),
-            _("0x0000FF00 - Cores 8-15"),
-            _("0x00FF0000 - Cores 16-23"),
-            _("0xFF000000 - Cores 24-31"),
-            _("Custom - Enter your own mask")
-        ]
+        # Untranslated CPU mask data (mask value, is_custom flag) and the
+        # translated display strings, generated from the detected CPU topology.
+        # This ensures comparisons work regardless of translation.
+        self.cpu_mask_data = []
+        self.cpu_mask_options = []
+        topology = get_topology()
+        self.default_cpu_mask = topology.default_mask().to_hex()
+
+        for mask, kind, details in topology.presets():
+            self.cpu_mask_data.append((mask.to_hex(), False))
+            self.cpu_mask_options.append(
+                "{} - {}".format(mask.to_hex(), self.describe_mask_preset(mask, kind, details))
+            )
+
+        self.cpu_mask_data.append((None, True))  # Custom - no fixed mask value
+        self.cpu_mask_options.append(_("Custom - Enter your own mask"))
         
         # Create string list model and set it to the dropdown
         model = Gtk.StringList.new(self.cpu_mask_options)
@@ -167,6 +235,106 @@ class CPUAffinityManagerWindow(Adw.ApplicationWindow):
         # Set default option (index 0 is the default)
         self.mask_dropdown.set_selected(0)
 
+    def setup_profile_dropdown(self):
+        """Fill the profile dropdown and select the active profile."""
+        self.profile_names = self.profile_manager.names()
+        self.profile_switching = True
+        self.profile_dropdown.set_model(Gtk.StringList.new(self.profile_names))
+        self.profile_dropdown.set_selected(self.profile_names.index(self.profile_manager.active))
+        self.profile_switching = False
+
+    def on_profile_selected(self, dropdown, pspec):
+        if self.profile_switching:
+            return
+        index = dropdown.get_selected()
+        if index >= len(self.profile_names) or self.profile_names[index] == self.profile_manager.active:
+            return
+        name = self.profile_names[index]
+        self.profile_switching = True
+        dropdown.set_sensitive(False)
+        self.status_label.set_markup(_("<span>Switching to profile '{}'...</span>").format(
+            GLib.markup_escape_text(name)))
+        # Switching re-places the running processes, keep the window responsive
+        threading.Thread(target=self._switch_profile, args=(name,), daemon=True).start()
+
+    def _switch_profile(self, name):
+        try:
+            result = self.profile_manager.switch(name)
+        except Exception as e:
+            print(f"Error switching profiles: {e}")
+            result = None
+        GLib.idle_add(self._profile_switched, name, result)
+
+    def _profile_switched(self, name, result):
+        """Show the outcome of a profile switch (runs on main thread)."""
+        if result is None:
+            status = _("<span color='red'>Could not switch to profile '{}'. Check the terminal for details.</span>").format(
+                GLib.markup_escape_text(name))
+        elif result.success:
+            status = _("<span color='green'>Switched to profile '{}': {} threads of {} processes placed</span>").format(
+                GLib.markup_escape_text(name), result.threads, result.processes)
+        else:
+            status = _("<span color='red'>{}</span>").format(GLib.markup_escape_text(str(result)))
+        self.status_label.set_markup(status)
+        self.setup_profile_dropdown()
+        self.profile_dropdown.set_sensitive(True)
+        self.settings_menu_button.set_popover(self.create_settings_popover())
+        self.update_preview()
+        return False
+
+    def on_save_profile_action(self, action, param):
+        dialog = Gtk.MessageDialog(
+            transient_for=self,
+            modal=True,
+            message_type=Gtk.MessageType.QUESTION,
+            buttons=Gtk.ButtonsType.OK_CANCEL,
+            text=_("Save Settings as Profile"),
+            secondary_text=_("The saved settings are stored under this name and it becomes the active profile. "
+                             "Switch between profiles with the dropdown in the header bar.")
+        )
+        entry = Gtk.Entry(placeholder_text=_("Profile name, e.g. gaming"))
+        dialog.get_message_area().append(entry)
+        entry.connect("activate", lambda e: dialog.response(Gtk.ResponseType.OK))
+
+        def on_response(dialog, response):
+            name = entry.get_text().strip()
+            dialog.destroy()
+            if response != Gtk.ResponseType.OK or not name:
+                return
+            if self.profile_manager.save_as(name):
+                self.status_label.set_markup(_("<span color='green'>Saved settings as profile '{}'</span>").format(
+                    GLib.markup_escape_text(name)))
+                self.setup_profile_dropdown()
+            else:
+                self.status_label.set_markup(_("<span color='red'>Failed to save profile '{}'</span>").format(
+                    GLib.markup_escape_text(name)))
+
+        dialog.connect("response", on_response)
+        dialog.present()
+
+    def describe_mask_preset(self, mask, kind, details):
+        """Translated description of a topology preset."""
+        cpus = mask.to_cpulist()
+        if kind == 'default':
+            source = {
+                'vcache': _("V-Cache CCD"),
+                'pcores': _("performance cores"),
+            }.get(details.get('source'), _("all CPUs"))
+            return _("Default, {} (CPUs {})").format(source, cpus)
+        if kind == 'vcache':
+            return _("V-Cache CCD {}, {} MB L3 (CPUs {})").format(details['index'], details['size_mb'], cpus)
+        if kind == 'ccd':
+            return _("CCD {}, {} MB L3 (CPUs {})").format(details['index'], details['size_mb'], cpus)
+        if kind == 'ccd_no_smt':
+            return _("CCD {} without SMT siblings (CPUs {})").format(details['index'], cpus)
+        if kind == 'no_smt':
+            return _("One thread per core, no SMT siblings (CPUs {})").format(cpus)
+        if kind == 'pcores':
+            return _("Performance cores (CPUs {})").format(cpus)
+        if kind == 'ecores':
+            return _("Efficiency cores (CPUs {})").format(cpus)
+        return _("All CPUs ({})").format(cpus)
+
     def create_settings_popover(self):
         popover = Gtk.Popover()
         box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6)
@@ -232,7 +400,7 @@ class CPUAffinityManagerWindow(Adw.ApplicationWindow):
         settings = self.settings_manager.get_process_settings(process_name)
         if settings:
             self.process_entry.set_text(process_name)
-            self.set_cpu_mask(settings.get('cpu_mask', DEFAULT_CPU_MASK))
+            self.set_cpu_mask(settings.get('cpu_mask', self.default_cpu_mask))
             self.delay_spin.set_value(settings.get('initial_delay', 20))
             self.update_preview()
             self.status_label.set_markup(_("<span color='green'>Loaded settings for '{}'</span>").format(process_name))
@@ -258,16 +426,24 @@ class CPUAffinityManagerWindow(Adw.ApplicationWindow):
         if not process_name:
             self.status_label.set_markup(_("<span color='red'>Please enter a process name</span>"))
             return
+        error = pattern_error(process_name)
+        if error is not None:
+            # Saved names are matched like `pgrep -f` patterns (POSIX ERE)
+            self.status_label.set_markup(_("<span color='red'>Invalid process pattern (extended regular expression): {}</span>").format(
+                GLib.markup_escape_text(error)))
+            return
 
-        cpu_mask = self.get_current_cpu_mask() or DEFAULT_CPU_MASK
+        cpu_mask = self.get_current_cpu_mask() or self.default_cpu_mask
         if not validate_cpu_mask(cpu_mask):
-            self.status_label.set_markup(_("<span color='red'>Invalid CPU mask format. Must be in format 0x followed by hexadecimal digits (e.g., 0x00FF00FF)</span>"))
+            self.status_label.set_markup(_("<span color='red'>Invalid CPU mask. Use a hex mask (e.g., 0x00FF00FF) or a CPU list (e.g., 0-7,16-23) that includes at least one online CPU</span>"))
             return
 
-        settings = {
+        # Keep the settings only editable in the file, e.g. reapply_waves
+        settings = dict(self.settings_manager.get_process_settings(process_name) or {})
+        settings.update({
             'cpu_mask': cpu_mask,
             'initial_delay': self.delay_spin.get_value_as_int()
-        }
+        })
 
         if self.settings_manager.save_process_settings(process_name, settings):
             self.status_label.set_markup(_("<span color='green'>Saved settings for '{}'</span>").format(process_name))
@@ -277,30 +453,124 @@ class CPUAffinityManagerWindow(Adw.ApplicationWindow):
         else:
             self.status_label.set_markup(_("<span color='red'>Failed to save settings for '{}'</span>").format(process_name))
 
+    def on_copy_launch_clicked(self, button):
+        """Copy a launch.py command line for the saved rule, e.g. for Steam launch options."""
+        process_name = self.process_entry.get_text().strip()
+        if not process_name:
+            self.status_label.set_markup(_("<span color='red'>Please enter a process name</span>"))
+            return
+        if self.settings_manager.get_process_settings(process_name) is None:
+            self.status_label.set_markup(_("<span color='red'>Save the settings for '{}' first</span>").format(
+                GLib.markup_escape_text(process_name)))
+            return
+
+        if 'APP_DIR' in os.environ:
+            launcher = 'cpu-affinity-manager run'
+        else:
+            launcher = f"python3 {shlex.quote(os.path.join(BASE_DIR, 'launch.py'))}"
+        # %command% is replaced by Steam with the game's own command line
+        command = f"{launcher} --rule {shlex.quote(process_name)} -- %command%"
+        self.get_clipboard().set(command)
+        self.status_label.set_markup(_("<span color='green'>Copied: {}</span>").format(
+            GLib.markup_escape_text(command)))
+
     def update_preview(self, *args):
+        """Refresh the preview once typing pauses for PREVIEW_DEBOUNCE_MS."""
+        self._schedule_preview(PREVIEW_DEBOUNCE_MS)
+
+    def _schedule_preview(self, delay_ms, report_status=False):
+        # Whatever is queued or running is for an outdated entry now
+        self.preview_worker.cancel()
+        if self.preview_timeout_id:
+            GLib.source_remove(self.preview_timeout_id)
+            self.preview_timeout_id = None
+
         process_name = self.process_entry.get_text().strip()
         if not process_name:
             self.preview_label.set_markup(_("<span style='italic'>Enter a process name to see what will be changed</span>"))
             return
 
-        cpu_mask = self.get_current_cpu_mask() or DEFAULT_CPU_MASK
-        initial_delay = self.delay_spin.get_value_as_int()
+        self.preview_timeout_id = GLib.timeout_add(delay_ms, self._start_preview, process_name, report_status)
+
+    def _start_preview(self, process_name, report_status):
+        self.preview_timeout_id = None
+        self.preview_worker.submit(process_name, report_status)
+        return False  # One-shot timeout
+
+    def _show_preview(self, generation, report_status, result):
+        """Show the result of a preview query (runs on main thread)."""
+        if not self.preview_worker.is_current(generation):
+            # The entry changed again while this query was running
+            return False
+
+        process_name = GLib.markup_escape_text(self.process_entry.get_text().strip())
+        if result.error:
+            self.preview_label.set_markup(_("<span color='red'>Invalid process pattern '{}': {}</span>").format(
+                process_name, GLib.markup_escape_text(result.error)))
+            return False
+
+        if report_status:
+            if result.total:
+                self.status_label.set_markup(_("<span color='green'>Found {} matching process(es)</span>").format(result.total))
+            else:
+                self.status_label.set_markup(_("<span color='orange'>No processes found matching '{}'</span>").format(process_name))
 
-        # Get matching processes
-        pids = get_pids_by_name(process_name)
-        if not pids:
+        if not result.total:
             self.preview_label.set_markup(_("<span color='orange'>No processes found matching '{}'</span>").format(process_name))
-            return
+            return False
+
+        cpu_mask = self.get_current_cpu_mask() or self.default_cpu_mask
+        initial_delay = self.delay_spin.get_value_as_int()
 
         # Build preview text
         preview_text = _("<b>Will apply the following changes:</b>\n\n")
-        preview_text += _("• CPU Mask: {}\n").format(cpu_mask)
+        preview_text += _("• CPU Mask: {}\n").format(GLib.markup_escape_text(cpu_mask))
         preview_text += _("• Initial Delay: {} seconds\n\n").format(initial_delay)
-        preview_text += _("<b>Found {} matching process(es):</b>\n").format(len(pids))
-        for pid in pids:
-            preview_text += _("• PID: {}\n").format(pid)
+        preview_text += _("<b>Found {} matching process(es):</b>\n").format(result.total)
+        for entry in result.entries:
+            affinity = entry.affinity.to_cpulist() if entry.affinity is not None else _("unknown")
+            preview_text += _("• PID {}: {} thread(s), currently on CPUs {} — {}\n").format(
+                entry.pid, entry.threads, affinity,
+                GLib.markup_escape_text(entry.text[:80]))
+        if result.total > len(result.entries):
+            preview_text += _("• … and {} more\n").format(result.total - len(result.entries))
 
         self.preview_label.set_markup(preview_text)
+        return False  # Don't call this idle callback again
+
+    def update_stats(self):
+        """Show the stats written by the auto-apply service (periodic GLib callback)."""
+        stats = read_stats(self.settings_manager.stats_file)
+        if not stats:
+            self.stats_label.set_markup(_("<span style='italic'>No statistics yet. Enable the auto-apply service to collect them.</span>"))
+            return True
+
+        totals = stats.get('totals', {})
+        cycles = stats.get('cycles', {})
+        text = _("<b>Cycles:</b> {} full scans, {} process events\n").format(
+            cycles.get('full', 0), cycles.get('pids', 0))
+
+        last = stats.get('last', {}).get('full')
+        if last:
+            text += _("<b>Last scan:</b> {} processes, {} matched; scan {:.1f} ms, match {:.1f} ms, apply {:.1f} ms\n").format(
+                last['processes'], last['processes_matched'],
+                last['scan'] * 1000, last['match'] * 1000, last['apply'] * 1000)
+
+        text += _("<b>Threads:</b> {} checked, {} changed, {} failed; {} fallback commands\n").format(
+            totals.get('threads_checked', 0), totals.get('threads_changed', 0),
+            totals.get('threads_failed', 0), totals.get('fallback_forks', 0))
+        decisions = stats.get('rebalance_decisions')
+        if decisions:
+            decision = decisions[-1]
+            text += _("<b>Last rebalance:</b> '{}' {} CPUs {} at {:.0%} load ({})\n").format(
+                GLib.markup_escape_text(decision['rule']),
+                _("spilled to") if decision['spilled'] else _("returned to"),
+                decision['cpus'], decision['load'],
+                GLib.DateTime.new_from_unix_local(int(decision['time'])).format('%X'))
+        text += _("<b>Updated:</b> {}").format(
+            GLib.DateTime.new_from_unix_local(int(stats.get('updated', 0))).format('%X'))
+        self.stats_label.set_markup(text)
+        return True  # Keep the timeout running
 
     def on_search_clicked(self, button):
         process_name = self.process_entry.get_text().strip()
@@ -308,12 +578,105 @@ class CPUAffinityManagerWindow(Adw.ApplicationWindow):
             self.status_label.set_markup(_("<span color='red'>Please enter a process name to search</span>"))
             return
 
-        pids = get_pids_by_name(process_name)
-        if not pids:
-            self.status_label.set_markup(_("<span color='orange'>No processes found matching '{}'</span>").format(process_name))
+        # Search right away; the result also updates the status line
+        self._schedule_preview(0, report_status=True)
+
+    def on_browser_expanded(self, expander, pspec):
+        """Sample processes only while the browser is visible."""
+        if expander.get_expanded():
+            if self.process_browser is None:
+                self.process_browser = ProcessBrowser(self.on_process_picked)
+                self.browser_container.append(self.process_browser)
+            self.process_browser.start()
+        elif self.process_browser is not None:
+            self.process_browser.stop()
+
+    def on_telemetry_expanded(self, expander, pspec):
+        """Sample placement telemetry only while the panel is visible."""
+        if expander.get_expanded():
+            if self.telemetry_timeout_id is None:
+                self.update_telemetry()
+                self.telemetry_timeout_id = GLib.timeout_add_seconds(TELEMETRY_REFRESH_SECONDS, self.update_telemetry)
+        elif self.telemetry_timeout_id is not None:
+            GLib.source_remove(self.telemetry_timeout_id)
+            self.telemetry_timeout_id = None
+
+    def update_telemetry(self):
+        """Sample the entered rule's processes on a background thread (periodic GLib callback)."""
+        process_name = self.process_entry.get_text().strip()
+        if not process_name:
+            self.telemetry_monitor = self.telemetry_key = None
+            self.telemetry_label.set_markup(_("<span style='italic'>Enter a process name to see where its threads run</span>"))
+            return True
+
+        # The saved setting tells which CPUs each thread is meant for
+        settings = self.settings_manager.get_process_settings(process_name)
+        if settings is None:
+            settings = {'cpu_mask': self.get_current_cpu_mask() or self.default_cpu_mask}
+        key = (process_name, repr(settings))
+        if key != self.telemetry_key:
+            try:
+                self.telemetry_monitor = PlacementMonitor(process_name, settings)
+            except (re.error, KeyError, ValueError) as e:
+                self.telemetry_monitor = self.telemetry_key = None
+                self.telemetry_label.set_markup(_("<span color='red'>Cannot monitor '{}': {}</span>").format(
+                    GLib.markup_escape_text(process_name), GLib.markup_escape_text(str(e))))
+                return True
+            self.telemetry_key = key
+            self.telemetry_label.set_markup(_("<span style='italic'>Sampling...</span>"))
+
+        if not self.telemetry_sampling:
+            self.telemetry_sampling = True
+            monitor = self.telemetry_monitor
+            threading.Thread(target=self._sample_telemetry, args=(monitor,), daemon=True).start()
+        return True  # Keep the timeout running
+
+    def _sample_telemetry(self, monitor):
+        try:
+            interval = monitor.sample()
+        except Exception as e:
+            print(f"Error sampling placement telemetry: {e}")
+            interval = None
+        GLib.idle_add(self._show_telemetry, monitor, interval)
+
+    def _show_telemetry(self, monitor, interval):
+        """Show a telemetry sample (runs on main thread)."""
+        self.telemetry_sampling = False
+        if monitor is not self.telemetry_monitor or interval is None:
+            return False
+        if not interval.processes:
+            self.telemetry_label.set_markup(_("<span color='orange'>No running processes match '{}'</span>").format(
+                GLib.markup_escape_text(monitor.process_name)))
+            return False
+
+        def percent(value):
+            return f"{value:.1%}" if value is not None else _("n/a")
+
+        summary = monitor.summary()
+        text = _("<b>Now:</b> {} processes, {} threads\n").format(interval.processes, interval.threads)
+        text += _("<b>On intended CPUs:</b> {} now, {} over the last {:.0f} s\n").format(
+            percent(interval.on_mask_share), percent(summary.on_mask_share), summary.elapsed)
+        text += _("<b>Runqueue wait:</b> {} now, {} over the last {:.0f} s\n").format(
+            percent(interval.wait_share), percent(summary.wait_share), summary.elapsed)
+        text += _("<b>Migrations:</b> {:.1f}/s now, {:.1f}/s over the last {:.0f} s").format(
+            interval.migration_rate, summary.migration_rate, summary.elapsed)
+        self.telemetry_label.set_markup(text)
+        return False
+
+    def on_process_picked(self, item):
+        """Fill the rule editor from a row of the process browser."""
+        # Rules are extended regular expressions, the name has to match literally
+        process_name = ere_escape(item.name)
+        saved = self.settings_manager.get_process_settings(process_name)
+        self.process_entry.set_text(process_name)
+        if saved:
+            self.set_cpu_mask(saved.get('cpu_mask', self.default_cpu_mask))
+            self.delay_spin.set_value(saved.get('initial_delay', 20))
+            self.status_label.set_markup(_("<span color='green'>Loaded settings for '{}'</span>").format(
+                GLib.markup_escape_text(process_name)))
         else:
-            self.status_label.set_markup(_("<span color='green'>Found {} matching process(es)</span>").format(len(pids)))
-        self.update_preview()
+            self.status_label.set_markup(_("<span>Selected PID {} ({}), currently on CPUs {}</span>").format(
+                item.pid, GLib.markup_escape_text(item.name), item.affinity or _("unknown")))
 
     def on_info_clicked(self, button):
         dialog = Gtk.MessageDialog(
@@ -328,8 +691,9 @@ class CPUAffinityManagerWindow(Adw.ApplicationWindow):
                 "• Default\n"
                 "• Individual cores or core groups\n"
                 "• Or choose 'Custom' to enter your own mask.\n\n"
-                "Format: 0x followed by hexadecimal number\n"
-                "Example: 0x00FF00FF means:\n"
+                "Format: 0x followed by hexadecimal number,\n"
+                "or a CPU list of numbers and ranges\n"
+                "Example: 0x00FF00FF (same as 0-7,16-23) means:\n"
                 "• Cores 0-7 and 16-23 are allowed\n"
                 "• Other cores are not allowed")
         )
@@ -344,59 +708,66 @@ class CPUAffinityManagerWindow(Adw.ApplicationWindow):
 
         cpu_mask = self.get_current_cpu_mask()
         if not cpu_mask:
-            cpu_mask = DEFAULT_CPU_MASK
+            cpu_mask = self.default_cpu_mask
         elif not validate_cpu_mask(cpu_mask):
-            self.status_label.set_markup(_("<span color='red'>Invalid CPU mask format. Must be in format 0x followed by hexadecimal digits (e.g., 0x00FF00FF)</span>"))
+            self.status_label.set_markup(_("<span color='red'>Invalid CPU mask. Use a hex mask (e.g., 0x00FF00FF) or a CPU list (e.g., 0-7,16-23) that includes at least one online CPU</span>"))
             return
 
         initial_delay = self.delay_spin.get_value_as_int()
+        saved = self.settings_manager.get_process_settings(process_name)
+        waves = reapply_waves(saved or {}, quiet=False)
+        include_children = bool(saved and saved.get('include_children') is True)
+
+        # A new apply replaces the waves still pending from the previous one
+        for timer in self.apply_timers:
+            self.apply_scheduler.cancel(timer)
 
-        # Disable the button while processing
+        # Disable the button until the first wave ran
         self.apply_button.set_sensitive(False)
-        self.status_label.set_markup(_("<span>Processing...</span>"))
+        if initial_delay > 0:
+            self.status_label.set_markup(_("<span>Applying in {} seconds...</span>").format(initial_delay))
+        else:
+            self.status_label.set_markup(_("<span>Processing...</span>"))
         self.operation_in_progress = True
 
-        # Run the CPU affinity operation in a background thread to avoid blocking the UI
-        self.operation_thread = threading.Thread(
-            target=self._apply_affinity_threaded,
-            args=(process_name, cpu_mask, initial_delay),
-            daemon=True
-        )
-        self.operation_thread.start()
+        self.apply_timers = [
+            self.apply_scheduler.schedule(initial_delay + offset, self._apply_wave,
+                                          process_name, cpu_mask, wave, len(waves), include_children)
+            for wave, offset in enumerate(waves)
+        ]
 
-    def _apply_affinity_threaded(self, process_name, cpu_mask, initial_delay):
-        """Run CPU affinity operation in background thread."""
+    def _apply_wave(self, process_name, cpu_mask, wave, waves, include_children=False):
+        """Run one apply wave (on the scheduler thread)."""
         try:
-            success, succeeded, attempted = apply_cpu_affinity(
-                process_name, 
-                cpu_mask=cpu_mask,
-                initial_delay=initial_delay
-            )
-            
+            success, succeeded, attempted = apply_cpu_affinity(process_name, cpu_mask=cpu_mask,
+                                                               include_children=include_children)
+
             # Update UI on the main thread
-            GLib.idle_add(self._update_apply_status, success, succeeded, attempted)
+            GLib.idle_add(self._update_apply_status, success, succeeded, attempted, None, wave, waves)
         except Exception as e:
             # Handle any unexpected errors
             print(f"Error in background affinity operation: {e}")
-            GLib.idle_add(self._update_apply_status, False, 0, 0, str(e))
+            GLib.idle_add(self._update_apply_status, False, 0, 0, str(e), wave, waves)
 
-    def _update_apply_status(self, success, succeeded, attempted, error_msg=None):
-        """Update UI after CPU affinity operation completes (runs on main thread)."""
+    def _update_apply_status(self, success, succeeded, attempted, error_msg=None, wave=0, waves=1):
+        """Update UI after an apply wave completes (runs on main thread)."""
         if error_msg:
             status = _("<span color='red'>Error: {}</span>").format(error_msg)
         elif success:
             status = _("<span color='green'>Successfully set affinity for {} out of {} threads</span>").format(succeeded, attempted)
         else:
             status = _("<span color='red'>Failed to set affinity. Check the terminal for details.</span>")
+        if waves > 1:
+            status += _(" (wave {} of {})").format(wave + 1, waves)
 
         self.status_label.set_markup(status)
         self.apply_button.set_sensitive(True)
 
-        # Reset operation tracking
-        self.operation_in_progress = False
-        self.operation_thread = None
-
-        return False  # Don't call this idle callback again
+        # Reset operation tracking after the last wave
+        if wave == waves - 1:
+            self.operation_in_progress = False
+            self.apply_timers = []
+        return False
 
     def on_mask_selection_changed(self, dropdown, pspec):
         """Handle CPU mask dropdown selection changes."""
@@ -424,13 +795,18 @@ class CPUAffinityManagerWindow(Adw.ApplicationWindow):
                 return self.custom_mask_entry.get_text().strip()
             else:
                 return mask_value
-        return DEFAULT_CPU_MASK
+        return self.default_cpu_mask
 
     def set_cpu_mask(self, mask_value):
         """Set the CPU mask to a specific value."""
-        # First try to find it in the predefined mask data
+        # First try to find it in the predefined mask data; compare parsed
+        # masks so '0-7' matches the '0x000000FF' preset
+        try:
+            mask = CpuMask.parse(mask_value)
+        except ValueError:
+            mask = None
         for i, (preset_mask, is_custom) in enumerate(self.cpu_mask_data):
-            if not is_custom and preset_mask == mask_value:
+            if not is_custom and mask is not None and CpuMask.parse(preset_mask) == mask:
                 self.mask_dropdown.set_selected(i)
                 self.mask_dropdown.set_visible(True)
                 self.custom_mask_entry.set_visible(False)
@@ -445,31 +821,61 @@ class CPUAffinityManagerWindow(Adw.ApplicationWindow):
 
     def on_close_request(self, window):
         """Handle window close request and clean up background operations."""
+        if self.stats_timeout_id:
+            GLib.source_remove(self.stats_timeout_id)
+            self.stats_timeout_id = None
+        if self.preview_timeout_id:
+            GLib.source_remove(self.preview_timeout_id)
+            self.preview_timeout_id = None
+        self.preview_worker.cancel()
+        if self.telemetry_timeout_id:
+            GLib.source_remove(self.telemetry_timeout_id)
+            self.telemetry_timeout_id = None
+        if self.process_browser is not None:
+            self.process_browser.stop()
+
         if self.operation_in_progress:
             print("Warning: Application closed while CPU affinity operation was in progress.")
-            print("The background thread will continue until completion since it's a daemon thread.")
-            # Note: daemon threads are automatically terminated when the main program exits,
-            # but any subprocess operations may continue briefly
+            print("Pending applies and re-apply waves are dropped.")
+        self.apply_scheduler.close()
 
         return False  # Allow the window to close
 
-    def on_enable_service_clicked(self, button):
-        """Enable systemd user service and timer."""
-        try:
-            # Get paths
-            base_dir = Path(BASE_DIR)
-            auto_apply_script = base_dir / 'auto_apply.py'
-            
-            if not auto_apply_script.exists():
-                self.status_label.set_markup(_("<span color='red'>Error: auto_apply.py not found. Cannot enable service.</span>"))
-                return
+    def on_enable_service_clicked(self, button, cpuset=False):
+        """
+        Enable the long-running systemd user service (event-driven daemon).
+
+        With cpuset, the daemon places processes in cgroup cpusets and the
+        unit asks systemd to delegate the cpuset controller to it. The rule
+        cgroups are below the service's own, so KillMode=process keeps
+        systemd from killing every placed program whenever the service
+        stops, restarts or is replaced by another auto-apply mode.
+        """
+        options = ' --cpuset' if cpuset else ''
+        cgroup_options = 'Delegate=cpuset\nKillMode=process\n' if cpuset else ''
+        # Formatted again by _install_service, hence the doubled braces
+        service_content = f"""[Unit]
+Description=Enforce CPU affinity for saved processes
 
-            # Determine systemd user directory
-            systemd_dir = Path.home() / '.config' / 'systemd' / 'user'
-            systemd_dir.mkdir(parents=True, exist_ok=True)
+[Service]
+Type=simple
+ExecStart=/usr/bin/python3 {{auto_apply_script}} --daemon{options}
+{cgroup_options}WorkingDirectory={{base_dir}}
+Restart=on-failure
+RestartSec=5
+StandardOutput=null
+StandardError=journal
+SyslogLevel=notice
+LogLevelMax=notice
+
+[Install]
+WantedBy=default.target
+"""
+        self._install_service(DAEMON_SERVICE, service_content, None)
 
-            # Create service file content
-            service_content = f"""[Unit]
+    def on_enable_timer_service_clicked(self, button):
+        """Enable the oneshot systemd user service driven by a one-minute timer."""
+        service_content = """[Unit]
 Description=Apply CPU affinity to saved processes
 After=network.target
 
@@ -479,56 +885,86 @@ ExecStart=/usr/bin/python3 {auto_apply_script}
 WorkingDirectory={base_dir}
 StandardOutput=null
 StandardError=journal
+SyslogLevel=notice
 LogLevelMax=notice
 """
-            # Create timer file content
-            timer_content = """[Unit]
+        # Create timer file content
+        timer_content = f"""[Unit]
 Description=Timer to apply CPU affinity to saved processes every minute
 
 [Timer]
 OnBootSec=1m
 OnUnitActiveSec=1m
-Unit=cpu-affinity-manager.service
+Unit={TIMER_SERVICE}
 
 [Install]
 WantedBy=timers.target
 """
-            # Write files
-            service_file = systemd_dir / 'cpu-affinity-manager.service'
-            timer_file = systemd_dir / 'cpu-affinity-manager.timer'
+        self._install_service(TIMER_SERVICE, service_content, timer_content)
+
+    def _install_service(self, service_name, service_template, timer_content):
+        """Write and enable a unit, replacing whichever auto-apply mode was active."""
+        try:
+            # Get paths
+            base_dir = Path(BASE_DIR)
+            auto_apply_script = base_dir / 'auto_apply.py'
             
-            with open(service_file, 'w') as f:
+            if not auto_apply_script.exists():
+                self.status_label.set_markup(_("<span color='red'>Error: auto_apply.py not found. Cannot enable service.</span>"))
+                return
+
+            # Only one auto-apply mode should run at a time
+            self._remove_service_units()
+
+            # Determine systemd user directory
+            systemd_dir = Path.home() / '.config' / 'systemd' / 'user'
+            systemd_dir.mkdir(parents=True, exist_ok=True)
+
+            service_content = service_template.format(
+                auto_apply_script=auto_apply_script, base_dir=base_dir
+            )
+
+            # Write files
+            with open(systemd_dir / service_name, 'w') as f:
                 f.write(service_content)
-                
-            with open(timer_file, 'w') as f:
-                f.write(timer_content)
 
-            # Reload systemd and enable timer
+            if timer_content:
+                with open(systemd_dir / TIMER_UNIT, 'w') as f:
+                    f.write(timer_content)
+
+            # Reload systemd and enable the unit (the timer, for the oneshot mode)
             subprocess.run(['systemctl', '--user', 'daemon-reload'], check=True)
-            subprocess.run(['systemctl', '--user', 'enable', '--now', 'cpu-affinity-manager.timer'], check=True)
+            unit = TIMER_UNIT if timer_content else service_name
+            subprocess.run(['systemctl', '--user', 'enable', '--now', unit], check=True)
 
-            self.status_label.set_markup(_("<span color='green'>Auto-apply service enabled successfully!</span>"))
+            if timer_content:
+                self.status_label.set_markup(_("<span color='green'>Auto-apply service enabled successfully!</span>"))
+            else:
+                # A user service cannot receive process start events, which need CAP_NET_ADMIN
+                self.status_label.set_markup(_("<span color='green'>Auto-apply service enabled successfully! "
+                                               "New processes are placed within a few seconds.</span>"))
 
         except subprocess.CalledProcessError as e:
              self.status_label.set_markup(_("<span color='red'>Failed to enable service: Command failed with exit code {}</span>").format(e.returncode))
         except Exception as e:
             self.status_label.set_markup(_("<span color='red'>Failed to enable service: {}</span>").format(str(e)))
 
+    def _remove_service_units(self):
+        """Stop, disable and delete all auto-apply units (daemon and timer)."""
+        for unit in (DAEMON_SERVICE, TIMER_UNIT):
+            subprocess.run(['systemctl', '--user', 'disable', '--now', unit],
+                           check=False, capture_output=True)
+
+        systemd_dir = Path.home() / '.config' / 'systemd' / 'user'
+        for unit in (DAEMON_SERVICE, TIMER_SERVICE, TIMER_UNIT):
+            unit_file = systemd_dir / unit
+            if unit_file.exists():
+                unit_file.unlink()
+
     def on_disable_service_clicked(self, button):
         """Disable systemd user service and timer."""
         try:
-            # Disable and stop timer
-            subprocess.run(['systemctl', '--user', 'disable', '--now', 'cpu-affinity-manager.timer'], check=False)
-            
-            # Remove files
-            systemd_dir = Path.home() / '.config' / 'systemd' / 'user'
-            service_file = systemd_dir / 'cpu-affinity-manager.service'
-            timer_file = systemd_dir / 'cpu-affinity-manager.timer'
-            
-            if service_file.exists():
-                service_file.unlink()
-            if timer_file.exists():
-                timer_file.unlink()
+            self._remove_service_units()
                 
             # Reload systemd
             subprocess.run(['systemctl', '--user', 'daemon-reload'], check=True)
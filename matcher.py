@@ -0,0 +1,233 @@
+# cpu-affinity-manager/matcher.py
+
+import re
+
+from cpumask import CpuMask
+from ere import compile_pattern
+from hotthreads import HotThreadConfig
+from irq import irq_rules
+from rebalance import RebalanceConfig
+from schedattrs import SchedAttrs
+from scheduler import DEFAULT_WAVES, reapply_waves
+from utils import validate_cpu_mask
+
+# Translated patterns using these cannot be embedded in a combined
+# alternation: numbered backreferences would shift.
+_NOT_COMBINABLE = re.compile(r'\\[1-9]')
+
+
+class RuleMatcher:
+    """
+    All saved rules compiled into a single matcher.
+
+    Rule names are POSIX extended regular expressions searched in a process
+    command line, the same way `pgrep -f` uses them (see ere.py). They are combined into one alternation
+    so a process that matches no rule is rejected with a single regex search,
+    whatever the number of rules.
+
+    Precedence when several rules match: the rule with the highest optional
+    'priority' setting wins, and among equal priorities the rule saved first.
+    """
+
+    def __init__(self, rules, quiet=True):
+        """
+        Args:
+            rules (list): (process_name, settings) pairs in saved order
+            quiet (bool): If True, do not report rules that were skipped
+        """
+        valid = []
+        for order, (process_name, settings) in enumerate(rules):
+            if not settings or not validate_cpu_mask(settings.get('cpu_mask')):
+                continue
+            try:
+                pattern = compile_pattern(process_name)
+            except re.error as e:
+                # pgrep would fail on this pattern too, it never matches
+                if not quiet:
+                    print(f"Invalid process pattern '{process_name}': {e}")
+                continue
+            valid.append((-_priority(settings), order, process_name, pattern, settings))
+
+        valid.sort(key=lambda rule: rule[:2])
+        # (process_name, pattern, settings) in precedence order
+        self.rules = [(name, pattern, settings) for _p, _o, name, pattern, settings in valid]
+        self._thread_rules = {
+            name: ThreadRules.from_settings(settings, quiet=quiet) for name, _pattern, settings in self.rules
+        }
+        self._hot_threads = {
+            name: HotThreadConfig.from_settings(settings, quiet=quiet) for name, _pattern, settings in self.rules
+        }
+        self._rebalance = {
+            name: RebalanceConfig.from_settings(settings, quiet=quiet) for name, _pattern, settings in self.rules
+        }
+        self._waves = {
+            name: reapply_waves(settings, quiet=quiet) for name, _pattern, settings in self.rules
+        }
+        self._irqs = {
+            name: irq_rules(settings, quiet=quiet) for name, _pattern, settings in self.rules
+        }
+        self._sched = {
+            name: SchedAttrs.from_settings(settings, quiet=quiet) for name, _pattern, settings in self.rules
+        }
+        self.exclusive_rules = {name for name, _pattern, settings in self.rules if settings.get('exclusive') is True}
+        self.inheriting_rules = {
+            name for name, _pattern, settings in self.rules if settings.get('include_children') is True
+        }
+        self._combined = None
+        self._group_index = {}
+        self._combinable = set()
+        self._separate = []
+        self._compile()
+
+    def _compile(self):
+        parts = []
+        for index, (_name, pattern, _settings) in enumerate(self.rules):
+            if _NOT_COMBINABLE.search(pattern.pattern):
+                self._separate.append(index)
+                continue
+            group = f'r{index}'
+            self._group_index[group] = index
+            parts.append(f'(?P<{group}>{pattern.pattern})')
+
+        if not parts:
+            return
+        try:
+            self._combined = re.compile('|'.join(parts))
+            self._combinable = set(self._group_index.values())
+        except re.error:
+            # Fall back to searching every rule on its own
+            self._combined = None
+            self._group_index = {}
+            self._separate = list(range(len(self.rules)))
+
+    def __len__(self):
+        return len(self.rules)
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def _first_index(self, text):
+        """Index of the highest-precedence matching rule, or None."""
+        best = None
+        if self._combined is not None:
+            match = self._combined.search(text)
+            if match is not None:
+                best = self._group_index[match.lastgroup]
+                # The leftmost match is not necessarily the highest precedence;
+                # only rules ranked above it still need a look.
+                for index in range(best):
+                    if index in self._combinable and self.rules[index][1].search(text):
+                        best = index
+                        break
+
+        for index in self._separate:
+            if best is not None and index >= best:
+                break
+            if self.rules[index][1].search(text):
+                best = index
+                break
+        return best
+
+    def match(self, text):
+        """Return (process_name, settings) of the winning rule, or None."""
+        if not text or not self.rules:
+            return None
+        index = self._first_index(text)
+        if index is None:
+            return None
+        process_name, _pattern, settings = self.rules[index]
+        return process_name, settings
+
+    def get(self, process_name):
+        """Return (process_name, settings) of a valid rule by name, or None."""
+        for name, _pattern, settings in self.rules:
+            if name == process_name:
+                return name, settings
+        return None
+
+    def thread_rules(self, process_name):
+        """Compiled ThreadRules of a rule, or None if it has no thread rules."""
+        return self._thread_rules.get(process_name)
+
+    def hot_threads(self, process_name):
+        """HotThreadConfig of a rule, or None if hot-thread promotion is off."""
+        return self._hot_threads.get(process_name)
+
+    def rebalance(self, process_name):
+        """RebalanceConfig of a rule, or None if it is not rebalanced."""
+        return self._rebalance.get(process_name)
+
+    def waves(self, process_name):
+        """Re-apply wave offsets of a rule in seconds, see scheduler.reapply_waves."""
+        return self._waves.get(process_name, DEFAULT_WAVES)
+
+    def sched_attrs(self, process_name):
+        """SchedAttrs of a rule, or None if it sets no scheduling attributes."""
+        return self._sched.get(process_name)
+
+    def irq_affinity(self, process_name):
+        """IRQ steering rules of a rule, see irq.irq_rules, or None."""
+        return self._irqs.get(process_name)
+
+    def match_all(self, text):
+        """Return the names of all rules matching text, in precedence order."""
+        if not text or self.match(text) is None:
+            return []
+        return [name for name, pattern, _settings in self.rules if pattern.search(text)]
+
+
+class ThreadRules:
+    """
+    Per-thread-name masks inside a matched process.
+
+    Each entry of a rule's 'thread_rules' list has a 'pattern' (a regex
+    searched in the thread name from /proc/<pid>/task/<tid>/comm) and a
+    'cpu_mask'. The first matching entry wins; threads matching none get
+    'thread_fallback_mask', or the rule's own cpu_mask if that is not set.
+    """
+
+    def __init__(self, entries, fallback):
+        self.entries = entries
+        self.fallback = fallback
+
+    @classmethod
+    def from_settings(cls, settings, quiet=True):
+        """Compile the thread rules of one rule's settings, or return None."""
+        entries = []
+        for entry in settings.get('thread_rules') or ():
+            try:
+                pattern = compile_pattern(entry['pattern'])
+                mask = CpuMask.parse(entry['cpu_mask'])
+            except (KeyError, TypeError, ValueError, re.error) as e:
+                if not quiet:
+                    print(f"Ignoring invalid thread rule {entry!r}: {e}")
+                continue
+            if mask.is_valid():
+                entries.append((pattern, mask))
+
+        if not entries:
+            return None
+
+        fallback = settings.get('thread_fallback_mask') or settings['cpu_mask']
+        if not validate_cpu_mask(fallback):
+            fallback = settings['cpu_mask']
+        return cls(entries, CpuMask.parse(fallback))
+
+    def match(self, thread_name):
+        """CpuMask of the first entry matching the thread name, or None."""
+        for pattern, mask in self.entries:
+            if pattern.search(thread_name):
+                return mask
+        return None
+
+    def mask_for(self, thread_name):
+        """CpuMask for a thread with the given name."""
+        mask = self.match(thread_name)
+        return self.fallback if mask is None else mask
+
+
+def _priority(settings):
+    try:
+        return int(settings.get('priority', 0))
+    except (TypeError, ValueError):
+        return 0
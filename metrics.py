@@ -0,0 +1,177 @@
+# cpu-affinity-manager/metrics.py
+
+import json
+import time
+
+from utils import write_atomic
+
+WRITE_INTERVAL = 5.0    # Seconds between stats file updates of the daemon
+
+PHASES = ('scan', 'match', 'apply')
+COUNTERS = (
+    ('processes_matched', "Matched processes enforced"),
+    ('threads_checked', "Threads whose affinity was checked"),
+    ('threads_changed', "Threads moved to their rule's mask"),
+    ('threads_unchanged', "Threads already on their rule's mask"),
+    ('threads_failed', "Threads whose affinity could not be set"),
+    ('threads_vanished', "Threads that exited before they could be set"),
+    ('fallback_forks', "Helper commands (taskset, ps) forked as a fallback"),
+    ('cgroup_moves', "Processes moved into their rule's cpuset cgroup"),
+    ('sched_changed', "Threads whose scheduling policy, nice value or I/O priority was changed"),
+    ('sched_failed', "Threads whose scheduling attributes could not be set"),
+    ('threads_evicted', "Threads of other processes moved off or back onto an exclusive rule's CPUs"),
+)
+
+
+class CycleStats:
+    """Timings and thread counts of one enforcement cycle."""
+    __slots__ = ('kind', 'finished', 'scan', 'match', 'apply', 'processes',
+                 'processes_matched', 'threads_checked', 'threads_changed', 'threads_unchanged',
+                 'threads_failed', 'threads_vanished', 'fallback_forks', 'cgroup_moves',
+                 'sched_changed', 'sched_failed', 'threads_evicted')
+
+    def __init__(self, kind):
+        """
+        Args:
+            kind (str): 'full' for a /proc scan, 'pids' for event-driven
+                        enforcement of single processes, 'sample' for
+                        hot-thread re-sampling, 'rebalance' for moving the
+                        processes of a rule whose mask was rebalanced
+        """
+        self.kind = kind
+        self.finished = 0.0
+        self.scan = 0.0
+        self.match = 0.0
+        self.apply = 0.0
+        self.processes = 0
+        for name, _help in COUNTERS:
+            setattr(self, name, 0)
+
+    def add_result(self, result):
+        """Count the threads of a utils.ApplyResult."""
+        self.threads_checked += result.attempted + result.vanished
+        self.threads_changed += result.changed + result.fallback
+        self.threads_unchanged += result.unchanged
+        self.threads_failed += len(result.failed)
+        self.threads_vanished += result.vanished
+        self.cgroup_moves += result.moved
+        self.sched_changed += result.sched_changed
+        self.sched_failed += len(result.sched_failed)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class EnforcementStats:
+    """Totals over all cycles of one Enforcer, plus the last cycle of each kind."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.cycles = {}
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.totals = {name: 0 for name, _help in COUNTERS}
+        self.last = {}
+        self.decisions = ()     # Recent rebalance.RebalanceDecision, shared with the Rebalancer
+
+    def record(self, cycle):
+        cycle.finished = time.time()
+        self.cycles[cycle.kind] = self.cycles.get(cycle.kind, 0) + 1
+        for phase in PHASES:
+            self.seconds[phase] += getattr(cycle, phase)
+        for name in self.totals:
+            self.totals[name] += getattr(cycle, name)
+        self.last[cycle.kind] = cycle
+
+    def as_dict(self):
+        return {
+            'started': self.started,
+            'updated': time.time(),
+            'cycles': dict(self.cycles),
+            'seconds': dict(self.seconds),
+            'totals': dict(self.totals),
+            'last': {kind: cycle.as_dict() for kind, cycle in self.last.items()},
+            'rebalance_decisions': [decision.as_dict() for decision in self.decisions],
+        }
+
+    def to_prometheus(self):
+        """Stats in the Prometheus text exposition format."""
+        lines = [
+            "# HELP cpu_affinity_start_time_seconds Start time of the enforcement process",
+            "# TYPE cpu_affinity_start_time_seconds gauge",
+            f"cpu_affinity_start_time_seconds {self.started:.3f}",
+            "# HELP cpu_affinity_cycles_total Enforcement cycles by kind",
+            "# TYPE cpu_affinity_cycles_total counter",
+        ]
+        for kind, count in sorted(self.cycles.items()):
+            lines.append(f'cpu_affinity_cycles_total{{kind="{kind}"}} {count}')
+
+        lines += [
+            "# HELP cpu_affinity_cycle_seconds_total Time spent in each phase of enforcement",
+            "# TYPE cpu_affinity_cycle_seconds_total counter",
+        ]
+        for phase in PHASES:
+            lines.append(f'cpu_affinity_cycle_seconds_total{{phase="{phase}"}} {self.seconds[phase]:.6f}')
+
+        lines += [
+            "# HELP cpu_affinity_last_cycle_seconds Duration of each phase of the last cycle",
+            "# TYPE cpu_affinity_last_cycle_seconds gauge",
+        ]
+        for kind, cycle in sorted(self.last.items()):
+            for phase in PHASES:
+                lines.append(f'cpu_affinity_last_cycle_seconds{{kind="{kind}",phase="{phase}"}} '
+                             f'{getattr(cycle, phase):.6f}')
+
+        full = self.last.get('full')
+        if full is not None:
+            lines += [
+                "# HELP cpu_affinity_processes Processes seen by the last full scan",
+                "# TYPE cpu_affinity_processes gauge",
+                f"cpu_affinity_processes {full.processes}",
+            ]
+
+        for name, help_text in COUNTERS:
+            lines += [
+                f"# HELP cpu_affinity_{name}_total {help_text}",
+                f"# TYPE cpu_affinity_{name}_total counter",
+                f"cpu_affinity_{name}_total {self.totals[name]}",
+            ]
+        return '\n'.join(lines) + '\n'
+
+
+def read_stats(path):
+    """Load a stats file written by StatsWriter, or return None."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class StatsWriter:
+    """
+    Publishes EnforcementStats as a JSON file and, optionally, a Prometheus
+    textfile-collector file (for node_exporter's --collector.textfile.directory).
+    """
+
+    def __init__(self, stats, json_path=None, textfile=None, interval=WRITE_INTERVAL):
+        self.stats = stats
+        self.json_path = json_path
+        self.textfile = textfile
+        self.interval = interval
+        self._written_at = None
+
+    def maybe_write(self):
+        """Write the files if interval seconds passed since the last write."""
+        now = time.monotonic()
+        if self._written_at is None or now - self._written_at >= self.interval:
+            self.write()
+
+    def write(self):
+        self._written_at = time.monotonic()
+        try:
+            if self.json_path:
+                write_atomic(self.json_path, json.dumps(self.stats.as_dict(), indent=4))
+            if self.textfile:
+                write_atomic(self.textfile, self.stats.to_prometheus())
+        except OSError as e:
+            print(f"Error writing enforcement stats: {e}")
@@ -0,0 +1,150 @@
+# cpu-affinity-manager/preview.py
+
+import re
+import threading
+import time
+
+from cpumask import CpuMask
+from engine import scan_processes
+from ere import compile_pattern
+from procfs import get_backend
+
+SNAPSHOT_MAX_AGE = 2.0   # Seconds a /proc snapshot is reused between preview queries
+MAX_DETAILED = 50        # Processes whose affinity and threads are read per query
+
+
+class ProcessSnapshot:
+    """
+    A /proc scan shared between preview queries.
+
+    Typing a process name runs one query per pause, and all of them within
+    max_age seconds are answered from the same scan instead of each forking
+    pgrep.
+    """
+
+    def __init__(self, max_age=SNAPSHOT_MAX_AGE, backend=None):
+        self.max_age = max_age
+        self.backend = backend or get_backend()
+        self._processes = None
+        self._taken_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        """The processes of a scan at most max_age seconds old."""
+        with self._lock:
+            now = time.monotonic()
+            if self._processes is None or now - self._taken_at > self.max_age:
+                self._processes = scan_processes(self.backend)
+                self._taken_at = now
+            return self._processes
+
+    def invalidate(self):
+        with self._lock:
+            self._processes = None
+
+
+class PreviewEntry:
+    """One matching process with its current placement."""
+    __slots__ = ('pid', 'text', 'threads', 'affinity')
+
+    def __init__(self, pid, text, threads, affinity):
+        self.pid = pid
+        self.text = text
+        self.threads = threads
+        self.affinity = affinity   # CpuMask, or None if it could not be read
+
+
+class PreviewResult:
+    """Matches of one preview query."""
+    __slots__ = ('entries', 'total', 'error')
+
+    def __init__(self, entries=(), total=0, error=None):
+        self.entries = list(entries)
+        self.total = total
+        self.error = error
+
+
+def query_processes(pattern, snapshot, backend=None, limit=MAX_DETAILED, is_stale=None):
+    """
+    Find processes matching pattern the way `pgrep -f` does.
+
+    Args:
+        pattern (str): Extended regular expression (ERE) searched in the command line
+        snapshot (ProcessSnapshot): Shared /proc scan
+        limit (int): Number of matches whose affinity and threads are read
+        is_stale (callable): Returns True once the query is no longer needed
+
+    Returns:
+        PreviewResult, or None if the query went stale
+    """
+    backend = backend or snapshot.backend
+    try:
+        regex = compile_pattern(pattern)
+    except re.error as e:
+        return PreviewResult(error=str(e))
+
+    matches = [proc for proc in snapshot.get() if regex.search(proc.match_text)]
+    entries = []
+    for proc in matches[:limit]:
+        if is_stale is not None and is_stale():
+            return None
+        tids = backend.list_tids(proc.pid)
+        try:
+            affinity = CpuMask.from_cpus(backend.get_affinity(proc.pid))
+        except OSError:
+            affinity = None
+        entries.append(PreviewEntry(proc.pid, proc.match_text, len(tids) if tids else 0, affinity))
+    return PreviewResult(entries, len(matches))
+
+
+class PreviewWorker:
+    """
+    Background thread answering preview queries, newest first.
+
+    submit() replaces any query that has not started yet, and a query that
+    is running when a newer one arrives is abandoned; its result is never
+    delivered. callback(generation, token, result) is called on the worker
+    thread, so GUI code should hand it to the main loop (GLib.idle_add).
+    """
+
+    def __init__(self, callback, snapshot=None):
+        self.callback = callback
+        self.snapshot = snapshot or ProcessSnapshot()
+        self._generation = 0
+        self._pending = None
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, pattern, token=None):
+        """Queue a query for pattern. Returns its generation number."""
+        with self._condition:
+            self._generation += 1
+            self._pending = (self._generation, pattern, token)
+            self._condition.notify()
+            return self._generation
+
+    def cancel(self):
+        """Drop the pending query and abandon the running one."""
+        with self._condition:
+            self._generation += 1
+            self._pending = None
+
+    def is_current(self, generation):
+        return generation == self._generation
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None:
+                    self._condition.wait()
+                generation, pattern, token = self._pending
+                self._pending = None
+
+            try:
+                result = query_processes(pattern, self.snapshot,
+                                         is_stale=lambda: not self.is_current(generation))
+            except Exception as e:
+                result = PreviewResult(error=str(e))
+            if result is not None and self.is_current(generation):
+                self.callback(generation, token, result)
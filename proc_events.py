@@ -0,0 +1,167 @@
+# cpu-affinity-manager/proc_events.py
+
+import errno
+import os
+import socket
+import struct
+
+# Netlink proc connector constants (linux/connector.h, linux/cn_proc.h)
+NETLINK_CONNECTOR = 11
+CN_IDX_PROC = 1
+CN_VAL_PROC = 1
+NLMSG_DONE = 3
+
+PROC_CN_MCAST_LISTEN = 1
+PROC_CN_MCAST_IGNORE = 2
+
+PROC_EVENT_NONE = 0x00000000
+PROC_EVENT_FORK = 0x00000001
+PROC_EVENT_EXEC = 0x00000002
+PROC_EVENT_COMM = 0x00000200
+PROC_EVENT_EXIT = 0x80000000
+
+_NLMSGHDR = struct.Struct('=IHHII')
+_CN_MSG = struct.Struct('=IIIIHH')
+_PROC_EVENT_HEADER = struct.Struct('=IIQ')
+_PID_PAIR = struct.Struct('=II')
+_FORK_EVENT = struct.Struct('=IIII')
+
+_RECV_SIZE = 65536
+
+
+class ProcEvent:
+    """A single fork/exec/exit/comm event from the kernel."""
+    __slots__ = ('what', 'pid', 'tgid', 'parent_tgid')
+
+    def __init__(self, what, pid, tgid, parent_tgid=0):
+        self.what = what
+        self.pid = pid
+        self.tgid = tgid
+        self.parent_tgid = parent_tgid
+
+    @property
+    def is_thread(self):
+        return self.pid != self.tgid
+
+
+class ProcConnector:
+    """
+    Subscriber for process events from the kernel's netlink proc connector.
+
+    Subscribing needs CAP_NET_ADMIN; open() returns False when the connector
+    is unavailable so callers can fall back to polling /proc.
+    """
+
+    def __init__(self):
+        self.sock = None
+        self.overflowed = False
+        self.error = 0
+
+    def open(self, quiet=True):
+        """Open the netlink socket and subscribe to process events."""
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_CONNECTOR)
+        except (OSError, AttributeError) as e:
+            if not quiet:
+                print(f"Proc connector not available: {e}")
+            return False
+
+        try:
+            sock.bind((0, CN_IDX_PROC))
+            sock.send(self._control_message(PROC_CN_MCAST_LISTEN))
+        except OSError as e:
+            if not quiet:
+                print(f"Could not subscribe to process events: {e}")
+            sock.close()
+            return False
+
+        sock.setblocking(False)
+        self.sock = sock
+        return True
+
+    def close(self):
+        if self.sock is None:
+            return
+        try:
+            self.sock.send(self._control_message(PROC_CN_MCAST_IGNORE))
+        except OSError:
+            pass
+        self.sock.close()
+        self.sock = None
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def _control_message(self, op):
+        payload = struct.pack('=I', op)
+        cn_msg = _CN_MSG.pack(CN_IDX_PROC, CN_VAL_PROC, 0, 0, len(payload), 0)
+        length = _NLMSGHDR.size + len(cn_msg) + len(payload)
+        return _NLMSGHDR.pack(length, NLMSG_DONE, 0, 0, os.getpid()) + cn_msg + payload
+
+    def read_events(self):
+        """
+        Drain all pending events without blocking.
+
+        If the socket buffer overflowed, events were lost and `overflowed` is
+        set so the caller can fall back to a full /proc scan. If the kernel
+        rejected the subscription, `error` holds its errno.
+        """
+        events = []
+        while True:
+            try:
+                data = self.sock.recv(_RECV_SIZE)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.ENOBUFS:
+                    self.overflowed = True
+                    continue
+                raise
+            if not data:
+                break
+            for event in parse_messages(data):
+                if event.what == PROC_EVENT_NONE:
+                    # Subscription acknowledgement, carries an errno
+                    self.error = self.error or event.pid
+                else:
+                    events.append(event)
+        return events
+
+
+def parse_messages(data):
+    """Parse one netlink datagram into a list of ProcEvent."""
+    events = []
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        length = _NLMSGHDR.unpack_from(data, offset)[0]
+        if length < _NLMSGHDR.size:
+            break
+        event = _parse_event(data, offset + _NLMSGHDR.size, offset + length)
+        if event is not None:
+            events.append(event)
+        # Netlink messages are 4-byte aligned
+        offset += (length + 3) & ~3
+    return events
+
+
+def _parse_event(data, start, end):
+    if start + _CN_MSG.size + _PROC_EVENT_HEADER.size > end:
+        return None
+    idx, val = _CN_MSG.unpack_from(data, start)[:2]
+    if idx != CN_IDX_PROC or val != CN_VAL_PROC:
+        return None
+
+    start += _CN_MSG.size
+    what = _PROC_EVENT_HEADER.unpack_from(data, start)[0]
+    body = start + _PROC_EVENT_HEADER.size
+
+    if what == PROC_EVENT_FORK and body + _FORK_EVENT.size <= end:
+        _parent_pid, parent_tgid, child_pid, child_tgid = _FORK_EVENT.unpack_from(data, body)
+        return ProcEvent(what, child_pid, child_tgid, parent_tgid)
+    if what == PROC_EVENT_NONE and body + 4 <= end:
+        err = struct.unpack_from('=I', data, body)[0]
+        return ProcEvent(what, err, 0)
+    if what in (PROC_EVENT_EXEC, PROC_EVENT_EXIT, PROC_EVENT_COMM) and body + _PID_PAIR.size <= end:
+        pid, tgid = _PID_PAIR.unpack_from(data, body)
+        return ProcEvent(what, pid, tgid)
+    return None
@@ -0,0 +1,263 @@
+# cpu-affinity-manager/process_browser.py
+
+import gettext
+import os
+import threading
+import time
+
+import gi
+gi.require_version('Gtk', '4.0')
+from gi.repository import Gtk, Gio, GLib, GObject, Pango
+
+from cpumask import CpuMask
+from procfs import get_backend
+
+REFRESH_SECONDS = 2
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+_ = gettext.gettext
+
+
+class ProcessSampler:
+    """
+    Reads name, command, thread count, affinity and CPU usage of every process.
+
+    Command lines are cached per (pid, starttime), so after the first sample
+    each process costs one read of /proc/<pid>/stat and one affinity call.
+    CPU usage is the share of one CPU used since the previous sample.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or get_backend()
+        self._commands = {}   # (pid, starttime) -> (name, command)
+        self._ticks = {}      # (pid, starttime) -> utime + stime of the last sample
+        self._sampled_at = None
+
+    def sample(self):
+        """
+        Returns:
+            dict: (pid, starttime) -> (pid, name, command, threads, affinity cpulist, cpu percent)
+        """
+        now = time.monotonic()
+        elapsed = now - self._sampled_at if self._sampled_at is not None else None
+        self._sampled_at = now
+
+        rows = {}
+        ticks = {}
+        try:
+            pids = self.backend.list_pids()
+        except OSError:
+            return rows
+
+        for entry in pids:
+            stat = self.backend.read(entry, 'stat')
+            if not stat:
+                continue
+            head, _sep, tail = stat.rpartition(b')')
+            fields = tail.split()
+            try:
+                # Fields 14, 15, 20 and 22 of stat
+                used = int(fields[11]) + int(fields[12])
+                threads = int(fields[17])
+                key = (int(entry), int(fields[19]))
+            except (IndexError, ValueError):
+                continue
+
+            command = self._commands.get(key)
+            if command is None:
+                command = self._read_command(entry, head.partition(b'(')[2].decode('utf-8', 'replace'))
+                if command is None:
+                    continue
+                self._commands[key] = command
+
+            try:
+                affinity = CpuMask.from_cpus(self.backend.get_affinity(key[0])).to_cpulist()
+            except OSError:
+                affinity = ''
+
+            cpu = 0.0
+            if elapsed and key in self._ticks:
+                cpu = (used - self._ticks[key]) / CLOCK_TICKS / elapsed * 100
+            ticks[key] = used
+            rows[key] = (key[0], command[0], command[1], threads, affinity, cpu)
+
+        self._ticks = ticks
+        for key in self._commands.keys() - rows.keys():
+            del self._commands[key]
+        return rows
+
+    def _read_command(self, pid, comm):
+        raw = self.backend.read(pid, 'cmdline')
+        if raw is None:
+            return None
+        args = raw.rstrip(b'\0').split(b'\0')
+        command = b' '.join(args).decode('utf-8', 'replace')
+        if not command:
+            # Kernel threads have no command line, show [comm] like ps does
+            return comm, f'[{comm}]'
+        name = os.path.basename(args[0].decode('utf-8', 'replace').split(' ', 1)[0]) or comm
+        return name, command
+
+
+class ProcessItem(GObject.Object):
+    """One row of the process browser."""
+    __gtype_name__ = 'CpuAffinityProcessItem'
+
+    pid = GObject.Property(type=int)
+    name = GObject.Property(type=str)
+    command = GObject.Property(type=str)
+    threads = GObject.Property(type=int)
+    affinity = GObject.Property(type=str)
+    cpu = GObject.Property(type=float)
+
+    def __init__(self, key, row):
+        super().__init__()
+        self.key = key
+        self.update(row)
+
+    def update(self, row):
+        """Set changed values only, so unchanged rows emit no notifications."""
+        for prop, value in zip(('pid', 'name', 'command', 'threads', 'affinity', 'cpu'), row):
+            if prop == 'cpu':
+                value = round(value, 1)
+            if self.get_property(prop) != value:
+                self.set_property(prop, value)
+
+
+class ProcessBrowser(Gtk.Box):
+    """
+    Live list of all processes in a Gtk.ColumnView backed by a Gio.ListStore.
+
+    Samples are taken on a background thread every REFRESH_SECONDS while the
+    browser is running. Applying a sample only removes rows of exited
+    processes, updates the properties of rows whose values changed and
+    appends new processes, so the view never rebuilds its thousands of rows.
+    Activating a row calls on_pick(ProcessItem).
+    """
+
+    def __init__(self, on_pick, backend=None):
+        super().__init__(orientation=Gtk.Orientation.VERTICAL, spacing=6)
+        self.on_pick = on_pick
+        self.sampler = ProcessSampler(backend)
+        self.store = Gio.ListStore(item_type=ProcessItem)
+        self._timeout_id = None
+        self._sampling = False
+
+        self.search_entry = Gtk.SearchEntry()
+        self.search_entry.set_placeholder_text(_("Filter processes"))
+        self.append(self.search_entry)
+
+        self.filter = Gtk.StringFilter.new(Gtk.PropertyExpression.new(ProcessItem, None, 'command'))
+        self.filter.set_ignore_case(True)
+        self.filter.set_match_mode(Gtk.StringFilterMatchMode.SUBSTRING)
+        self.search_entry.connect('search-changed', lambda entry: self.filter.set_search(entry.get_text()))
+        filtered = Gtk.FilterListModel.new(self.store, self.filter)
+
+        self.view = Gtk.ColumnView()
+        self.view.set_single_click_activate(True)
+        self.view.connect('activate', self.on_activate)
+        sorted_model = Gtk.SortListModel.new(filtered, self.view.get_sorter())
+        self.selection = Gtk.SingleSelection.new(sorted_model)
+        self.selection.set_autoselect(False)
+        self.view.set_model(self.selection)
+
+        self._add_column(_("PID"), 'pid', Gtk.NumericSorter, str)
+        self._add_column(_("Name"), 'name', Gtk.StringSorter, str)
+        self._add_column(_("Threads"), 'threads', Gtk.NumericSorter, str)
+        self._add_column(_("CPU %"), 'cpu', Gtk.NumericSorter, lambda value: f"{value:.1f}")
+        self._add_column(_("Affinity"), 'affinity', Gtk.StringSorter, str)
+        self._add_column(_("Command"), 'command', Gtk.StringSorter, str, expand=True)
+
+        scrolled = Gtk.ScrolledWindow()
+        scrolled.set_min_content_height(300)
+        scrolled.set_vexpand(True)
+        scrolled.set_child(self.view)
+        self.append(scrolled)
+
+    def _add_column(self, title, prop, sorter_class, to_text, expand=False):
+        factory = Gtk.SignalListItemFactory()
+
+        def setup(_factory, list_item):
+            label = Gtk.Label(xalign=0.0)
+            if expand:
+                label.set_ellipsize(Pango.EllipsizeMode.END)
+            list_item.set_child(label)
+
+        def bind(_factory, list_item):
+            label = list_item.get_child()
+            label._binding = list_item.get_item().bind_property(
+                prop, label, 'label', GObject.BindingFlags.SYNC_CREATE,
+                lambda _binding, value: to_text(value)
+            )
+
+        def unbind(_factory, list_item):
+            label = list_item.get_child()
+            label._binding.unbind()
+            label._binding = None
+
+        factory.connect('setup', setup)
+        factory.connect('bind', bind)
+        factory.connect('unbind', unbind)
+
+        column = Gtk.ColumnViewColumn.new(title, factory)
+        column.set_sorter(sorter_class.new(Gtk.PropertyExpression.new(ProcessItem, None, prop)))
+        column.set_resizable(True)
+        column.set_expand(expand)
+        self.view.append_column(column)
+
+    def start(self):
+        """Refresh now and every REFRESH_SECONDS until stop()."""
+        if self._timeout_id is None:
+            self.refresh()
+            self._timeout_id = GLib.timeout_add_seconds(REFRESH_SECONDS, self.refresh)
+
+    def stop(self):
+        if self._timeout_id is not None:
+            GLib.source_remove(self._timeout_id)
+            self._timeout_id = None
+
+    def refresh(self):
+        if not self._sampling:
+            self._sampling = True
+            threading.Thread(target=self._sample_in_background, daemon=True).start()
+        return True  # Keep the timeout running
+
+    def _sample_in_background(self):
+        try:
+            rows = self.sampler.sample()
+        except Exception as e:
+            print(f"Error sampling processes: {e}")
+            rows = None
+        GLib.idle_add(self._apply_sample, rows)
+
+    def _apply_sample(self, rows):
+        """Merge a sample into the store (runs on main thread)."""
+        self._sampling = False
+        if rows is None:
+            return False
+
+        # Remove exited processes in runs, from the end so positions stay valid
+        run_end = None
+        for position in range(self.store.get_n_items() - 1, -1, -1):
+            item = self.store.get_item(position)
+            row = rows.pop(item.key, None)
+            if row is None:
+                if run_end is None:
+                    run_end = position + 1
+                continue
+            if run_end is not None:
+                self.store.splice(position + 1, run_end - position - 1, [])
+                run_end = None
+            item.update(row)
+        if run_end is not None:
+            self.store.splice(0, run_end, [])
+
+        if rows:
+            new_items = [ProcessItem(key, row) for key, row in sorted(rows.items())]
+            self.store.splice(self.store.get_n_items(), 0, new_items)
+        return False  # Don't call this idle callback again
+
+    def on_activate(self, view, position):
+        item = self.selection.get_item(position)
+        if item is not None:
+            self.on_pick(item)
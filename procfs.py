@@ -0,0 +1,362 @@
+# cpu-affinity-manager/procfs.py
+
+import os
+import random
+import re
+import subprocess
+
+from ere import compile_pattern
+from schedattrs import ioprio_get, ioprio_set
+
+PROC_ROOT = '/proc'
+SCHED_RESET_ON_FORK = 0x40000000
+
+
+class Counters:
+    """Number of operations a backend performed, for benchmarks and metrics."""
+    __slots__ = ('listdirs', 'reads', 'syscalls', 'forks')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.listdirs = 0
+        self.reads = 0
+        self.syscalls = 0
+        self.forks = 0
+
+    def snapshot(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ProcBackend:
+    """
+    Access to /proc, the affinity syscalls and helper commands (pgrep, ps,
+    taskset), counting every operation in `counters`.
+
+    All procfs and affinity access of the engine and utils goes through a
+    backend, so a SyntheticBackend can replace the real system in benchmarks.
+    """
+
+    def __init__(self, proc_root=PROC_ROOT):
+        self.proc_root = proc_root
+        self.counters = Counters()
+
+    def own_pid(self):
+        return os.getpid()
+
+    def list_pids(self):
+        """PIDs in /proc as strings. Raises OSError if /proc cannot be read."""
+        self.counters.listdirs += 1
+        return [entry for entry in os.listdir(self.proc_root) if entry.isdigit()]
+
+    def list_tids(self, pid):
+        """TIDs of a PID as strings, or None if its task directory cannot be read."""
+        self.counters.listdirs += 1
+        try:
+            return [tid for tid in os.listdir(f'{self.proc_root}/{pid}/task') if tid.isdigit()]
+        except OSError:
+            return None
+
+    def read(self, pid, name):
+        """Contents of /proc/<pid>/<name> as bytes, or None if it is gone."""
+        self.counters.reads += 1
+        try:
+            with open(f'{self.proc_root}/{pid}/{name}', 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def read_system(self, name):
+        """Contents of a system-wide /proc file such as /proc/stat as bytes, or None."""
+        self.counters.reads += 1
+        try:
+            with open(f'{self.proc_root}/{name}', 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def owner(self, pid):
+        """UID owning a process, or None if it is gone."""
+        self.counters.syscalls += 1
+        try:
+            return os.stat(f'{self.proc_root}/{pid}').st_uid
+        except OSError:
+            return None
+
+    def get_affinity(self, tid):
+        self.counters.syscalls += 1
+        return os.sched_getaffinity(tid)
+
+    def set_affinity(self, tid, cpus):
+        self.counters.syscalls += 1
+        os.sched_setaffinity(tid, cpus)
+
+    def get_policy(self, tid):
+        self.counters.syscalls += 1
+        return os.sched_getscheduler(tid) & ~SCHED_RESET_ON_FORK
+
+    def set_policy(self, tid, policy):
+        # Keep SCHED_RESET_ON_FORK, which get_policy() hides, as the thread had it
+        self.counters.syscalls += 2
+        flags = os.sched_getscheduler(tid) & SCHED_RESET_ON_FORK
+        os.sched_setscheduler(tid, policy | flags, os.sched_param(0))
+
+    def get_nice(self, tid):
+        # PRIO_PROCESS with a TID acts on that thread only
+        self.counters.syscalls += 1
+        return os.getpriority(os.PRIO_PROCESS, tid)
+
+    def set_nice(self, tid, nice):
+        self.counters.syscalls += 1
+        os.setpriority(os.PRIO_PROCESS, tid, nice)
+
+    def get_ioprio(self, tid):
+        self.counters.syscalls += 1
+        return ioprio_get(tid)
+
+    def set_ioprio(self, tid, ioprio):
+        self.counters.syscalls += 1
+        ioprio_set(tid, ioprio)
+
+    def run(self, command):
+        """Run a helper command and return its subprocess.CompletedProcess."""
+        self.counters.forks += 1
+        return subprocess.run(command, capture_output=True, text=True, check=False)
+
+
+_backend = None
+
+
+def get_backend():
+    """The backend used when none is passed explicitly (the real /proc by default)."""
+    global _backend
+    if _backend is None:
+        _backend = ProcBackend()
+    return _backend
+
+
+def set_backend(backend):
+    """Replace the default backend, e.g. with a SyntheticBackend. None restores /proc."""
+    global _backend
+    _backend = backend
+
+
+class SyntheticProcess:
+    __slots__ = ('pid', 'ppid', 'uid', 'comm', 'cmdline', 'starttime', 'threads')
+
+    def __init__(self, pid, ppid, uid, comm, cmdline, starttime):
+        self.pid = pid
+        self.ppid = ppid
+        self.uid = uid
+        self.comm = comm
+        self.cmdline = cmdline
+        self.starttime = starttime
+        self.threads = {}   # tid -> SyntheticThread
+
+
+class SyntheticThread:
+    __slots__ = ('tid', 'comm', 'ticks', 'affinity', 'processor', 'policy', 'nice', 'ioprio')
+
+    def __init__(self, tid, comm, affinity):
+        self.tid = tid
+        self.comm = comm
+        self.ticks = 0
+        self.affinity = affinity
+        self.processor = min(affinity)
+        self.policy = os.SCHED_OTHER
+        self.nice = 0
+        self.ioprio = 0
+
+
+_SYNTHETIC_NAMES = (
+    'firefox', 'steam', 'gnome-shell', 'pipewire', 'kworker', 'bash', 'code',
+    'discord', 'systemd', 'Xwayland', 'wineserver', 'java', 'python3', 'gcc',
+)
+
+
+class SyntheticBackend(ProcBackend):
+    """
+    In-memory process table that behaves like /proc plus the affinity
+    syscalls and pgrep/ps/taskset, so enforcement can be measured at scales
+    (10k processes x N threads) that are impractical to create for real.
+    """
+
+    def __init__(self, processes=10000, threads=4, cpus=None, seed=0, names=_SYNTHETIC_NAMES):
+        super().__init__(proc_root='<synthetic>')
+        self.cpus = frozenset(cpus if cpus is not None else range(os.cpu_count() or 1))
+        self.random = random.Random(seed)
+        self.procs = {}
+        self.tid_owner = {}
+        self.next_pid = 1000
+        self.clock = 0
+        # name -> bytes returned by read_system(), e.g. a recorded /proc/stat
+        self.system_files = {}
+        for index in range(processes):
+            name = names[index % len(names)]
+            self.add_process(f'/usr/bin/{name} --instance={index}', name, threads=threads)
+
+    def add_process(self, cmdline, comm=None, threads=1, ppid=1, uid=1000, thread_names=None):
+        """Create a process with the given number of threads. Returns its PID."""
+        pid = self._alloc_id()
+        comm = (comm or os.path.basename(cmdline.split(' ', 1)[0]))[:15]
+        self.clock += 1
+        proc = SyntheticProcess(pid, ppid, uid, comm, cmdline.encode().replace(b' ', b'\0') + b'\0', self.clock)
+        self.procs[pid] = proc
+        self._add_thread(proc, pid, comm)
+        for index in range(threads - 1):
+            name = thread_names[index % len(thread_names)] if thread_names else comm
+            self._add_thread(proc, self._alloc_id(), name)
+        return pid
+
+    def add_thread(self, pid, comm=None):
+        """Start one more thread in an existing process. Returns its TID."""
+        proc = self.procs[pid]
+        return self._add_thread(proc, self._alloc_id(), comm or proc.comm)
+
+    def remove_process(self, pid):
+        proc = self.procs.pop(pid, None)
+        if proc is not None:
+            for tid in proc.threads:
+                self.tid_owner.pop(tid, None)
+
+    def burn(self, tid, ticks):
+        """Account CPU time to a thread."""
+        self.procs[self.tid_owner[tid]].threads[tid].ticks += ticks
+
+    def _alloc_id(self):
+        self.next_pid += 1
+        return self.next_pid
+
+    def _add_thread(self, proc, tid, comm):
+        proc.threads[tid] = SyntheticThread(tid, comm[:15], self.cpus)
+        self.tid_owner[tid] = proc.pid
+        return tid
+
+    def own_pid(self):
+        return None
+
+    def read_system(self, name):
+        self.counters.reads += 1
+        return self.system_files.get(name)
+
+    def list_pids(self):
+        self.counters.listdirs += 1
+        return [str(pid) for pid in self.procs]
+
+    def list_tids(self, pid):
+        self.counters.listdirs += 1
+        proc = self.procs.get(int(pid))
+        return None if proc is None else [str(tid) for tid in proc.threads]
+
+    def read(self, pid, name):
+        self.counters.reads += 1
+        proc = self.procs.get(int(pid))
+        if proc is None:
+            return None
+        if name == 'cmdline':
+            return proc.cmdline
+        if name == 'comm':
+            return proc.comm.encode() + b'\n'
+        if name == 'stat':
+            return self._stat(proc, proc.threads[proc.pid])
+        if name.startswith('task/'):
+            _task, tid, field = name.split('/')
+            thread = proc.threads.get(int(tid))
+            if thread is None:
+                return None
+            if field == 'comm':
+                return thread.comm.encode() + b'\n'
+            if field == 'stat':
+                return self._stat(proc, thread)
+            if field == 'schedstat':
+                # Run time in ns (at 100 ticks per second), wait time, timeslices
+                return f'{thread.ticks * 10000000} 0 {thread.ticks}\n'.encode()
+        return None
+
+    def _stat(self, proc, thread):
+        # Enough of the 52 stat fields for every field the engine reads
+        fields = ['0'] * 52
+        fields[0] = str(thread.tid)
+        fields[1] = f'({thread.comm})'
+        fields[2] = 'S'
+        fields[3] = str(proc.ppid)
+        fields[13] = str(thread.ticks)
+        fields[19] = str(len(proc.threads))
+        fields[21] = str(proc.starttime)
+        fields[38] = str(thread.processor)
+        return ' '.join(fields).encode() + b'\n'
+
+    def owner(self, pid):
+        self.counters.syscalls += 1
+        proc = self.procs.get(int(pid))
+        return None if proc is None else proc.uid
+
+    def _thread(self, tid):
+        pid = self.tid_owner.get(int(tid))
+        if pid is None:
+            raise ProcessLookupError(3, 'No such process')
+        return self.procs[pid].threads[int(tid)]
+
+    def get_affinity(self, tid):
+        self.counters.syscalls += 1
+        return set(self._thread(tid).affinity)
+
+    def set_affinity(self, tid, cpus):
+        self.counters.syscalls += 1
+        cpus = frozenset(cpus)
+        if not cpus & self.cpus:
+            raise OSError(22, 'Invalid argument')
+        thread = self._thread(tid)
+        thread.affinity = cpus & self.cpus
+        thread.processor = min(thread.affinity)
+
+    def get_policy(self, tid):
+        self.counters.syscalls += 1
+        return self._thread(tid).policy
+
+    def set_policy(self, tid, policy):
+        self.counters.syscalls += 1
+        self._thread(tid).policy = policy
+
+    def get_nice(self, tid):
+        self.counters.syscalls += 1
+        return self._thread(tid).nice
+
+    def set_nice(self, tid, nice):
+        self.counters.syscalls += 1
+        self._thread(tid).nice = nice
+
+    def get_ioprio(self, tid):
+        self.counters.syscalls += 1
+        return self._thread(tid).ioprio
+
+    def set_ioprio(self, tid, ioprio):
+        self.counters.syscalls += 1
+        self._thread(tid).ioprio = ioprio
+
+    def run(self, command):
+        """Emulate the helper commands used by utils, counting a fork each."""
+        self.counters.forks += 1
+        name, args = command[0], command[1:]
+        if name == 'pgrep' and args[:1] == ['-f']:
+            try:
+                # pgrep reads the pattern as an ERE
+                pattern = compile_pattern(args[1])
+            except re.error as e:
+                return subprocess.CompletedProcess(command, 2, '', str(e))
+            pids = [str(pid) for pid, proc in self.procs.items()
+                    if pattern.search(proc.cmdline.rstrip(b'\0').replace(b'\0', b' ').decode())]
+            return subprocess.CompletedProcess(command, 0 if pids else 1, '\n'.join(pids), '')
+        if name == 'ps':
+            proc = self.procs.get(int(args[args.index('-p') + 1]))
+            tids = '\n'.join(str(tid) for tid in proc.threads) if proc else ''
+            return subprocess.CompletedProcess(command, 0 if proc else 1, tids, '')
+        if name == 'taskset':
+            from cpumask import CpuMask
+            try:
+                self.set_affinity(int(args[-1]), CpuMask.parse(args[-2]).cpus)
+            except (OSError, ValueError) as e:
+                return subprocess.CompletedProcess(command, 1, '', str(e))
+            return subprocess.CompletedProcess(command, 0, '', '')
+        raise FileNotFoundError(2, f'No such file or directory: {name!r}')
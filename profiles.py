@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# cpu-affinity-manager/profiles.py
+"""
+Named profiles: sets of saved rules, e.g. "gaming", "compiling" and
+"streaming", switched between in one step.
+
+    cpu-affinity-manager profile list
+    cpu-affinity-manager profile save NAME
+    cpu-affinity-manager profile switch NAME [--dry-run]
+    cpu-affinity-manager profile delete NAME
+"""
+import copy
+import json
+import os
+import sys
+
+if 'APP_DIR' in os.environ:
+    sys.path.append(os.environ['APP_DIR'])
+
+from cpumask import online_cpus
+from engine import Enforcer, read_identity, scan_processes
+from matcher import RuleMatcher
+from procfs import get_backend
+from settings import SettingsManager
+from utils import apply_mask_to_tids, write_atomic
+
+DEFAULT_PROFILE = 'default'
+
+
+class ProfileDiff:
+    """Rules added, removed and changed between two sets of rules."""
+    __slots__ = ('added', 'removed', 'changed')
+
+    def __init__(self, old, new):
+        self.added = sorted(new.keys() - old.keys())
+        self.removed = sorted(old.keys() - new.keys())
+        self.changed = sorted(name for name in old.keys() & new.keys() if old[name] != new[name])
+
+    @property
+    def rules(self):
+        """Names of all rules that differ."""
+        return set(self.added) | set(self.removed) | set(self.changed)
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def __str__(self):
+        return f"{len(self.added)} added, {len(self.removed)} removed, {len(self.changed)} changed"
+
+
+class SwitchResult:
+    """Outcome of ProfileManager.switch()."""
+    __slots__ = ('profile', 'diff', 'processes', 'threads', 'failed', 'rolled_back', 'error')
+
+    def __init__(self, profile, diff=None):
+        self.profile = profile
+        self.diff = diff
+        self.processes = 0      # Processes whose rule differs between the profiles
+        self.threads = 0        # Threads placed by the switch
+        self.failed = []        # (rule or TID, error message)
+        self.rolled_back = False
+        self.error = None
+
+    @property
+    def success(self):
+        return self.error is None and not self.failed
+
+    def __str__(self):
+        if self.error:
+            return f"Could not switch to profile '{self.profile}': {self.error}"
+        if self.rolled_back:
+            return (f"Switching to profile '{self.profile}' failed ({len(self.failed)} errors), "
+                    f"the previous profile was restored")
+        return (f"Switched to profile '{self.profile}' ({self.diff}): "
+                f"{self.threads} threads of {self.processes} processes placed")
+
+
+class ProfileManager:
+    """
+    Named sets of rules.
+
+    The rules of the active profile are the saved settings themselves
+    (process_settings.json), which the GUI, the daemon and the oneshot keep
+    reading as before; the other profiles are kept in profiles.json. Editing
+    settings edits the active profile.
+
+    switch() computes the difference between the active and the new
+    profile, re-places only the processes whose rule differs, in one pass
+    over a single /proc scan, and only then makes the new profile active.
+    If any of them cannot be placed, every thread touched goes back to the
+    mask it had before and the previous profile stays active.
+    """
+
+    def __init__(self, settings_manager=None):
+        self.settings_manager = settings_manager or SettingsManager()
+        self.profiles_file = self.settings_manager.profiles_file
+        self.active, self.profiles = self._load()
+
+    def _load(self):
+        try:
+            with open(self.profiles_file) as f:
+                data = json.load(f)
+            active = str(data['active'])
+            profiles = {name: rules for name, rules in data['profiles'].items() if isinstance(rules, dict)}
+            # The active profile's rules are the saved settings
+            profiles.pop(active, None)
+            return active, profiles
+        except FileNotFoundError:
+            return DEFAULT_PROFILE, {}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"Error loading profiles: {e}")
+            return DEFAULT_PROFILE, {}
+
+    def _save(self):
+        try:
+            write_atomic(self.profiles_file, json.dumps({'active': self.active, 'profiles': self.profiles},
+                                                        indent=4), fsync=True)
+            return True
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error saving profiles: {e}")
+            return False
+
+    def names(self):
+        """Names of all profiles, the active one included."""
+        return sorted(set(self.profiles) | {self.active})
+
+    def rules(self, name):
+        """Rules of a profile, or None if there is no such profile."""
+        if name == self.active:
+            return copy.deepcopy(self.settings_manager.settings)
+        rules = self.profiles.get(name)
+        return copy.deepcopy(rules) if rules is not None else None
+
+    def save_as(self, name):
+        """Store the current rules as a profile and make it the active one."""
+        if name != self.active:
+            self.profiles[self.active] = copy.deepcopy(self.settings_manager.settings)
+            # Its rules are the saved settings from now on
+            self.profiles.pop(name, None)
+            self.active = name
+        return self._save()
+
+    def delete(self, name):
+        """Delete a profile other than the active one."""
+        if name == self.active or name not in self.profiles:
+            return False
+        del self.profiles[name]
+        return self._save()
+
+    def diff(self, name):
+        """ProfileDiff between the active profile and another one, or None if it does not exist."""
+        rules = self.rules(name)
+        return ProfileDiff(self.settings_manager.settings, rules) if rules is not None else None
+
+    def switch(self, name, backend=None, quiet=True, dry_run=False):
+        """
+        Make another profile active and place the running processes accordingly.
+
+        Processes that matched no rule, or a rule that did not change, are not
+        touched; processes whose rule is gone go back to all online CPUs.
+        Descendants of processes of a rule with include_children count as
+        processes of that rule, as in the Enforcer.
+
+        Returns:
+            SwitchResult
+        """
+        new_rules = self.rules(name)
+        if new_rules is None:
+            result = SwitchResult(name)
+            result.error = "no such profile"
+            return result
+        old_rules = copy.deepcopy(self.settings_manager.settings)
+        diff = ProfileDiff(old_rules, new_rules)
+        result = SwitchResult(name, diff)
+        if name == self.active:
+            return result
+
+        backend = backend or get_backend()
+        old_matcher = RuleMatcher(list(old_rules.items()), quiet=quiet)
+        new_matcher = RuleMatcher(list(new_rules.items()), quiet=not dry_run)
+        changed_rules = diff.rules
+        old_names = {}
+        new_names = {}
+        for proc in scan_processes(backend):
+            old = old_matcher.match(proc.match_text)
+            new = new_matcher.match(proc.match_text)
+            old_names[proc.pid] = old[0] if old else None
+            new_names[proc.pid] = new[0] if new else None
+        if old_matcher.inheriting_rules or new_matcher.inheriting_rules:
+            children = children_index(old_names, backend)
+            old_names = inherit_rules(old_names, children, old_matcher.inheriting_rules)
+            new_names = inherit_rules(new_names, children, new_matcher.inheriting_rules)
+
+        enforce = {}    # pid -> name of its rule in the new profile
+        release = []
+        for pid, new_name in new_names.items():
+            if old_names[pid] == new_name and new_name not in changed_rules:
+                continue
+            if new_name is not None:
+                enforce[pid] = new_name
+            else:
+                release.append(pid)
+        result.processes = len(enforce) + len(release)
+        if dry_run:
+            return result
+
+        # Every thread's mask before the switch, for the rollback
+        original = {}
+        for pid in list(enforce) + release:
+            for tid in backend.list_tids(pid) or ():
+                try:
+                    original[int(tid)] = backend.get_affinity(int(tid))
+                except OSError:
+                    pass
+
+        try:
+            enforcer = Enforcer(new_matcher, quiet=quiet, backend=backend)
+            # Pinned, so inherited rules apply whatever the order of the PIDs
+            for pid, rule in enforce.items():
+                enforcer.pin(pid, rule)
+            for rule, (success, succeeded, _attempted) in enforcer.enforce_pids(list(enforce)).items():
+                result.threads += succeeded
+                if not success:
+                    result.failed.append((rule, "some threads could not be placed"))
+            everything = online_cpus()
+            for pid in release:
+                applied = apply_mask_to_tids(backend.list_tids(pid) or (), everything, pid=pid, backend=backend)
+                result.threads += applied.succeeded
+                result.failed.extend(applied.failed)
+        except Exception as e:
+            result.failed.append((None, str(e)))
+
+        if not result.failed:
+            # The settings first: until profiles.json names the new profile,
+            # putting the old rules back leaves both files as they were
+            previous, profiles = self.active, dict(self.profiles)
+            if self.settings_manager.replace_settings(new_rules):
+                # Keep the rules edited under the old profile
+                self.profiles[previous] = old_rules
+                self.profiles.pop(name, None)
+                self.active = name
+                if self._save():
+                    return result
+                self.active, self.profiles = previous, profiles
+            self.settings_manager.replace_settings(old_rules)
+            result.failed.append((None, "the profile could not be saved"))
+
+        for tid, cpus in original.items():
+            try:
+                backend.set_affinity(tid, cpus)
+            except OSError:
+                pass
+        result.rolled_back = True
+        return result
+
+
+def children_index(pids, backend):
+    """ppid -> [pid] of the given running processes."""
+    children = {}
+    for pid in pids:
+        identity = read_identity(pid, backend)
+        if identity is not None:
+            children.setdefault(identity[2], []).append(pid)
+    return children
+
+
+def inherit_rules(names, children, inheriting):
+    """
+    Give every descendant without a rule of its own the rule of its nearest
+    ancestor with include_children, as Enforcer._inherit() does.
+
+    Args:
+        names (dict): pid -> name of the rule it matches, or None
+        children (dict): ppid -> [pid]
+        inheriting (set): Names of the rules with include_children
+
+    Returns:
+        dict: pid -> name of its rule, matched or inherited
+    """
+    names = dict(names)
+    stack = [pid for pid, name in names.items() if name in inheriting]
+    visited = set(stack)
+    while stack:
+        parent = stack.pop()
+        for pid in children.get(parent, ()):
+            if pid in visited or pid not in names:
+                continue
+            visited.add(pid)
+            if names[pid] is None:
+                names[pid] = names[parent]
+                stack.append(pid)
+    return names
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='cpu-affinity-manager profile',
+                                     description="Manage and switch named sets of saved settings.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help="Show all profiles, marking the active one")
+    save_parser = commands.add_parser('save', help="Save the current settings as a profile and make it active")
+    save_parser.add_argument('name')
+    switch_parser = commands.add_parser('switch', help="Make a profile active and apply it to running processes")
+    switch_parser.add_argument('name')
+    switch_parser.add_argument('--dry-run', action='store_true', help="Only show what would change")
+    delete_parser = commands.add_parser('delete', help="Delete a profile other than the active one")
+    delete_parser.add_argument('name')
+    args = parser.parse_args(argv)
+
+    manager = ProfileManager()
+    if args.command == 'list':
+        for name in manager.names():
+            marker = '*' if name == manager.active else ' '
+            print(f"{marker} {name} ({len(manager.rules(name))} rules)")
+        return 0
+    if args.command == 'save':
+        return 0 if manager.save_as(args.name) else 1
+    if args.command == 'delete':
+        if not manager.delete(args.name):
+            print(f"Cannot delete profile {args.name!r}: it is active or does not exist", file=sys.stderr)
+            return 1
+        return 0
+
+    result = manager.switch(args.name, quiet=False, dry_run=args.dry_run)
+    if args.dry_run and result.error is None:
+        diff = result.diff
+        for label, names in (('added', diff.added), ('removed', diff.removed), ('changed', diff.changed)):
+            for rule in names:
+                print(f"{label:>8}  {rule}")
+        print(f"{result.processes} running processes would be re-placed")
+        return 0
+    for what, error in result.failed:
+        print(f"  {what}: {error}", file=sys.stderr)
+    print(result)
+    return 0 if result.success else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
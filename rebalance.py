@@ -0,0 +1,253 @@
+# cpu-affinity-manager/rebalance.py
+
+import sys
+import time
+from collections import deque
+
+from cpumask import CpuMask
+
+DEFAULT_HIGH = 0.90         # Mean load of the preferred CPUs that counts as overloaded
+DEFAULT_LOW = 0.60          # Load at which the preferred CPUs could take the work back
+DEFAULT_WINDOW = 5.0        # Seconds the load is averaged over before deciding
+DEFAULT_MIN_DWELL = 30.0    # Seconds a rule stays on a mask before it may switch again
+MAX_DECISIONS = 100         # Decisions kept in Rebalancer.decisions
+
+MODES = ('widen', 'shift')
+
+
+def parse_proc_stat(data):
+    """
+    Per-CPU (busy, total) jiffies from the contents of /proc/stat.
+
+    Returns:
+        dict: cpu -> (busy, total); idle and iowait count as not busy
+    """
+    if isinstance(data, bytes):
+        data = data.decode('ascii', 'replace')
+    times = {}
+    for line in data.splitlines():
+        if not line.startswith('cpu') or line[3:4] in ('', ' '):
+            continue
+        fields = line.split()
+        try:
+            # user nice system idle iowait irq softirq steal; guest time is part of user
+            values = [int(value) for value in fields[1:9]]
+            cpu = int(fields[0][3:])
+        except ValueError:
+            continue
+        total = sum(values)
+        idle = values[3] + (values[4] if len(values) > 4 else 0)
+        times[cpu] = (total - idle, total)
+    return times
+
+
+class CpuLoadSampler:
+    """Per-CPU utilization between consecutive reads of /proc/stat."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.previous = None
+
+    def sample(self):
+        """
+        Read /proc/stat once.
+
+        Returns:
+            dict: cpu -> busy fraction (0.0-1.0) since the previous sample,
+                  or None on the first call or if /proc/stat is unreadable
+        """
+        data = self.backend.read_system('stat')
+        if data is None:
+            return None
+        current = parse_proc_stat(data)
+        previous, self.previous = self.previous, current
+        if previous is None:
+            return None
+        load = {}
+        for cpu, (busy, total) in current.items():
+            if cpu not in previous:
+                continue
+            delta_total = total - previous[cpu][1]
+            if delta_total > 0:
+                load[cpu] = min(1.0, max(0.0, (busy - previous[cpu][0]) / delta_total))
+        return load
+
+
+class RebalanceConfig:
+    """
+    The 'rebalance' setting of a rule.
+
+        "rebalance": {"secondary_mask": "8-15,24-31", "mode": "widen",
+                      "high": 0.9, "low": 0.6, "window": 5, "min_dwell": 30}
+
+    While the rule's own CPUs average more than `high` load over `window`
+    seconds, its processes spill over: 'widen' adds the secondary CPUs to the
+    mask, 'shift' moves them to the secondary CPUs. They return once the
+    demand, measured relative to the preferred CPUs, drops below `low`. A rule
+    keeps each mask for at least `min_dwell` seconds.
+    """
+
+    def __init__(self, preferred, secondary, mode='widen', high=DEFAULT_HIGH, low=DEFAULT_LOW,
+                 window=DEFAULT_WINDOW, min_dwell=DEFAULT_MIN_DWELL):
+        self.preferred = preferred
+        self.secondary = secondary
+        self.mode = mode
+        self.high = high
+        self.low = low
+        self.window = window
+        self.min_dwell = min_dwell
+
+    @property
+    def spilled_mask(self):
+        return self.preferred | self.secondary if self.mode == 'widen' else self.secondary
+
+    @classmethod
+    def from_settings(cls, settings, quiet=True):
+        """Parse a rule's 'rebalance' setting, or return None if unset or invalid."""
+        config = settings.get('rebalance')
+        if not config:
+            return None
+        try:
+            preferred = CpuMask.parse(settings['cpu_mask'])
+            secondary = CpuMask.parse(config['secondary_mask'])
+            mode = config.get('mode', 'widen')
+            high = float(config.get('high', DEFAULT_HIGH))
+            low = float(config.get('low', DEFAULT_LOW))
+            window = float(config.get('window', DEFAULT_WINDOW))
+            min_dwell = float(config.get('min_dwell', DEFAULT_MIN_DWELL))
+        except (KeyError, TypeError, ValueError) as e:
+            if not quiet:
+                print(f"Ignoring invalid rebalance setting {config!r}: {e}")
+            return None
+        if (mode not in MODES or not 0 < low < high <= 1 or window <= 0 or min_dwell < 0
+                or not preferred.is_valid() or not secondary.is_valid() or secondary == preferred):
+            if not quiet:
+                print(f"Ignoring invalid rebalance setting {config!r}")
+            return None
+        return cls(preferred, secondary, mode, high, low, window, min_dwell)
+
+
+class RebalanceDecision:
+    """One switch of a rule between its preferred and spilled mask."""
+    __slots__ = ('rule', 'spilled', 'mask', 'load', 'time', 'wall_time')
+
+    def __init__(self, rule, spilled, mask, load, when):
+        self.rule = rule
+        self.spilled = spilled
+        self.mask = mask
+        self.load = load
+        self.time = when                # On the Rebalancer's clock
+        self.wall_time = time.time()
+
+    def as_dict(self):
+        return {
+            'rule': self.rule,
+            'spilled': self.spilled,
+            'cpus': self.mask.to_cpulist(),
+            'load': round(self.load, 3),
+            'time': self.wall_time,
+        }
+
+    def __str__(self):
+        if self.spilled:
+            return (f"Rebalance '{self.rule}': preferred CPUs at {self.load:.0%} load, "
+                    f"spilling over to CPUs {self.mask.to_cpulist()}")
+        return (f"Rebalance '{self.rule}': demand down to {self.load:.0%} of the preferred CPUs, "
+                f"returning to CPUs {self.mask.to_cpulist()}")
+
+
+class RuleBalance:
+    """Rebalancing state of one rule."""
+    __slots__ = ('config', 'spilled', 'since', 'samples')
+
+    def __init__(self, config, now):
+        self.config = config
+        self.spilled = False
+        self.since = now       # Start of the current state
+        self.samples = deque()  # (timestamp, demand)
+
+    @property
+    def mask(self):
+        return self.config.spilled_mask if self.spilled else self.config.preferred
+
+    def demand(self, load):
+        """Busy CPUs on the current mask, as a fraction of the preferred CPUs."""
+        busy = sum(load.get(cpu, 0.0) for cpu in self.mask)
+        return busy / len(self.config.preferred)
+
+    def update(self, load, now):
+        """Add one load sample. Returns the new demand if the rule should switch, else None."""
+        config = self.config
+        self.samples.append((now, self.demand(load)))
+        while self.samples and self.samples[0][0] <= now - config.window:
+            self.samples.popleft()
+
+        # Hysteresis in time: a full window of history and the minimum dwell
+        if now - self.since < max(config.window, config.min_dwell):
+            return None
+        mean = sum(demand for _time, demand in self.samples) / len(self.samples)
+        if (not self.spilled and mean >= config.high) or (self.spilled and mean <= config.low):
+            return mean
+        return None
+
+
+class Rebalancer:
+    """
+    Load-aware mask selection for rules with a 'rebalance' setting.
+
+    update() samples /proc/stat once for all rules and moves a rule between
+    its preferred mask and its spilled mask (see RebalanceConfig). Rules
+    start on their preferred mask again whenever none of their processes
+    are running. Every switch is logged and kept in decisions.
+    """
+
+    def __init__(self, backend, clock=time.monotonic):
+        self.sampler = CpuLoadSampler(backend)
+        self.clock = clock
+        self.states = {}    # process_name -> RuleBalance
+        self.decisions = deque(maxlen=MAX_DECISIONS)
+
+    def mask_for(self, process_name):
+        """The mask a rule should use now, or None if it is not being rebalanced."""
+        state = self.states.get(process_name)
+        return state.mask if state is not None else None
+
+    def update(self, configs, now=None):
+        """
+        Sample the CPU load and re-evaluate the rules.
+
+        Args:
+            configs (dict): process_name -> RebalanceConfig of the rules with
+                            running processes
+            now (float): Timestamp of the sample, clock() if None
+
+        Returns:
+            list: RebalanceDecision for each rule whose mask changed
+        """
+        now = self.clock() if now is None else now
+        for process_name in self.states.keys() - configs.keys():
+            del self.states[process_name]
+        for process_name, config in configs.items():
+            state = self.states.get(process_name)
+            if state is None or state.config is not config:
+                self.states[process_name] = RuleBalance(config, now)
+
+        load = self.sampler.sample()
+        if load is None:
+            return []
+
+        decisions = []
+        for process_name, state in self.states.items():
+            demand = state.update(load, now)
+            if demand is None:
+                continue
+            state.spilled = not state.spilled
+            state.since = now
+            state.samples.clear()
+            decision = RebalanceDecision(process_name, state.spilled, state.mask, demand, now)
+            decisions.append(decision)
+            self.decisions.append(decision)
+            # Always logged, to stderr as stdout of the service is discarded;
+            # switches are rare and explain sudden mask changes
+            print(decision, file=sys.stderr)
+        return decisions
@@ -0,0 +1,105 @@
+# cpu-affinity-manager/rulecache.py
+#
+# Imported by the oneshot fast path of auto_apply.py before anything else,
+# so this module must only use builtins, os and marshal.
+
+import marshal
+import os
+
+CACHE_VERSION = 2        # 2: patterns are stored translated to Python syntax
+CACHE_NAME = 'rules.cache'
+
+# A pattern without these characters matches like a plain substring
+_REGEX_CHARS = frozenset('.^$*+?{}[]\\|()')
+
+
+def settings_signature(settings_file):
+    """(inode, mtime, size) of the settings file, or None if it is missing."""
+    try:
+        st = os.stat(settings_file)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def write_cache(cache_file, signature, patterns):
+    """
+    Store the patterns of the valid rules for the settings file version
+    identified by signature.
+
+    Args:
+        cache_file (str): Path of the cache
+        signature (tuple): settings_signature() the patterns were compiled from
+        patterns (list): Rule patterns in precedence order, in Python re syntax
+    """
+    literals = [p for p in patterns if not _REGEX_CHARS.intersection(p)]
+    regexes = [p for p in patterns if _REGEX_CHARS.intersection(p)]
+    data = marshal.dumps((CACHE_VERSION, tuple(signature), literals, regexes))
+    tmp_path = f'{cache_file}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, cache_file)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+def load_cache(cache_file, signature):
+    """Return (literals, regexes) if the cache matches signature, else None."""
+    if signature is None:
+        return None
+    try:
+        with open(cache_file, 'rb') as f:
+            version, cached_signature, literals, regexes = marshal.loads(f.read())
+    except (OSError, ValueError, EOFError, TypeError):
+        return None
+    if version != CACHE_VERSION or cached_signature != tuple(signature):
+        return None
+    return literals, regexes
+
+
+def any_process_matches(literals, regexes, proc_root='/proc'):
+    """
+    True if some process matches a cached rule, using `pgrep -f` semantics.
+
+    Literal patterns are plain substring checks; `re` is only imported if
+    some rule really is a regular expression.
+    """
+    if not literals and not regexes:
+        return False
+    compiled = []
+    if regexes:
+        import re
+        try:
+            compiled = [re.compile(pattern) for pattern in regexes]
+        except re.error:
+            # Let the full path decide what the patterns mean
+            return True
+
+    own_pid = str(os.getpid())
+    try:
+        entries = os.listdir(proc_root)
+    except OSError:
+        return True
+    for entry in entries:
+        if not entry.isdigit() or entry == own_pid:
+            continue
+        try:
+            with open(f'{proc_root}/{entry}/cmdline', 'rb') as f:
+                raw = f.read()
+            if not raw.strip(b'\0'):
+                with open(f'{proc_root}/{entry}/comm', 'rb') as f:
+                    raw = f.read().rstrip(b'\n')
+        except OSError:
+            continue
+        text = raw.rstrip(b'\0').replace(b'\0', b' ').decode('utf-8', 'replace')
+        for literal in literals:
+            if literal in text:
+                return True
+        for regex in compiled:
+            if regex.search(text):
+                return True
+    return False
@@ -0,0 +1,159 @@
+# cpu-affinity-manager/schedattrs.py
+
+import ctypes
+import os
+import platform
+
+# Only the policies of the fair scheduler: real-time policies can starve the
+# rest of the system and are left to dedicated tools
+POLICIES = {
+    'other': os.SCHED_OTHER,
+    'batch': os.SCHED_BATCH,
+    'idle': os.SCHED_IDLE,
+}
+
+IOPRIO_CLASSES = {'none': 0, 'realtime': 1, 'best-effort': 2, 'idle': 3}
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_WHO_PROCESS = 1      # With a TID, ioprio_get/ioprio_set act on that thread
+
+# (ioprio_set, ioprio_get) syscall numbers; glibc has no wrappers
+_IOPRIO_SYSCALLS = {
+    'x86_64': (251, 252),
+    'i386': (289, 290),
+    'i686': (289, 290),
+    'aarch64': (30, 31),
+    'riscv64': (30, 31),
+    'armv7l': (314, 315),
+    'ppc64le': (273, 274),
+}
+
+
+def ioprio_value(ioprio_class, level=0):
+    """
+    Encode an I/O priority class name and level (0-7) as the kernel does.
+    The 'none' and 'idle' classes have no levels; ioprio_set rejects any
+    but 0 for them.
+    """
+    return IOPRIO_CLASSES[ioprio_class] << IOPRIO_CLASS_SHIFT | (level if ioprio_class not in ('none', 'idle') else 0)
+
+
+def ioprio_name(value):
+    """'class/level' text of an encoded I/O priority."""
+    names = {number: name for name, number in IOPRIO_CLASSES.items()}
+    ioprio_class = names.get(value >> IOPRIO_CLASS_SHIFT, '?')
+    if ioprio_class in ('none', 'idle'):
+        return ioprio_class
+    return f"{ioprio_class}/{value & ((1 << IOPRIO_CLASS_SHIFT) - 1)}"
+
+
+_libc = None
+
+
+def _ioprio_syscall(index, *args):
+    global _libc
+    numbers = _IOPRIO_SYSCALLS.get(platform.machine())
+    if numbers is None:
+        raise OSError(38, f"ioprio is not supported on {platform.machine()}")
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+    result = _libc.syscall(numbers[index], *args)
+    if result < 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+    return result
+
+
+def ioprio_get(tid):
+    return _ioprio_syscall(1, IOPRIO_WHO_PROCESS, int(tid))
+
+
+def ioprio_set(tid, value):
+    _ioprio_syscall(0, IOPRIO_WHO_PROCESS, int(tid), int(value))
+
+
+class SchedAttrs:
+    """
+    Scheduling attributes a rule sets on every thread of its processes:
+
+        "sched_policy": "batch", "nice": 10, "ioprio": {"class": "idle"}
+
+    sched_policy is one of 'other', 'batch' or 'idle'; nice is -20 to 19;
+    ioprio has a 'class' ('realtime', 'best-effort', 'idle' or 'none') and,
+    except for idle and none, a 'level' from 0 (highest) to 7. Each field is optional
+    and attributes that are not set are left alone. Lowering nice below the
+    current value or using the realtime I/O class needs CAP_SYS_NICE or
+    CAP_SYS_ADMIN.
+    """
+    __slots__ = ('policy', 'nice', 'ioprio')
+
+    def __init__(self, policy=None, nice=None, ioprio=None):
+        self.policy = policy    # os.SCHED_* constant
+        self.nice = nice
+        self.ioprio = ioprio    # Encoded as by ioprio_value()
+
+    @classmethod
+    def from_settings(cls, settings, quiet=True):
+        """Parse a rule's scheduling attributes, or return None if none is set or they are invalid."""
+        policy = settings.get('sched_policy')
+        nice = settings.get('nice')
+        ioprio = settings.get('ioprio')
+        if policy is None and nice is None and ioprio is None:
+            return None
+        try:
+            if policy is not None:
+                policy = POLICIES[policy]
+            if nice is not None:
+                nice = int(nice)
+                if not -20 <= nice <= 19:
+                    raise ValueError(f"nice {nice} is not between -20 and 19")
+            if ioprio is not None:
+                ioprio_class = ioprio['class']
+                level = int(ioprio.get('level', 4))
+                if ioprio_class not in IOPRIO_CLASSES or not 0 <= level <= 7:
+                    raise ValueError(f"unknown I/O class or level {ioprio!r}")
+                ioprio = ioprio_value(ioprio_class, level)
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            if not quiet:
+                print(f"Ignoring invalid scheduling settings {settings!r}: {e}")
+            return None
+        return cls(policy, nice, ioprio)
+
+    def apply(self, tid, backend):
+        """
+        Set the attributes on one thread, skipping those already set.
+
+        Returns:
+            bool: True if anything was changed
+
+        Raises:
+            OSError: if an attribute could not be read or set
+        """
+        changed = False
+        if self.policy is not None and backend.get_policy(tid) != self.policy:
+            backend.set_policy(tid, self.policy)
+            changed = True
+        if self.nice is not None and backend.get_nice(tid) != self.nice:
+            backend.set_nice(tid, self.nice)
+            changed = True
+        if self.ioprio is not None and backend.get_ioprio(tid) != self.ioprio:
+            backend.set_ioprio(tid, self.ioprio)
+            changed = True
+        return changed
+
+    def __eq__(self, other):
+        return (isinstance(other, SchedAttrs) and self.policy == other.policy
+                and self.nice == other.nice and self.ioprio == other.ioprio)
+
+    def __hash__(self):
+        return hash((self.policy, self.nice, self.ioprio))
+
+    def __str__(self):
+        names = {number: name for name, number in POLICIES.items()}
+        parts = []
+        if self.policy is not None:
+            parts.append(f"policy {names[self.policy]}")
+        if self.nice is not None:
+            parts.append(f"nice {self.nice}")
+        if self.ioprio is not None:
+            parts.append(f"I/O {ioprio_name(self.ioprio)}")
+        return ', '.join(parts)
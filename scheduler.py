@@ -0,0 +1,207 @@
+# cpu-affinity-manager/scheduler.py
+
+import threading
+import time
+
+TICK = 0.1              # Seconds per timer wheel slot
+WHEEL_SLOTS = 512       # Slots per revolution, about 51 seconds at TICK
+MAX_WAVES = 16          # Upper bound for the entries of 'reapply_waves'
+DEFAULT_WAVES = (0.0,)  # Apply once, when the rule's initial delay is up
+
+
+def reapply_waves(settings, quiet=True):
+    """
+    Offsets in seconds of a rule's re-apply waves, as a sorted tuple.
+
+    The 'reapply_waves' setting lists when to apply the rule again, counted
+    from the first apply, to catch threads a program starts later on:
+
+        "reapply_waves": [0, 5, 20, 60]
+
+    Returns DEFAULT_WAVES if the setting is missing or invalid.
+    """
+    waves = settings.get('reapply_waves')
+    if waves is None:
+        return DEFAULT_WAVES
+    try:
+        offsets = sorted({float(offset) for offset in waves})
+    except (TypeError, ValueError):
+        offsets = None
+    if not offsets or offsets[0] < 0 or len(offsets) > MAX_WAVES:
+        if not quiet:
+            print(f"Ignoring invalid reapply_waves setting {waves!r}")
+        return DEFAULT_WAVES
+    return tuple(offsets)
+
+
+class Timer:
+    """A job scheduled on a TimerWheel."""
+    __slots__ = ('deadline', 'tick', 'callback', 'args', 'cancelled')
+
+    def __init__(self, deadline, tick, callback, args):
+        self.deadline = deadline
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel holding any number of deferred jobs.
+
+    Timers are hashed into WHEEL_SLOTS buckets by their expiry tick, so
+    scheduling and cancelling cost O(1) and advance() only looks at the
+    buckets of the ticks that passed. Timers more than one revolution away
+    stay in their bucket until their tick comes round.
+
+    The wheel does not run anything by itself: the owner calls advance()
+    when next_deadline() is reached, from its own loop (see daemon.py) or
+    from a DeferredScheduler thread.
+    """
+
+    def __init__(self, tick=TICK, slots=WHEEL_SLOTS, clock=time.monotonic):
+        self.tick = tick
+        self.clock = clock
+        self.origin = clock()
+        self.current = 0    # Last tick advance() processed
+        self.slots = [[] for _ in range(slots)]
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _tick_of(self, when):
+        # Round up, a timer must never fire early
+        return max(self.current + 1, -int(-(when - self.origin) // self.tick))
+
+    def schedule(self, delay, callback, *args):
+        """Run callback(*args) from advance() once delay seconds passed. Returns the Timer."""
+        deadline = self.clock() + max(0.0, delay)
+        tick = self._tick_of(deadline)
+        timer = Timer(deadline, tick, callback, args)
+        self.slots[tick % len(self.slots)].append(timer)
+        self.count += 1
+        return timer
+
+    def cancel(self, timer):
+        """Cancel a pending timer. Returns False if it already ran or was cancelled."""
+        if timer.cancelled or timer.callback is None:
+            return False
+        timer.cancelled = True
+        slot = self.slots[timer.tick % len(self.slots)]
+        # Not in its slot if pop_due() returned it and it is about to run
+        if timer in slot:
+            slot.remove(timer)
+            self.count -= 1
+        return True
+
+    def next_deadline(self):
+        """Monotonic time of the earliest pending timer, or None if there is none."""
+        if not self.count:
+            return None
+        size = len(self.slots)
+        for offset in range(1, size + 1):
+            tick = self.current + offset
+            for timer in self.slots[tick % size]:
+                if timer.tick == tick:
+                    return self.origin + tick * self.tick
+        # Everything is more than one revolution away
+        return self.origin + min(timer.tick for slot in self.slots for timer in slot) * self.tick
+
+    def pop_due(self, now=None):
+        """Remove and return the timers due by now, in deadline order."""
+        now = self.clock() if now is None else now
+        target = int((now - self.origin) // self.tick)
+        if self.origin + (target + 1) * self.tick <= now:
+            # Rounding; next_deadline() computes the same expression
+            target += 1
+        if target <= self.current or not self.count:
+            self.current = max(self.current, target)
+            return []
+
+        size = len(self.slots)
+        due = []
+        # After a long gap every bucket is visited once, not once per tick
+        for tick in range(self.current + 1, min(target, self.current + size) + 1):
+            slot = self.slots[tick % size]
+            if not slot:
+                continue
+            keep = [timer for timer in slot if timer.tick > target]
+            if len(keep) != len(slot):
+                due.extend(timer for timer in slot if timer.tick <= target)
+                slot[:] = keep
+        self.current = target
+        self.count -= len(due)
+        due.sort(key=lambda timer: timer.deadline)
+        return due
+
+    def advance(self, now=None):
+        """Run every timer that is due by now, in deadline order. Returns how many ran."""
+        due = self.pop_due(now)
+        for timer in due:
+            run_timer(timer)
+        return len(due)
+
+
+def run_timer(timer):
+    """Run a timer returned by TimerWheel.pop_due(), unless it was cancelled since."""
+    if timer.cancelled:
+        return
+    callback, args = timer.callback, timer.args
+    timer.callback = timer.args = None
+    try:
+        callback(*args)
+    except Exception as e:
+        print(f"Error in scheduled job {callback!r}: {e}")
+
+
+class DeferredScheduler:
+    """
+    A TimerWheel driven by one background thread.
+
+    Jobs run on that thread, one after another, so any number of delayed
+    applies share it instead of each sleeping in a thread of its own.
+    schedule() and cancel() may be called from any thread.
+    """
+
+    def __init__(self, tick=TICK):
+        self.wheel = TimerWheel(tick)
+        self._lock = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def schedule(self, delay, callback, *args):
+        with self._lock:
+            if self._closed:
+                return None
+            timer = self.wheel.schedule(delay, callback, *args)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='deferred-scheduler', daemon=True)
+                self._thread.start()
+            self._lock.notify()
+            return timer
+
+    def cancel(self, timer):
+        with self._lock:
+            return self.wheel.cancel(timer)
+
+    def close(self):
+        """Drop all pending jobs and stop the thread."""
+        with self._lock:
+            self._closed = True
+            self._lock.notify()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                due = []
+                while not due and not self._closed:
+                    due = self.wheel.pop_due()
+                    if not due:
+                        deadline = self.wheel.next_deadline()
+                        self._lock.wait(None if deadline is None else deadline - self.wheel.clock())
+                if self._closed:
+                    return
+            for timer in due:
+                run_timer(timer)
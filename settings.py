@@ -1,40 +1,128 @@
+import ctypes
 import json
+import os
+import struct
 from pathlib import Path
 
+from ere import pattern_error
+from irq import STATE_NAME as IRQ_STATE_NAME
+from matcher import RuleMatcher
+from rulecache import CACHE_NAME, write_cache
+from utils import write_atomic
+
+# inotify(7) event bits
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+_EVENT_HEADER = struct.Struct('iIII')   # wd, mask, cookie, len
+
 class SettingsManager:
+    """
+    Saved per-process settings, plus their compiled RuleMatcher.
+
+    The file is always replaced atomically, so a reader never sees it half
+    written. Long-running readers call reload_if_changed(), which only
+    re-parses the file when its inode, mtime or size changed and keeps the
+    previous settings if the new file cannot be parsed.
+    """
+
     def __init__(self):
         self.config_dir = Path.home() / '.config' / 'cpu-affinity-manager'
         self.settings_file = self.config_dir / 'process_settings.json'
-        self.settings = self._load_settings()
+        # Written by the auto-apply service, see metrics.StatsWriter
+        self.stats_file = self.config_dir / 'stats.json'
+        # Rule patterns for the oneshot's fast path, see rulecache.py
+        self.rule_cache_file = self.config_dir / CACHE_NAME
+        # Original affinity of steered interrupts, see irq.IrqSteering
+        self.irq_state_file = self.config_dir / IRQ_STATE_NAME
+        # Named sets of rules besides the active one, see profiles.ProfileManager
+        self.profiles_file = self.config_dir / 'profiles.json'
+        self._signature = self._file_signature()
+        self._matcher = None
+        self.settings = self._load_settings() or {}
+
+    def _file_signature(self):
+        # An atomic replace changes the inode even within one mtime tick
+        try:
+            st = self.settings_file.stat()
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def reload_if_changed(self):
+        """Reload settings if the file changed on disk. Returns True if reloaded."""
+        signature = self._file_signature()
+        if signature == self._signature:
+            return False
+        if signature is None:
+            settings = {}
+        else:
+            settings = self._load_settings()
+            if settings is None:
+                # Keep enforcing the last good settings, retry on the next check
+                return False
+        self._signature = signature
+        self.settings = settings
+        self._matcher = None
+        return True
+
+    def watch(self):
+        """Return an opened SettingsWatcher for the settings file, or None."""
+        watcher = SettingsWatcher(self.settings_file)
+        return watcher if watcher.open() else None
 
     def _load_settings(self):
-        """Load settings from the JSON file."""
+        """Load and validate settings from the JSON file. Returns None if it is unreadable."""
         if not self.settings_file.exists():
             return {}
 
         try:
             with open(self.settings_file, 'r') as f:
-                return json.load(f)
+                data = json.load(f)
         except (json.JSONDecodeError, IOError) as e:
             print(f"Error loading settings: {e}")
-            return {}
+            return None
+
+        if not isinstance(data, dict):
+            print(f"Error loading settings: expected an object, got {type(data).__name__}")
+            return None
+
+        settings = {}
+        for process_name, process_settings in data.items():
+            if not isinstance(process_settings, dict):
+                print(f"Ignoring invalid settings for '{process_name}': {process_settings!r}")
+                continue
+            settings[process_name] = process_settings
+        return settings
 
     def _save_settings(self):
         """Save settings to the JSON file."""
+        # Rules changed in memory, the matcher has to be rebuilt either way
+        self._matcher = None
         try:
-            self.config_dir.mkdir(parents=True, exist_ok=True)
-            with open(self.settings_file, 'w') as f:
-                json.dump(self.settings, f, indent=4)
+            write_atomic(self.settings_file, json.dumps(self.settings, indent=4), fsync=True)
+            self._signature = self._file_signature()
+            self.update_rule_cache()
             return True
-        except IOError as e:
+        except (IOError, TypeError, ValueError) as e:
             print(f"Error saving settings: {e}")
             return False
 
     def save_process_settings(self, process_name, settings):
-        """Save settings for a specific process."""
+        """Save settings for a specific process. Returns False if its pattern is not a valid ERE."""
+        error = pattern_error(process_name)
+        if error is not None:
+            print(f"Invalid process pattern '{process_name}': {error}")
+            return False
         self.settings[process_name] = settings
         return self._save_settings()
 
+    def replace_settings(self, settings):
+        """Replace all saved settings at once, e.g. when switching profiles."""
+        self.settings = dict(settings)
+        return self._save_settings()
+
     def get_process_settings(self, process_name):
         """Get settings for a specific process."""
         return self.settings.get(process_name)
@@ -43,9 +131,93 @@ class SettingsManager:
         """Get a list of all saved process names."""
         return list(self.settings.keys())
 
+    def get_all_rules(self):
+        """Get (process name, settings) pairs for all saved processes, in saved order."""
+        return list(self.settings.items())
+
+    def get_matcher(self, quiet=True):
+        """Get a RuleMatcher for all saved rules, rebuilt only when settings change."""
+        if self._matcher is None:
+            self._matcher = RuleMatcher(self.get_all_rules(), quiet=quiet)
+        return self._matcher
+
+    def update_rule_cache(self):
+        """Write the patterns of the valid rules for the current settings file."""
+        if self._signature is not None:
+            # Translated from ERE, the fast path matches them with re
+            patterns = [pattern.pattern for _name, pattern, _settings in self.get_matcher().rules]
+            write_cache(self.rule_cache_file, self._signature, patterns)
+
     def delete_process_settings(self, process_name):
         """Delete settings for a specific process."""
         if process_name in self.settings:
             del self.settings[process_name]
             return self._save_settings()
-        return False 
\ No newline at end of file
+        return False
+
+
+class SettingsWatcher:
+    """
+    inotify watch on the settings directory.
+
+    The directory is watched rather than the file, because atomic saves
+    replace the file. fileno() can be passed to select(); read_changed()
+    tells whether any pending event concerned the settings file.
+    """
+
+    def __init__(self, settings_file):
+        self.settings_file = Path(settings_file)
+        self.fd = None
+
+    def open(self):
+        """Start watching. Returns False if inotify is not available."""
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return False
+        if fd < 0:
+            return False
+
+        directory = self.settings_file.parent
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            os.close(fd)
+            return False
+        wd = libc.inotify_add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE)
+        if wd < 0:
+            os.close(fd)
+            return False
+        self.fd = fd
+        return True
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def fileno(self):
+        return self.fd
+
+    def read_changed(self):
+        """Drain pending events. Returns True if the settings file may have changed."""
+        name = os.fsencode(self.settings_file.name)
+        changed = False
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return changed
+            except OSError:
+                return True
+            if not data:
+                return changed
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                _wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                event_name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if mask & IN_Q_OVERFLOW or event_name == name:
+                    changed = True
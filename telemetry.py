@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# cpu-affinity-manager/telemetry.py
+"""
+Placement telemetry: where the threads of matched processes actually run.
+
+    cpu-affinity-manager telemetry <process name> [--interval 1] [--count 10]
+"""
+import os
+import re
+import sys
+import time
+from collections import deque
+
+if 'APP_DIR' in os.environ:
+    sys.path.append(os.environ['APP_DIR'])
+
+from cpumask import CpuMask
+from ere import compile_pattern
+from matcher import ThreadRules
+from preview import ProcessSnapshot
+from procfs import get_backend
+from utils import get_descendants
+
+INTERVAL = 1.0          # Seconds between samples of the CLI
+HISTORY = 60            # Intervals kept for the summary
+SCAN_MAX_AGE = 5.0      # Seconds the list of matching processes is reused
+
+
+class ThreadCounters:
+    """Scheduler counters of one thread at one point in time."""
+    __slots__ = ('name', 'processor', 'run_ns', 'wait_ns', 'migrations')
+
+    def __init__(self, name, processor, run_ns, wait_ns, migrations):
+        self.name = name
+        self.processor = processor
+        self.run_ns = run_ns
+        self.wait_ns = wait_ns
+        self.migrations = migrations    # None without /proc/<pid>/task/<tid>/sched
+
+
+def read_thread_counters(pid, tid, backend=None):
+    """
+    Read a thread's last CPU, run and runqueue wait time and migration count.
+
+    The last CPU is field 39 of task/<tid>/stat, the times come from
+    task/<tid>/schedstat and the migrations from se.nr_migrations in
+    task/<tid>/sched, which needs a kernel with CONFIG_SCHED_DEBUG.
+
+    Returns:
+        ThreadCounters, or None if the thread is gone
+    """
+    backend = backend or get_backend()
+    stat = backend.read(pid, f'task/{tid}/stat')
+    if not stat:
+        return None
+    head, _sep, tail = stat.rpartition(b')')
+    try:
+        processor = int(tail.split()[36])
+    except (IndexError, ValueError):
+        return None
+    name = head.partition(b'(')[2].decode('utf-8', 'replace')
+
+    run_ns = wait_ns = 0
+    schedstat = backend.read(pid, f'task/{tid}/schedstat')
+    if schedstat:
+        try:
+            run_ns, wait_ns = (int(value) for value in schedstat.split()[:2])
+        except ValueError:
+            pass
+
+    migrations = None
+    sched = backend.read(pid, f'task/{tid}/sched')
+    if sched:
+        for line in sched.splitlines():
+            if line.startswith(b'se.nr_migrations'):
+                try:
+                    migrations = int(line.rpartition(b':')[2])
+                except ValueError:
+                    pass
+                break
+    return ThreadCounters(name, processor, run_ns, wait_ns, migrations)
+
+
+def intended_masks(settings):
+    """
+    A function returning the CPUs a thread of a rule is meant to run on,
+    given its name: its thread rule's mask, both hot-thread masks, or the
+    rule's cpu_mask.
+    """
+    mask = CpuMask.parse(settings['cpu_mask'])
+    hot = settings.get('hot_threads')
+    if hot:
+        try:
+            mask = CpuMask.parse(hot['fast_mask']) | CpuMask.parse(hot.get('bulk_mask') or settings['cpu_mask'])
+        except (KeyError, TypeError, ValueError):
+            pass
+    thread_rules = ThreadRules.from_settings(settings)
+    if thread_rules is None:
+        return lambda _name: mask
+    if hot:
+        return lambda name: thread_rules.match(name) or mask
+    return thread_rules.mask_for
+
+
+class PlacementInterval:
+    """Scheduler activity of a rule's threads during one or more intervals."""
+    __slots__ = ('time', 'elapsed', 'processes', 'threads', 'run_ns', 'on_mask_ns', 'wait_ns', 'migrations')
+
+    def __init__(self, when=0.0, elapsed=0.0):
+        self.time = when
+        self.elapsed = elapsed
+        self.processes = 0
+        self.threads = 0
+        self.run_ns = 0
+        self.on_mask_ns = 0
+        self.wait_ns = 0
+        self.migrations = 0
+
+    @property
+    def on_mask_share(self):
+        """Share of the run time spent on the intended CPUs, None if nothing ran."""
+        return self.on_mask_ns / self.run_ns if self.run_ns else None
+
+    @property
+    def wait_share(self):
+        """Share of the runnable time spent waiting in a runqueue, None if nothing ran."""
+        total = self.run_ns + self.wait_ns
+        return self.wait_ns / total if total else None
+
+    @property
+    def migration_rate(self):
+        """Migrations per second."""
+        return self.migrations / self.elapsed if self.elapsed else 0.0
+
+    def add(self, other):
+        self.elapsed += other.elapsed
+        self.processes = max(self.processes, other.processes)
+        self.threads = max(self.threads, other.threads)
+        self.run_ns += other.run_ns
+        self.on_mask_ns += other.on_mask_ns
+        self.wait_ns += other.wait_ns
+        self.migrations += other.migrations
+        return self
+
+    def as_dict(self):
+        return {
+            'time': self.time,
+            'elapsed': self.elapsed,
+            'processes': self.processes,
+            'threads': self.threads,
+            'on_mask_share': self.on_mask_share,
+            'wait_share': self.wait_share,
+            'migrations_per_second': self.migration_rate,
+        }
+
+    def __str__(self):
+        on_mask = f"{self.on_mask_share:6.1%}" if self.on_mask_share is not None else "     -"
+        wait = f"{self.wait_share:6.1%}" if self.wait_share is not None else "     -"
+        return (f"{self.processes} processes, {self.threads} threads: on mask {on_mask}, "
+                f"runqueue wait {wait}, {self.migration_rate:.1f} migrations/s")
+
+
+class PlacementMonitor:
+    """
+    Samples the threads of the processes matching a rule and tells how much
+    of their run time was spent on the rule's intended CPUs, how long they
+    waited in runqueues and how often they migrated.
+
+    Run time between two samples is attributed to the CPU the thread was last
+    seen on, so the on-mask share is an estimate that gets better with
+    shorter intervals. Without se.nr_migrations, a change of the last CPU
+    between samples counts as one migration (a lower bound).
+    """
+
+    def __init__(self, process_name, settings, backend=None, history=HISTORY):
+        self.process_name = process_name
+        self.regex = compile_pattern(process_name)
+        self.intended = intended_masks(settings)
+        self.include_children = settings.get('include_children') is True
+        self.backend = backend or get_backend()
+        self.snapshot = ProcessSnapshot(max_age=SCAN_MAX_AGE, backend=self.backend)
+        self.history = deque(maxlen=history)
+        self._previous = {}     # tid -> ThreadCounters
+        self._sampled_at = None
+
+    def sample(self, now=None):
+        """
+        Take one sample.
+
+        Returns:
+            PlacementInterval since the previous sample, or None for the first
+        """
+        now = time.monotonic() if now is None else now
+        own_pid = self.backend.own_pid()
+        pids = [proc.pid for proc in self.snapshot.get()
+                if proc.pid != own_pid and self.regex.search(proc.match_text)]
+        if self.include_children and pids:
+            pids += [int(pid) for pid in get_descendants(pids, self.backend) if int(pid) not in pids]
+
+        interval = PlacementInterval(now, now - self._sampled_at if self._sampled_at is not None else 0.0)
+        current = {}
+        for pid in pids:
+            tids = self.backend.list_tids(pid)
+            if tids is None:
+                continue
+            interval.processes += 1
+            for tid in tids:
+                counters = read_thread_counters(pid, tid, self.backend)
+                if counters is None:
+                    continue
+                current[tid] = counters
+                previous = self._previous.get(tid)
+                if previous is None:
+                    continue
+                interval.threads += 1
+                ran = max(0, counters.run_ns - previous.run_ns)
+                interval.run_ns += ran
+                interval.wait_ns += max(0, counters.wait_ns - previous.wait_ns)
+                if counters.processor in self.intended(counters.name):
+                    interval.on_mask_ns += ran
+                if counters.migrations is not None and previous.migrations is not None:
+                    interval.migrations += max(0, counters.migrations - previous.migrations)
+                elif counters.processor != previous.processor:
+                    interval.migrations += 1
+
+        first = self._sampled_at is None
+        self._previous = current
+        self._sampled_at = now
+        if first:
+            return None
+        self.history.append(interval)
+        return interval
+
+    def summary(self):
+        """All intervals in the history combined into one PlacementInterval."""
+        total = PlacementInterval(self.history[-1].time if self.history else 0.0)
+        for interval in self.history:
+            total.add(interval)
+        return total
+
+
+def main(argv=None):
+    import argparse
+    import json
+
+    from settings import SettingsManager
+
+    parser = argparse.ArgumentParser(
+        prog='cpu-affinity-manager telemetry',
+        description="Show how much of their run time the processes of a saved setting "
+                    "spend on its CPUs, how long they wait for a CPU and how often they migrate.")
+    parser.add_argument('rule', metavar='NAME', help="Saved process name")
+    parser.add_argument('--interval', type=float, default=INTERVAL, help="Seconds between samples")
+    parser.add_argument('--count', type=int, default=0, help="Number of samples (default: until Ctrl+C)")
+    parser.add_argument('--mask', help="Intended CPU mask instead of the saved setting's")
+    parser.add_argument('--json', action='store_true', help="Print one JSON object per sample")
+    args = parser.parse_args(argv)
+
+    settings = SettingsManager().get_process_settings(args.rule)
+    if args.mask:
+        # Only the mask is replaced; include_children still decides which processes are sampled
+        settings = dict(settings or {}, cpu_mask=args.mask)
+    elif settings is None:
+        print(f"No saved setting named {args.rule!r}, use --mask to give the intended CPUs", file=sys.stderr)
+        return 1
+    try:
+        monitor = PlacementMonitor(args.rule, settings)
+    except (re.error, KeyError, ValueError) as e:
+        print(f"Invalid setting {args.rule!r}: {e}", file=sys.stderr)
+        return 1
+
+    samples = 0
+    monitor.sample()
+    try:
+        while not args.count or samples < args.count:
+            time.sleep(args.interval)
+            interval = monitor.sample()
+            samples += 1
+            if args.json:
+                print(json.dumps(interval.as_dict()), flush=True)
+            else:
+                print(f"{time.strftime('%X')}  {interval}", flush=True)
+    except KeyboardInterrupt:
+        pass
+
+    if not args.json and monitor.history:
+        summary = monitor.summary()
+        print(f"Summary over {summary.elapsed:.0f} s: {summary}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
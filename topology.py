@@ -0,0 +1,196 @@
+# cpu-affinity-manager/topology.py
+
+import os
+import re
+
+from cpumask import CpuMask
+
+SYSFS_ROOT = '/sys'
+
+
+class CacheGroup:
+    """CPUs sharing one last-level (L3) cache, i.e. one CCD/CCX on AMD."""
+    __slots__ = ('index', 'cpus', 'size_kb')
+
+    def __init__(self, index, cpus, size_kb):
+        self.index = index
+        self.cpus = cpus
+        self.size_kb = size_kb
+
+    def __repr__(self):
+        return f"CacheGroup({self.index}, {self.cpus!r}, {self.size_kb}K)"
+
+
+class CpuTopology:
+    """
+    CPU layout read from sysfs.
+
+    Groups online CPUs by shared L3 cache, finds the group with the larger L3
+    (the 3D V-Cache CCD on X3D parts with one stacked CCD), SMT siblings and,
+    on Intel hybrid CPUs, performance and efficiency cores. Everything is
+    read from sysfs_root so a recorded sysfs tree can stand in for /sys.
+    """
+
+    def __init__(self, sysfs_root=SYSFS_ROOT):
+        self.sysfs_root = sysfs_root
+        cpu_dir = os.path.join(sysfs_root, 'devices', 'system', 'cpu')
+        self.online = _read_cpulist(os.path.join(cpu_dir, 'online'))
+        if self.online is None:
+            self.online = CpuMask.from_cpus(range(os.cpu_count() or 1))
+
+        self.cache_groups = []
+        self.siblings = {}
+        groups = {}
+        for cpu in self.online:
+            base = os.path.join(cpu_dir, f'cpu{cpu}')
+            siblings = (_read_cpulist(os.path.join(base, 'topology', 'core_cpus_list'))
+                        or _read_cpulist(os.path.join(base, 'topology', 'thread_siblings_list'))
+                        or CpuMask.from_cpus([cpu]))
+            self.siblings[cpu] = siblings
+
+            shared, size_kb = _read_l3(base)
+            if shared is None:
+                continue
+            key = shared.bits
+            if key not in groups:
+                groups[key] = (shared & self.online, size_kb)
+
+        for index, (cpus, size_kb) in enumerate(sorted(groups.values(), key=lambda g: min(g[0].cpus))):
+            self.cache_groups.append(CacheGroup(index, cpus, size_kb))
+
+        # Intel hybrid parts expose one PMU device per core type
+        self.performance_cores = _read_cpulist(os.path.join(sysfs_root, 'devices', 'cpu_core', 'cpus'))
+        self.efficiency_cores = _read_cpulist(os.path.join(sysfs_root, 'devices', 'cpu_atom', 'cpus'))
+
+    @property
+    def has_smt(self):
+        return any(len(siblings) > 1 for siblings in self.siblings.values())
+
+    @property
+    def is_hybrid(self):
+        return bool(self.performance_cores) and bool(self.efficiency_cores)
+
+    def vcache_group(self):
+        """The L3 group with the largest cache, if the L3 sizes differ."""
+        sized = [group for group in self.cache_groups if group.size_kb]
+        if len(sized) < 2:
+            return None
+        largest = max(sized, key=lambda group: group.size_kb)
+        if all(group.size_kb == largest.size_kb for group in sized):
+            return None
+        return largest
+
+    def primary_threads(self, cpus=None):
+        """One CPU per physical core (the lowest-numbered SMT sibling)."""
+        cpus = self.online if cpus is None else cpus
+        return CpuMask.from_cpus(
+            cpu for cpu in cpus if cpu == min(self.siblings.get(cpu, CpuMask.from_cpus([cpu])).cpus)
+        )
+
+    def default_mask(self):
+        """
+        Sensible default placement for latency-sensitive processes: the V-Cache
+        CCD, the P-cores on hybrid CPUs, or all online CPUs otherwise.
+        """
+        return self._default()[0]
+
+    def _default(self):
+        vcache = self.vcache_group()
+        if vcache is not None:
+            return vcache.cpus, 'vcache'
+        if self.is_hybrid:
+            return self.performance_cores & self.online, 'pcores'
+        return self.online, 'all'
+
+    def presets(self):
+        """
+        Masks worth offering for this CPU.
+
+        Returns:
+            list: (CpuMask, kind, details) tuples. kind is one of 'default',
+                  'all', 'vcache', 'ccd', 'ccd_no_smt', 'no_smt', 'pcores',
+                  'ecores'; details holds values for the description. The
+                  'default' entry comes first and its details name the kind
+                  it was chosen from under 'source'.
+        """
+        default, source = self._default()
+        presets = [(default, 'default', {'source': source})]
+        seen = {presets[0][0]}
+
+        def add(mask, kind, **details):
+            if mask and mask not in seen:
+                seen.add(mask)
+                presets.append((mask, kind, details))
+
+        add(self.online, 'all')
+
+        vcache = self.vcache_group()
+        if len(self.cache_groups) > 1:
+            for group in self.cache_groups:
+                kind = 'vcache' if group is vcache else 'ccd'
+                add(group.cpus, kind, index=group.index, size_mb=group.size_kb // 1024)
+            if self.has_smt:
+                for group in self.cache_groups:
+                    add(self.primary_threads(group.cpus), 'ccd_no_smt', index=group.index)
+
+        if self.is_hybrid:
+            add(self.performance_cores & self.online, 'pcores')
+            add(self.efficiency_cores & self.online, 'ecores')
+
+        if self.has_smt:
+            add(self.primary_threads(), 'no_smt')
+
+        return presets
+
+
+def _read_text(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _read_cpulist(path):
+    text = _read_text(path)
+    if not text:
+        return None
+    try:
+        return CpuMask.from_cpulist(text)
+    except ValueError:
+        return None
+
+
+def _parse_size_kb(text):
+    match = re.match(r'^(\d+)\s*([KMG]?)$', text or '')
+    if not match:
+        return 0
+    value, unit = int(match.group(1)), match.group(2)
+    return value * {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}[unit] // 1024
+
+
+def _read_l3(cpu_base):
+    """Return (shared CpuMask, size in KiB) of the unified L3 cache of one CPU."""
+    cache_dir = os.path.join(cpu_base, 'cache')
+    try:
+        indexes = [entry for entry in os.listdir(cache_dir) if entry.startswith('index')]
+    except OSError:
+        return None, 0
+    for entry in indexes:
+        path = os.path.join(cache_dir, entry)
+        if _read_text(os.path.join(path, 'level')) != '3':
+            continue
+        shared = _read_cpulist(os.path.join(path, 'shared_cpu_list'))
+        return shared, _parse_size_kb(_read_text(os.path.join(path, 'size')))
+    return None, 0
+
+
+_topology = None
+
+
+def get_topology():
+    """The topology of this machine, read once."""
+    global _topology
+    if _topology is None:
+        _topology = CpuTopology()
+    return _topology
@@ -55,18 +55,20 @@ fi
 SYSTEMD_USER_DIR="$USER_HOME/.config/systemd/user"
 
 if [ -d "$SYSTEMD_USER_DIR" ]; then
-    if [ -f "$SYSTEMD_USER_DIR/cpu-affinity-manager.service" ] || [ -f "$SYSTEMD_USER_DIR/cpu-affinity-manager.timer" ]; then
+    if [ -f "$SYSTEMD_USER_DIR/cpu-affinity-manager.service" ] || [ -f "$SYSTEMD_USER_DIR/cpu-affinity-manager.timer" ] || [ -f "$SYSTEMD_USER_DIR/cpu-affinity-manager-daemon.service" ]; then
         echo "Found systemd user configuration in $SYSTEMD_USER_DIR"
         
         # Try to disable if we are running as the user (not root)
         if [ "$EUID" -ne 0 ]; then
-             echo "Disabling systemd timer..."
+             echo "Disabling systemd timer and daemon..."
              systemctl --user disable --now cpu-affinity-manager.timer 2>/dev/null || true
+             systemctl --user disable --now cpu-affinity-manager-daemon.service 2>/dev/null || true
         fi
         
         echo "Removing systemd service files..."
         rm -f "$SYSTEMD_USER_DIR/cpu-affinity-manager.service"
         rm -f "$SYSTEMD_USER_DIR/cpu-affinity-manager.timer"
+        rm -f "$SYSTEMD_USER_DIR/cpu-affinity-manager-daemon.service"
         
         if [ "$EUID" -ne 0 ]; then
              systemctl --user daemon-reload 2>/dev/null || true
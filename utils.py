@@ -1,32 +1,64 @@
 # cpu-affinity-manager/utils.py
 
-import subprocess
 import os
 import time
-import re
 import gettext
+from concurrent.futures import ThreadPoolExecutor
+
+from cpumask import CpuMask
+from procfs import get_backend
 
 DEFAULT_CPU_MASK = "0x00FF00FF"  # Cores 0-7 and 16-23
+BULK_WORKERS = 1   # Worker threads for apply_mask_to_tids (1 = serial)
+BULK_CHUNK = 512   # Minimum number of threads handed to one worker
 
 def validate_cpu_mask(cpu_mask):
-    """Validate CPU mask format (should be 0x followed by hexadecimal digits)."""
+    """
+    Validate a CPU mask: hex (0x00FF00FF) or CPU list (0-7,16-23) format,
+    containing at least one online CPU.
+    """
     if not cpu_mask:
         return False
-    # Check if it matches the pattern 0x followed by one or more hex digits
-    if not re.match(r'^0x[0-9a-fA-F]+$', cpu_mask):
-        return False
-    # Ensure it's not just "0x" with no digits
-    if len(cpu_mask) <= 2:
+    try:
+        return CpuMask.parse(cpu_mask).is_valid()
+    except ValueError:
         return False
-    return True
 
-def get_pids_by_name(process_name):
+def write_atomic(path, text, fsync=False):
+    """
+    Replace a file in one step, so readers see either the old or the new
+    content and never a truncated file.
+
+    The text is written to a temporary file in the same directory and
+    renamed over path. With fsync, it is flushed to disk before the rename.
+    """
+    path = os.fspath(path)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def get_pids_by_name(process_name, backend=None):
     """Finds PIDs matching a given process name."""
     if not process_name:
         return []
+    backend = backend or get_backend()
     try:
         # Using pgrep -f to match against the full command line
-        result = subprocess.run(['pgrep', '-f', process_name], capture_output=True, text=True, check=False)
+        result = backend.run(['pgrep', '-f', process_name])
         if result.returncode == 0 and result.stdout:
             return [pid.strip() for pid in result.stdout.strip().split('\n') if pid.strip()]
         else:
@@ -38,32 +70,56 @@ def get_pids_by_name(process_name):
         print(f"Error finding PIDs for '{process_name}': {e}")
         return []
 
+def get_descendants(pids, backend=None):
+    """
+    PIDs (as strings) of all descendants of the given PIDs.
+
+    The parent of every process is read in one pass over /proc to build a
+    PPID index, which is then walked from the given PIDs.
+    """
+    backend = backend or get_backend()
+    children = {}
+    try:
+        entries = backend.list_pids()
+    except OSError:
+        return []
+    for entry in entries:
+        stat = backend.read(entry, 'stat')
+        if not stat:
+            continue
+        try:
+            # Field 4, after the parenthesized comm
+            ppid = stat.rpartition(b')')[2].split()[1].decode()
+        except IndexError:
+            continue
+        children.setdefault(ppid, []).append(entry)
+
+    descendants = []
+    stack = [str(pid) for pid in pids]
+    seen = set(stack)
+    while stack:
+        for child in children.get(stack.pop(), ()):
+            if child not in seen:
+                seen.add(child)
+                descendants.append(child)
+                stack.append(child)
+    return descendants
+
 def hex_to_cpu_set(hex_mask):
     """Convert a hex mask string (e.g. '0x03') to a set of CPU integers."""
-    # Remove 0x prefix if present and convert to int
-    mask_int = int(hex_mask, 16)
-    cpus = set()
-    cpu_idx = 0
-    while mask_int > 0:
-        if mask_int & 1:
-            cpus.add(cpu_idx)
-        mask_int >>= 1
-        cpu_idx += 1
-    return cpus
-
-def get_tids_for_pid(pid):
+    return set(CpuMask.parse(hex_mask).cpus)
+
+def get_tids_for_pid(pid, backend=None):
     """Gets all thread IDs (TIDs) for a given PID using /proc."""
-    try:
-        task_dir = f'/proc/{pid}/task'
-        if os.path.exists(task_dir):
-            return sorted([tid for tid in os.listdir(task_dir) if tid.isdigit()])
-    except Exception as e:
-        print(f"Error reading threads for PID {pid}: {e}")
-    
+    backend = backend or get_backend()
+    tids = backend.list_tids(pid)
+    if tids is not None:
+        return sorted(tids)
+
     # Fallback to ps command if /proc access fails
     try:
         # ps -T -p <PID> -o tid=  (the '=' after tid removes the header)
-        result = subprocess.run(['ps', '-T', '-p', str(pid), '-o', 'tid='], capture_output=True, text=True, check=False)
+        result = backend.run(['ps', '-T', '-p', str(pid), '-o', 'tid='])
         if result.returncode == 0 and result.stdout:
             return [tid.strip() for tid in result.stdout.strip().split('\n') if tid.strip() and tid.strip().isdigit()]
     except Exception:
@@ -71,15 +127,21 @@ def get_tids_for_pid(pid):
         
     return []
 
-def set_affinity_for_tid(tid, cpu_mask, quiet=False):
-    """Sets CPU affinity for a specific thread ID (TID) using os.sched_setaffinity if available."""
+def set_affinity_for_tid(tid, cpu_mask, quiet=False, backend=None):
+    """
+    Sets CPU affinity for a specific thread ID (TID) using os.sched_setaffinity if available.
+
+    cpu_mask may be a mask string or a CpuMask; strings are parsed once and cached.
+    """
     tid_int = int(tid)
+    mask = CpuMask.parse(cpu_mask)
+    backend = backend or get_backend()
     try:
         # Try to use efficient OS call first
         if hasattr(os, 'sched_getaffinity') and hasattr(os, 'sched_setaffinity'):
-            target_cpus = hex_to_cpu_set(cpu_mask)
+            target_cpus = mask.cpus
             try:
-                current_cpus = os.sched_getaffinity(tid_int)
+                current_cpus = backend.get_affinity(tid_int)
                 if current_cpus == target_cpus:
                     # Already set correctly, skipping
                     return True
@@ -87,7 +149,7 @@ def set_affinity_for_tid(tid, cpu_mask, quiet=False):
                 # Process might have died or permission denied
                 pass
 
-            os.sched_setaffinity(tid_int, target_cpus)
+            backend.set_affinity(tid_int, target_cpus)
             return True
 
     except Exception as e:
@@ -95,10 +157,10 @@ def set_affinity_for_tid(tid, cpu_mask, quiet=False):
             print(f"Native affinity set failed for TID {tid}, falling back to taskset: {e}")
 
     # Fallback to taskset command
-    command = ['taskset', '-p', cpu_mask, str(tid)]
+    command = ['taskset', '-p', '-c', mask.to_cpulist(), str(tid)]
     
     try:
-        result = subprocess.run(command, capture_output=True, text=True, check=False)
+        result = backend.run(command)
         if result.returncode == 0:
             return True
         else:
@@ -117,15 +179,18 @@ def set_affinity_for_tid(tid, cpu_mask, quiet=False):
             print(f"Exception while trying to set affinity for TID {tid}: {e}")
         return False
 
-def apply_cpu_affinity(process_name, cpu_mask=DEFAULT_CPU_MASK, initial_delay=0, quiet=False):
+def apply_cpu_affinity(process_name, cpu_mask=DEFAULT_CPU_MASK, initial_delay=0, quiet=False, backend=None,
+                       include_children=False):
     """
     Applies CPU affinity to all threads of processes matching process_name.
 
     Args:
         process_name (str): Name of the process to set affinity for
-        cpu_mask (str): CPU mask in hex format (e.g., "0x00FF00FF")
+        cpu_mask (str): CPU mask in hex (e.g., "0x00FF00FF") or CPU list (e.g., "0-7,16-23") format
         initial_delay (int): Seconds to wait before applying affinity
         quiet (bool): If True, suppress standard output/logging
+        backend (ProcBackend): procfs backend, the real /proc if None
+        include_children (bool): Also apply to all descendants of the matching processes
 
     Returns:
         tuple: (success_status, total_threads_succeeded, total_threads_attempted)
@@ -133,7 +198,7 @@ def apply_cpu_affinity(process_name, cpu_mask=DEFAULT_CPU_MASK, initial_delay=0,
     # Validate CPU mask
     if not validate_cpu_mask(cpu_mask):
         if not quiet:
-            print(f"Invalid CPU mask format: {cpu_mask}. Expected format: 0x followed by hexadecimal digits (e.g., 0x00FF00FF)")
+            print(f"Invalid CPU mask: {cpu_mask}. Expected a hex mask (e.g., 0x00FF00FF) or CPU list (e.g., 0-7,16-23) with at least one online CPU")
         return False, 0, 0
 
     if initial_delay > 0:
@@ -141,46 +206,174 @@ def apply_cpu_affinity(process_name, cpu_mask=DEFAULT_CPU_MASK, initial_delay=0,
             print(f"Waiting {initial_delay} seconds before applying CPU affinity...")
         time.sleep(initial_delay)
 
-    pids = get_pids_by_name(process_name)
+    pids = get_pids_by_name(process_name, backend)
     if not pids:
         if not quiet:
             print(f"No process found with name: {process_name}")
         return False, 0, 0
+    if include_children:
+        pids += [pid for pid in get_descendants(pids, backend) if pid not in pids]
+
+    return apply_affinity_to_pids(pids, cpu_mask, label=process_name, quiet=quiet, backend=backend)
+
+class ApplyResult:
+    """Outcome of applying one mask to many threads."""
+
+    def __init__(self, pid=None):
+        self.pid = pid
+        self.unchanged = 0     # Threads already on the target mask
+        self.changed = 0       # Threads moved with sched_setaffinity
+        self.fallback = 0      # Threads that needed the taskset fallback
+        self.vanished = 0      # Threads that exited before they could be set
+        self.failed = []       # (tid, error message) for threads that could not be set
+        self.moved = 0         # Processes placed as a whole in a cpuset cgroup, see cgroups.py
+        self.sched_changed = 0  # Threads whose scheduling attributes were changed, see schedattrs.py
+        self.sched_failed = []  # (tid, error message) for threads whose attributes could not be set
+        self.elapsed = 0.0     # Wall-clock seconds
+
+    @property
+    def attempted(self):
+        return self.unchanged + self.changed + self.fallback + len(self.failed)
+
+    @property
+    def succeeded(self):
+        return self.unchanged + self.changed + self.fallback
 
+    @property
+    def success(self):
+        return not self.failed and (self.succeeded > 0 or self.moved > 0)
+
+    def merge(self, other):
+        self.unchanged += other.unchanged
+        self.changed += other.changed
+        self.fallback += other.fallback
+        self.vanished += other.vanished
+        self.failed.extend(other.failed)
+        self.moved += other.moved
+        self.sched_changed += other.sched_changed
+        self.sched_failed.extend(other.sched_failed)
+        return self
+
+
+def _apply_mask_chunk(tids, target_cpus, cpu_mask, backend, attrs=None):
+    result = ApplyResult()
+    for tid in tids:
+        if target_cpus is not None:
+            try:
+                if backend.get_affinity(tid) == target_cpus:
+                    result.unchanged += 1
+                else:
+                    backend.set_affinity(tid, target_cpus)
+                    result.changed += 1
+            except ProcessLookupError:
+                result.vanished += 1
+                continue
+            except OSError as e:
+                # Same fallback as set_affinity_for_tid, without its per-thread logging
+                if set_affinity_for_tid(tid, cpu_mask, quiet=True, backend=backend):
+                    result.fallback += 1
+                else:
+                    result.failed.append((tid, str(e)))
+                    continue
+        if attrs is not None:
+            # Same pass, same skip-if-already-set logic as the affinity
+            try:
+                if attrs.apply(tid, backend):
+                    result.sched_changed += 1
+            except ProcessLookupError:
+                if target_cpus is None:
+                    result.vanished += 1
+            except OSError as e:
+                result.sched_failed.append((tid, str(e)))
+    return result
+
+
+def apply_mask_to_tids(tids, cpu_mask, workers=BULK_WORKERS, pid=None, backend=None, attrs=None):
+    """
+    Applies one CPU mask to many threads and returns an ApplyResult.
+
+    The target CPU set is computed once for all threads. With workers > 1 and
+    more than BULK_CHUNK threads, the threads are split into chunks handled by
+    a small thread pool. CPython holds the GIL across the affinity syscalls,
+    so this only pays off where they block; the default is serial, see
+    benchmarks/bench_bulk_apply.py.
+
+    With attrs (a schedattrs.SchedAttrs), each thread's scheduling policy,
+    nice value and I/O priority are set in the same pass. A cpu_mask of None
+    sets only those.
+    """
+    start = time.perf_counter()
+    mask = CpuMask.parse(cpu_mask) if cpu_mask is not None else None
+    target_cpus = mask.cpus if mask is not None else None
+    backend = backend or get_backend()
+    tids = [int(tid) for tid in tids]
+
+    if workers > 1 and len(tids) > BULK_CHUNK:
+        chunk = max(BULK_CHUNK, -(-len(tids) // workers))
+        chunks = [tids[i:i + chunk] for i in range(0, len(tids), chunk)]
+        result = ApplyResult(pid)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for partial in pool.map(lambda c: _apply_mask_chunk(c, target_cpus, mask, backend, attrs), chunks):
+                result.merge(partial)
+    else:
+        result = _apply_mask_chunk(tids, target_cpus, mask, backend, attrs)
+        result.pid = pid
+
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def apply_affinity_bulk(pid, cpu_mask, workers=BULK_WORKERS, backend=None):
+    """
+    Applies CPU affinity to every thread of a PID in one pass.
+
+    The task directory is read once; if it cannot be read the PID itself is
+    set. Returns an ApplyResult instead of printing per-thread lines.
+    """
+    backend = backend or get_backend()
+    tids = backend.list_tids(pid)
+    return apply_mask_to_tids(tids or [pid], cpu_mask, workers=workers, pid=int(pid), backend=backend)
+
+
+def apply_affinity_to_pids(pids, cpu_mask, label=None, quiet=False, backend=None):
+    """
+    Applies CPU affinity to all threads of the given PIDs.
+
+    Args:
+        pids (list): PIDs to set affinity for
+        cpu_mask (str): CPU mask in hex or CPU list format
+        label (str): Name used in log output, usually the matched process name
+        quiet (bool): If True, suppress standard output/logging
+        backend (ProcBackend): procfs backend, the real /proc if None
+
+    Returns:
+        tuple: (success_status, total_threads_succeeded, total_threads_attempted)
+    """
+    label = label or cpu_mask
     overall_success = True
     total_tids_succeeded = 0
     total_tids_attempted = 0
 
     for pid in pids:
+        result = apply_affinity_bulk(pid, cpu_mask, backend=backend)
+        total_tids_succeeded += result.succeeded
+        total_tids_attempted += result.attempted
+        if result.failed:
+            overall_success = False
         if not quiet:
-            print(f"Processing PID {pid} for '{process_name}'...")
-        tids = get_tids_for_pid(pid)
-        if not tids:
-            if not quiet:
-                print(f"  No threads found for PID {pid}, or failed to retrieve them. Attempting on PID {pid} directly.")
-            total_tids_attempted += 1
-            if set_affinity_for_tid(pid, cpu_mask, quiet=quiet):
-                total_tids_succeeded += 1
-            else:
-                overall_success = False
-            continue
-
-        if not quiet:
-            print(f"  Found threads for PID {pid}: {tids}")
-        for tid in tids:
-            total_tids_attempted += 1
-            if set_affinity_for_tid(tid, cpu_mask, quiet=quiet):
-                total_tids_succeeded += 1
-            else:
-                overall_success = False
+            print(f"PID {pid} for '{label}': {result.changed} threads changed, "
+                  f"{result.unchanged} already set, {len(result.failed)} failed "
+                  f"({result.elapsed * 1000:.1f} ms)")
+            for tid, error in result.failed:
+                print(f"  ERROR: Failed to set affinity for TID {tid} to {cpu_mask}: {error}")
 
     if total_tids_attempted == 0:
         if not quiet:
-            print(f"Warning: No PIDs or TIDs were processed for '{process_name}'.")
+            print(f"Warning: No PIDs or TIDs were processed for '{label}'.")
         return False, 0, 0
         
     if not quiet:
-        print(f"Finished applying affinity for '{process_name}'. \n"
+        print(f"Finished applying affinity for '{label}'. \n"
               f"Successfully set affinity for {total_tids_succeeded} out of {total_tids_attempted} threads/processes.")
     
     return overall_success and total_tids_succeeded > 0, total_tids_succeeded, total_tids_attempted